@@ -0,0 +1,321 @@
+"""Headless JSON API over the same helpers as the Streamlit page.
+
+Mobile and bot clients call these endpoints instead of scraping the UI,
+and no Streamlit script is rerun per request. Handlers are async: the
+helpers in ``guidance.services`` block on the process-wide pooled HTTP
+client, so they run in a bounded worker thread pool while the event loop
+keeps serving other requests. Answers can stream as server-sent events.
+
+Keys and endpoints come from the environment (``API_KEY``, ``API_URL``,
+``NEWS_API_KEY``, ...) or ``.streamlit/secrets.toml``, see
+``guidance/config.py``. Run with:
+
+    uvicorn api:app --port 8600
+
+Endpoints (``religion`` and ``language`` are query parameters):
+
+    GET  /v1/prayer, /v1/verse, /v1/quote, /v1/events, /v1/news, /v1/music,
+         /v1/video, /v1/forum, /v1/donation, /v1/meditation
+    GET  /v1/prayer-times  ?location= (a name from data/locations.json), or
+                           ?latitude=&longitude=&timezone=&method=?
+    POST /v1/accounts   {"username"} -> {"token"}
+    POST /v1/ask        {"question", "religion", "language", "stream"?, "location"?}
+    POST /v1/translate  {"texts": [...], "language"}
+    GET  /healthz, /metrics
+
+``/v1/ask`` with ``Authorization: Bearer <token>`` (a token from
+``/v1/accounts``, or the one in the page's ``?token=`` link) reads and
+extends that account's stored conversation (see ``guidance.accounts``).
+Without it, each question stands alone. Each account's ``ContextBuilder``
+is kept between requests, so only turns that newly leave the window are
+folded into the rolling summary.
+"""
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import anyio.to_thread
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from guidance import http_client, metrics, services
+from guidance.accounts import create_account, load_account
+from guidance.config import get_config
+from guidance.context import ContextBuilder
+from guidance.history import ChatHistory
+from guidance.locations import DEFAULT_METHOD, Location, get_locations
+from guidance.storage import open_storage
+
+# Worker threads for the blocking helpers; the HTTP pool is sized to match
+WORKER_THREADS = int(os.environ.get("API_WORKER_THREADS", 64))
+MAX_QUESTION_CHARS = 2000
+MAX_TRANSLATE_TEXTS = 50
+MAX_USERNAME_CHARS = 100
+MAX_SESSION_ID_CHARS = 100
+# Accounts whose context builders are kept in memory
+MAX_CACHED_BUILDERS = 1024
+
+DEFAULT_RELIGION = "Christianity"
+DEFAULT_LANGUAGE = "English"
+
+# Endpoint name -> helper taking (religion, language)
+CONTENT_ENDPOINTS = {
+    "prayer": services.get_prayer_of_the_day,
+    "verse": services.get_daily_verse,
+    "quote": lambda religion, language: services.get_inspirational_quote(religion),
+    "events": lambda religion, language: services.get_upcoming_events(religion),
+    "news": lambda religion, language: services.get_religious_news(religion),
+    "music": lambda religion, language: services.get_background_music(religion),
+    "video": lambda religion, language: services.get_inspirational_videos(religion),
+    "forum": lambda religion, language: services.get_community_forums(religion),
+    "donation": lambda religion, language: services.get_donation_links(religion),
+    "meditation": lambda religion, language: services.get_meditation_guide(religion),
+}
+
+
+def _religion_and_language(values):
+    religion = values.get("religion") or DEFAULT_RELIGION
+    language = values.get("language") or DEFAULT_LANGUAGE
+    if religion not in services.RELIGIONS:
+        raise HTTPException(400, f"Unknown religion: {religion}")
+    if language not in services.LANGUAGES:
+        raise HTTPException(400, f"Unknown language: {language}")
+    return religion, language
+
+
+def _location(values):
+    """A location name, a custom ``Location`` from coordinates, or ``None`` for the configured default."""
+    if values.get("latitude") is None and values.get("longitude") is None:
+        name = values.get("location")
+        if name is not None and name not in get_locations():
+            raise HTTPException(400, f"Unknown location: {name}")
+        return name
+    # Imported here: the prayer time tables pull in NumPy
+    from guidance.prayer_times import METHODS
+
+    method = values.get("method") or DEFAULT_METHOD
+    try:
+        latitude, longitude = float(values.get("latitude")), float(values.get("longitude"))
+        ZoneInfo(values.get("timezone"))
+    except (TypeError, ValueError, ZoneInfoNotFoundError):
+        raise HTTPException(400, "latitude, longitude and timezone must be a position and an IANA time zone")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise HTTPException(400, "latitude or longitude out of range")
+    if method not in METHODS:
+        raise HTTPException(400, f"Unknown method: {method}")
+    return Location("Custom", latitude, longitude, values["timezone"], method)
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(400, "Request body must be a JSON object")
+    return body
+
+
+def _instrumented(name, func, *args):
+    with metrics.span(f"api.{name}"):
+        return func(*args)
+
+
+def content_endpoint(name, helper):
+    async def endpoint(request):
+        religion, language = _religion_and_language(request.query_params)
+        value = await run_in_threadpool(_instrumented, name, helper, religion, language)
+        return JSONResponse({"religion": religion, "language": language, name.replace("-", "_"): value})
+    return endpoint
+
+
+async def prayer_times(request):
+    religion, language = _religion_and_language(request.query_params)
+    location = _location(request.query_params)
+    value = await run_in_threadpool(_instrumented, "prayer-times", services.get_prayer_times, religion, location)
+    name = location.name if isinstance(location, Location) else services.get_location(location).name
+    return JSONResponse({"religion": religion, "language": language, "location": name, "prayer_times": value})
+
+
+def _storage():
+    return open_storage(get_config().storage_url)
+
+
+def _account(authorization):
+    """The storage key of an ``Authorization`` header's bearer token, ``None`` without one; 401 for an unknown token."""
+    if authorization is None:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    key, _ = load_account(_storage(), token.strip()) if scheme.lower() == "bearer" else (None, None)
+    if key is None:
+        raise HTTPException(401, "Unknown or malformed account token")
+    return key
+
+
+_builders = OrderedDict()  # account key -> (ContextBuilder, lock)
+_builders_lock = threading.Lock()
+
+
+def _context_builder(key):
+    """The account's ``ContextBuilder`` and the lock to hold while using it, kept in a bounded LRU."""
+    with _builders_lock:
+        entry = _builders.get(key)
+        if entry is None:
+            entry = _builders[key] = (ContextBuilder(), threading.Lock())
+            while len(_builders) > MAX_CACHED_BUILDERS:
+                _builders.popitem(last=False)
+        else:
+            _builders.move_to_end(key)
+        return entry
+
+
+def _prepare(question, religion, language, account, location):
+    with metrics.span("api.ask.prepare"):
+        if account is None:
+            history = ChatHistory()
+            route, messages = services.prepare_answer(question, religion, language, history, ContextBuilder(), location)
+            return history, route, messages
+        # The account's conversation is shared with the Streamlit page
+        history = ChatHistory(store=_storage(), username=account)
+        builder, lock = _context_builder(account)
+        with lock:
+            route, messages = services.prepare_answer(question, religion, language, history, builder, location)
+        return history, route, messages
+
+
+def _answer(history, question, route, messages, session_id, on_event=None):
+    """Stream the answer through ``on_event(kind, value)`` and record the turn; return the full text."""
+    answer = ""
+    with metrics.span(f"api.answer.{route.tier}", model=route.model, route_reason=route.reason):
+        on_queue = (lambda position: on_event("queue", position)) if on_event else None
+        for chunk in services.stream_answer(route, messages, session_id, on_queue):
+            answer += chunk
+            if on_event:
+                on_event("delta", chunk)
+    answer = answer.strip()
+    history.append("user", question)
+    history.append("assistant", answer)
+    return answer
+
+
+def _sse(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def ask(request):
+    body = await _json_body(request)
+    religion, language = _religion_and_language(body)
+    question = body.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPException(400, "question is required")
+    if len(question) > MAX_QUESTION_CHARS:
+        raise HTTPException(400, f"question is longer than {MAX_QUESTION_CHARS} characters")
+    if "username" in body:
+        raise HTTPException(400, "username is not accepted; send the account token as Authorization: Bearer <token>")
+    account = await run_in_threadpool(_account, request.headers.get("authorization"))
+    location = _location(body)
+    # Requests from one client share a scheduler queue when they send the same session id
+    session_id = body.get("session_id")
+    if session_id is None:
+        session_id = uuid.uuid4().hex
+    elif not isinstance(session_id, str) or not session_id.strip():
+        raise HTTPException(400, "session_id must be a non-empty string")
+    elif len(session_id) > MAX_SESSION_ID_CHARS:
+        raise HTTPException(400, f"session_id is longer than {MAX_SESSION_ID_CHARS} characters")
+
+    history, route, messages = await run_in_threadpool(_prepare, question, religion, language, account, location)
+    route_info = {"tier": route.tier, "model": route.model}
+    if not body.get("stream"):
+        answer = await run_in_threadpool(_answer, history, question, route, messages, session_id)
+        return JSONResponse({"answer": answer, **route_info})
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def on_event(kind, value):
+        loop.call_soon_threadsafe(events.put_nowait, (kind, value))
+
+    async def produce():
+        try:
+            await run_in_threadpool(_answer, history, question, route, messages, session_id, on_event)
+        finally:
+            events.put_nowait(None)
+
+    async def stream():
+        # The answer keeps being produced (and cached) if the client goes away
+        producer = asyncio.ensure_future(produce())
+        yield _sse(route_info)
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            kind, value = event
+            yield _sse({"queue_position": value} if kind == "queue" else {"delta": value})
+        await producer
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def accounts(request):
+    body = await _json_body(request)
+    username = body.get("username")
+    if not isinstance(username, str) or not username.strip() or len(username) > MAX_USERNAME_CHARS:
+        raise HTTPException(400, f"username must be a name of at most {MAX_USERNAME_CHARS} characters")
+    token, _ = await run_in_threadpool(create_account, _storage(), {"username": username.strip()})
+    return JSONResponse({"token": token}, status_code=201)
+
+
+async def translate(request):
+    body = await _json_body(request)
+    texts = body.get("texts")
+    language = body.get("language")
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts) or len(texts) > MAX_TRANSLATE_TEXTS:
+        raise HTTPException(400, f"texts must be a list of at most {MAX_TRANSLATE_TEXTS} strings")
+    if language not in services.LANGUAGES:
+        raise HTTPException(400, f"Unknown language: {language}")
+    translated = await run_in_threadpool(_instrumented, "translate", services.translate_texts, texts, language)
+    return JSONResponse({"language": language, "texts": translated})
+
+
+async def healthz(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def prometheus_metrics(request):
+    return PlainTextResponse(metrics.registry.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+async def http_error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the config before the first request rather than during it
+    get_config()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+    # One keep-alive pool per process, large enough that worker threads never wait for a connection
+    http_client.configure(pool_maxsize=max(http_client.POOL_MAXSIZE, WORKER_THREADS))
+    yield
+
+
+routes = [Route(f"/v1/{name}", content_endpoint(name, helper)) for name, helper in CONTENT_ENDPOINTS.items()]
+routes += [
+    Route("/v1/prayer-times", prayer_times),
+    Route("/v1/accounts", accounts, methods=["POST"]),
+    Route("/v1/ask", ask, methods=["POST"]),
+    Route("/v1/translate", translate, methods=["POST"]),
+    Route("/healthz", healthz),
+    Route("/metrics", prometheus_metrics),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan, exception_handlers={HTTPException: http_error})
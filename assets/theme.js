@@ -0,0 +1,8 @@
+// Sets body and sidebar classes based on the selected theme
+function setTheme(theme) {
+    document.body.className = theme + '-theme';
+    const sidebar = document.querySelector('.sidebar');
+    if (sidebar) {
+        sidebar.className = theme + '-theme';
+    }
+}
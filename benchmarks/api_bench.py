@@ -0,0 +1,137 @@
+"""Throughput benchmark for the headless JSON API (api.py) against stub upstreams.
+
+Starts ``StubUpstream``, points the helpers at it, serves ``api:app`` with
+uvicorn on a local port and drives it from ``--clients`` concurrent
+keep-alive clients for ``--duration`` seconds. Each client cycles through
+a mix of content endpoints and questions (``--ask-ratio`` of requests,
+half of them streamed). Requests per second and latency percentiles per
+endpoint are written to a JSON artifact, comparable with the per-rerun
+numbers of ``benchmarks.load_test``. Questions go through the completion
+scheduler's provider quota (60 requests a minute by default); raise
+``COMPLETIONS_REQUESTS_PER_MINUTE`` to measure the API rather than the quota.
+Persistent stores live in a temporary directory for the run.
+
+Usage (from the repository root):
+
+    python -m benchmarks.api_bench --clients 16 --duration 10 --output api_bench.json
+"""
+import argparse
+import json
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+import uvicorn
+
+from benchmarks.load_test import QUESTIONS, RELIGIONS, isolated_settings, summarize
+from benchmarks.stub_servers import StubUpstream
+from guidance import config
+
+CONTENT_PATHS = ["/v1/verse", "/v1/quote", "/v1/events", "/v1/prayer-times", "/v1/news", "/v1/music", "/v1/meditation"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(port):
+    import api
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    threading.Thread(target=server.run, name="api-server", daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("API server did not start")
+        time.sleep(0.05)
+    return server
+
+
+def run_client(base_url, index, until, ask_ratio, seed, samples, errors):
+    rng = random.Random(seed + index)
+    session = requests.Session()
+    while time.monotonic() < until:
+        religion = rng.choice(RELIGIONS)
+        started = time.perf_counter()
+        if rng.random() < ask_ratio:
+            stream = rng.random() < 0.5
+            kind = "ask.stream" if stream else "ask"
+            response = session.post(f"{base_url}/v1/ask", json={
+                "question": rng.choice(QUESTIONS), "religion": religion, "stream": stream,
+            }, stream=stream)
+            if stream:
+                for _ in response.iter_lines():
+                    pass
+        else:
+            kind = rng.choice(CONTENT_PATHS)
+            response = session.get(f"{base_url}{kind}", params={"religion": religion})
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            errors[kind] += 1
+        samples[kind].append(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--ask-ratio", type=float, default=0.2, help="fraction of requests that ask a question")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="delay between streamed tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="optional JSON artifact path")
+    args = parser.parse_args(argv)
+
+    stub = StubUpstream(token_delay=args.token_delay, seed=args.seed).start()
+    root = tempfile.mkdtemp(prefix="api-bench-")
+    config.configure(
+        api_key="benchmark-key", news_api_key="benchmark-news-key",
+        **{name.lower(): value for name, value in {**stub.secrets(), **isolated_settings(root)}.items()}
+    )
+    port = free_port()
+    server = start_api(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    started = time.perf_counter()
+    until = time.monotonic() + args.duration
+    clients = [
+        threading.Thread(target=run_client, args=(base_url, index, until, args.ask_ratio, args.seed, samples, errors))
+        for index in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    wall = time.perf_counter() - started
+    server.should_exit = True
+    stub.stop()
+    shutil.rmtree(root, ignore_errors=True)
+
+    total = sum(len(latencies) for latencies in samples.values())
+    report = {
+        "clients": args.clients,
+        "duration_s": round(wall, 2),
+        "requests": total,
+        "requests_per_s": round(total / wall, 1),
+        "errors": dict(errors),
+        "all": summarize([latency for latencies in samples.values() for latency in latencies]),
+        "endpoints": {kind: summarize(latencies) for kind, latencies in sorted(samples.items())},
+        "upstream_calls": dict(stub.counts),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Prayer time and festival calendar benchmark.
+
+Times the yearly precompute (one prayer time table per location in
+``data/locations.json``, and every festival rule for ``--years`` years)
+against what serving costs afterwards: ``--lookups`` cached lookups of a
+random location's times for a random day, and of a religion's upcoming
+festivals. Lookups should stay in the tens of microseconds.
+
+Usage (from the repository root):
+
+    python -m benchmarks.calendar_bench --year 2026 --years 5
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+
+from benchmarks.load_test import summarize
+from guidance.festivals import FestivalCalendar
+from guidance.locations import load_locations
+from guidance.prayer_times import PrayerTimesTable
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--year", type=int, default=datetime.date.today().year)
+    parser.add_argument("--years", type=int, default=5, help="festival years to precompute")
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="optional JSON artifact path")
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    locations = list(load_locations().values())
+
+    table = PrayerTimesTable()
+    started = time.perf_counter()
+    for location in locations:
+        table.year(location.latitude, location.longitude, location.timezone, args.year, location.method)
+    prayer_precompute = time.perf_counter() - started
+
+    calendar = FestivalCalendar.from_file()
+    started = time.perf_counter()
+    for year in range(args.year, args.year + args.years):
+        calendar.year(year)
+    festival_precompute = time.perf_counter() - started
+
+    first_day = datetime.date(args.year, 1, 1)
+    prayer_latencies, festival_latencies = [], []
+    for _ in range(args.lookups):
+        day = first_day + datetime.timedelta(days=rng.randrange(365))
+        started = time.perf_counter()
+        table.day(rng.choice(locations), day)
+        prayer_latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        calendar.upcoming(rng.choice(list(calendar.rules)), day)
+        festival_latencies.append(time.perf_counter() - started)
+
+    report = {
+        "locations": len(locations),
+        "prayer_precompute_s": round(prayer_precompute, 4),
+        "festival_years": args.years,
+        "festival_precompute_s": round(festival_precompute, 4),
+        "prayer_lookup": summarize(prayer_latencies),
+        "festival_lookup": summarize(festival_latencies),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Offline load test: N concurrent simulated sessions against stub upstreams.
+
+Starts ``StubUpstream`` and drives streamlit_app.py headlessly through
+Streamlit's AppTest. Each simulated session loads the page, asks a few
+questions and opens the Prayer of the Day. AppTest patches process-wide
+Streamlit state while it runs, so every session runs in its own worker
+process; process-level caches therefore behave like separate replicas.
+Per-rerun latency percentiles, upstream call counts and memory per
+session are written to a JSON artifact so runs can be compared. Every
+persistent store (storage, shared state, the Prayer of the Day store,
+static media) lives in a temporary directory for the run, so stub
+answers never reach the real ``.cache/``.
+
+Usage (from the repository root):
+
+    python -m benchmarks.load_test --sessions 20 --questions 3 \\
+        --latency chat=0.3,news=0.2 --failure-rate music=0.5 --output bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from datetime import datetime, timezone
+
+from benchmarks.stub_servers import StubUpstream
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+QUESTIONS = [
+    "What is the meaning of Ramadan?",
+    "How should I begin a daily prayer practice?",
+    "What does scripture teach about forgiveness?",
+    "When is the next major festival?",
+    "How can I find peace in difficult times?",
+]
+RELIGIONS = ["Christianity", "Islam", "Hinduism", "Buddhism", "Judaism"]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values`` (``fraction`` in 0..1)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+def isolated_settings(root):
+    """Config overrides that keep a run's persistent state under ``root`` instead of ``.cache/``."""
+    return {
+        "STORAGE_URL": "sqlite:///" + os.path.join(root, "guidance.sqlite3"),
+        "SHARED_STATE_URL": "sqlite:///" + os.path.join(root, "shared_state.sqlite3"),
+        "PRAYER_STORE_PATH": os.path.join(root, "prayer_of_the_day.sqlite3"),
+    }
+
+
+def new_session(endpoints, timeout):
+    # Imported here so only worker processes pay for loading Streamlit
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    app.secrets["API_KEY"] = "benchmark-key"
+    app.secrets["NEWS_API_KEY"] = "benchmark-news-key"
+    for name, url in endpoints.items():
+        app.secrets[name] = url
+    return app
+
+
+def timed_run(app, kind, samples):
+    started = time.perf_counter()
+    app.run()
+    samples.append((kind, time.perf_counter() - started, len(app.exception)))
+
+
+def run_session(endpoints, index, questions, seed, timeout):
+    """Simulate one user; returns ``[(kind, seconds, exception_count), ...]``."""
+    rng = random.Random(seed + index)
+    samples = []
+    app = new_session(endpoints, timeout)
+    timed_run(app, "load", samples)
+    app.sidebar.selectbox[0].select(rng.choice(RELIGIONS))
+    timed_run(app, "select", samples)
+    for _ in range(questions):
+        app.text_input(key="input").input(rng.choice(QUESTIONS))
+        next(button for button in app.button if button.label == "Send").click()
+        timed_run(app, "chat", samples)
+    next(button for button in app.button if button.label == "Show Prayer of the Day").click()
+    timed_run(app, "prayer", samples)
+    return samples
+
+
+def measure_memory(endpoints, sessions, seed, timeout):
+    """Average traced memory retained per live session after a short scenario."""
+    # Warm imports and process-wide caches so the baseline excludes them
+    run_session(endpoints, -1, 1, seed, timeout)
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    apps = []
+    for index in range(sessions):
+        app = new_session(endpoints, timeout)
+        app.run()
+        app.text_input(key="input").input(QUESTIONS[(seed + index) % len(QUESTIONS)])
+        next(button for button in app.button if button.label == "Send").click()
+        app.run()
+        apps.append(app)
+    retained = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, "filename"))
+    tracemalloc.stop()
+    return round(retained / max(1, sessions))
+
+
+def parse_mapping(text):
+    """Parse ``route=value,route=value`` into ``{route: float}``."""
+    mapping = {}
+    for item in filter(None, (text or "").split(",")):
+        route, _, value = item.partition("=")
+        mapping[route.strip()] = float(value)
+    return mapping
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--questions", type=int, default=3, help="chat questions per session")
+    parser.add_argument("--latency", default="", help="per-route latency in seconds, e.g. chat=0.3,news=0.2")
+    parser.add_argument("--failure-rate", default="", help="per-route failure rate, e.g. music=0.5")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="delay between streamed tokens")
+    parser.add_argument("--memory-sessions", type=int, default=5, help="sessions used for the memory pass (0 skips it)")
+    parser.add_argument("--timeout", type=float, default=120, help="per-rerun timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json", help="JSON artifact path")
+    args = parser.parse_args(argv)
+
+    stub = StubUpstream(
+        latency=parse_mapping(args.latency),
+        failure_rate=parse_mapping(args.failure_rate),
+        token_delay=args.token_delay,
+        seed=args.seed,
+    ).start()
+    root = tempfile.mkdtemp(prefix="load-test-")
+    endpoints = {**stub.secrets(), **isolated_settings(root)}
+    # Read when the workers import guidance.assets
+    os.environ["ASSETS_STATIC_DIR"] = os.path.join(root, "static")
+    context = get_context("spawn")
+    try:
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.sessions, mp_context=context) as pool:
+            futures = [
+                pool.submit(run_session, endpoints, index, args.questions, args.seed, args.timeout)
+                for index in range(args.sessions)
+            ]
+            results = [future.result() for future in futures]
+        wall_time = time.perf_counter() - started
+        upstream_calls = dict(stub.counts)
+        memory_per_session = None
+        if args.memory_sessions:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                memory_per_session = pool.submit(
+                    measure_memory, endpoints, args.memory_sessions, args.seed, args.timeout
+                ).result()
+    finally:
+        stub.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    by_kind = defaultdict(list)
+    exceptions = 0
+    for samples in results:
+        for kind, seconds, exception_count in samples:
+            by_kind[kind].append(seconds)
+            exceptions += exception_count
+    all_latencies = [seconds for latencies in by_kind.values() for seconds in latencies]
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": vars(args),
+        "wall_time_s": round(wall_time, 3),
+        "reruns": {"all": summarize(all_latencies), **{kind: summarize(values) for kind, values in sorted(by_kind.items())}},
+        "script_exceptions": exceptions,
+        "upstream_calls": upstream_calls,
+        "upstream_calls_per_session": {route: round(count / args.sessions, 2) for route, count in upstream_calls.items()},
+        "memory_per_session_bytes": memory_per_session,
+    }
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2)
+    print(json.dumps(report["reruns"]["all"]), f"-> {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
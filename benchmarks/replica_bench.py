@@ -0,0 +1,123 @@
+"""Multi-process benchmark for the shared state (guidance/shared_state.py).
+
+Starts ``StubUpstream`` and ``--processes`` fresh Python processes, as
+replicas on one host, all pointed at one ``--shared-state-url`` (default:
+a temporary SQLite file). At the same moment, every process:
+
+* fetches news, verses and music for every religion from ``--threads``
+  threads. With shared state, each key reaches the upstream once in
+  total, not once per process;
+* asks the same question, staggered so that later processes can reuse
+  the first answer from the shared response cache;
+* spends ``--duration`` seconds taking tokens from one shared bucket of
+  ``--rate`` tokens a second. The total granted should stay near
+  ``rate * window + capacity``, whatever the number of processes, where
+  the window runs from the first process starting to the last one
+  stopping.
+
+Pass ``--shared-state-url memory://`` to measure per-process state for
+comparison.
+
+Usage (from the repository root):
+
+    python -m benchmarks.replica_bench --processes 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stub_servers import StubUpstream
+from guidance.services import RELIGIONS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, sys, threading, time
+from guidance import services
+from guidance.shared_state import SharedTokenBucket
+
+index, start_at, threads, rate, duration = int(sys.argv[1]), float(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4]), float(sys.argv[5])
+time.sleep(max(0.0, start_at - time.time()))
+started = time.perf_counter()
+
+def fetch_all():
+    for religion in services.RELIGIONS:
+        services.get_religious_news(religion)
+        services.get_daily_verse(religion, "English")
+        services.get_background_music(religion)
+
+workers = [threading.Thread(target=fetch_all) for _ in range(threads)]
+for worker in workers:
+    worker.start()
+for worker in workers:
+    worker.join()
+fetch_s = time.perf_counter() - started
+
+# Later replicas ask after the first answer has been stored
+time.sleep(index * 0.5)
+messages = [{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": "What is grace?"}]
+services.get_api_response("gpt-4o-mini", messages, use_cache=True)
+
+bucket = SharedTokenBucket("replica-bench", rate, rate)
+granted = 0
+window = time.time()
+until = window + duration
+while time.time() < until:
+    if bucket.try_acquire():
+        granted += 1
+    else:
+        time.sleep(0.005)
+print(json.dumps({"fetch_s": fetch_s, "granted": granted, "window": [window, until]}))
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="fetching threads per process")
+    parser.add_argument("--rate", type=float, default=20, help="shared bucket tokens per second (and capacity)")
+    parser.add_argument("--duration", type=float, default=3, help="seconds each process takes tokens")
+    parser.add_argument("--shared-state-url", default=None, help="default: a temporary SQLite file")
+    parser.add_argument("--output", default=None, help="optional JSON artifact path")
+    args = parser.parse_args(argv)
+
+    stub = StubUpstream(latency={"news": 0.2, "verse": 0.2, "music": 0.2}, token_delay=0).start()
+    with tempfile.TemporaryDirectory() as root:
+        url = args.shared_state_url or "sqlite:///" + os.path.join(root, "shared_state.sqlite3")
+        env = {**os.environ, "API_KEY": "benchmark-key", "NEWS_API_KEY": "benchmark-news-key",
+               "SHARED_STATE_URL": url, **stub.secrets()}
+        start_at = time.time() + 2
+        workers = [
+            subprocess.Popen(
+                [sys.executable, "-c", WORKER, str(index), str(start_at), str(args.threads), str(args.rate), str(args.duration)],
+                cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True,
+            )
+            for index in range(args.processes)
+        ]
+        results = [json.loads(worker.communicate()[0].strip().splitlines()[-1]) for worker in workers]
+    stub.stop()
+    window = max(result["window"][1] for result in results) - min(result["window"][0] for result in results)
+
+    report = {
+        "processes": args.processes,
+        "shared_state_url": args.shared_state_url or "sqlite (temporary)",
+        "upstream_calls": dict(stub.counts),
+        "keys_per_route": len(RELIGIONS),
+        "fetch_s": [round(result["fetch_s"], 3) for result in results],
+        "tokens_granted": sum(result["granted"] for result in results),
+        "token_window_s": round(window, 3),
+        "tokens_expected": round(args.rate * window + args.rate),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
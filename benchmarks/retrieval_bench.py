@@ -0,0 +1,97 @@
+"""Retrieval latency benchmark on a synthetic scripture-sized corpus.
+
+Generates ``--files`` text files holding ``--passages`` passages in total
+(words drawn from a Zipf-like vocabulary), builds the BM25 index, adds
+one more file to time an incremental build, then times ``--queries``
+searches. Retrieval should stay under 10 ms at p99.
+
+Usage (from the repository root):
+
+    python -m benchmarks.retrieval_bench --passages 30000 --files 60
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.load_test import summarize
+from guidance.retrieval import RetrievalIndex, build_index
+
+WORDS = (
+    "love mercy grace faith hope peace prayer spirit soul heart light truth path wisdom patience "
+    "forgiveness compassion kindness charity humility righteousness blessing shepherd water mountain "
+    "river temple teacher disciple heaven earth father mother child servant king law covenant "
+    "meditation mind thought anger hatred desire suffering joy virtue duty action fruit devotion"
+).split()
+
+
+def write_corpus(directory, files, passages, rng):
+    vocabulary = WORDS + [f"term{index}" for index in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    per_file = max(1, passages // files)
+    for file_index in range(files):
+        with open(os.path.join(directory, f"book_{file_index}.txt"), "w", encoding="utf-8") as corpus_file:
+            for passage in range(per_file):
+                text = " ".join(rng.choices(vocabulary, weights, k=rng.randint(20, 80)))
+                corpus_file.write(f"## Book {file_index}:{passage}\n{text}\n\n")
+    return per_file * files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--passages", type=int, default=30000)
+    parser.add_argument("--files", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="optional JSON artifact path")
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as root:
+        corpus_dir = os.path.join(root, "corpus")
+        index_dir = os.path.join(root, "index")
+        os.makedirs(corpus_dir)
+        passages = write_corpus(corpus_dir, args.files, args.passages, rng)
+
+        started = time.perf_counter()
+        build_index(corpus_dir, index_dir)
+        full_build = time.perf_counter() - started
+
+        with open(os.path.join(corpus_dir, "added.txt"), "w", encoding="utf-8") as added:
+            added.write("## Added 1\nA new commentary on patience and forgiveness.\n")
+        started = time.perf_counter()
+        build_index(corpus_dir, index_dir)
+        incremental_build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = RetrievalIndex(index_dir)
+        load_time = time.perf_counter() - started
+
+        latencies = []
+        for _ in range(args.queries):
+            query = " ".join(rng.sample(WORDS, rng.randint(2, 6)))
+            started = time.perf_counter()
+            index.search(query, args.k)
+            latencies.append(time.perf_counter() - started)
+        index_bytes = sum(entry.stat().st_size for entry in os.scandir(index_dir) if entry.is_file())
+
+    report = {
+        "passages": passages,
+        "index_bytes": index_bytes,
+        "full_build_s": round(full_build, 3),
+        "incremental_build_s": round(incremental_build, 3),
+        "load_ms": round(load_time * 1000, 2),
+        "search": summarize(latencies),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Cold-start benchmark: how long a new replica takes to serve its first page or request.
+
+Every sample is a fresh Python process, as on a newly scaled-up container:
+
+* ``import``: process start until ``guidance.services`` is imported;
+* ``streamlit``: process start until the first full run of streamlit_app.py
+  (through AppTest) has rendered, plus that run and a second, warm run;
+* ``api``: process start until ``uvicorn api:app`` answers ``/healthz``,
+  plus the first ``/v1/events`` request.
+
+Upstreams point at ``StubUpstream`` through the environment, so no
+network is needed. Results are written to a JSON artifact so runs can be
+compared across changes.
+
+Usage (from the repository root):
+
+    python -m benchmarks.startup_bench --runs 5 --output startup_bench.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks.api_bench import free_port
+from benchmarks.load_test import APP_PATH, summarize
+from benchmarks.stub_servers import StubUpstream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_CHILD = """
+import json, time
+started = time.perf_counter()
+import guidance.services
+print(json.dumps({"ready": time.time(), "import_s": time.perf_counter() - started}))
+"""
+
+STREAMLIT_CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+started = time.perf_counter()
+app.run()
+first_run = time.perf_counter() - started
+ready = time.time()
+started = time.perf_counter()
+app.run()
+print(json.dumps({"ready": ready, "first_run_s": first_run, "warm_run_s": time.perf_counter() - started,
+                  "errors": len(app.exception)}))
+"""
+
+
+def run_child(code, env, *args):
+    spawned = time.time()
+    output = subprocess.run(
+        [sys.executable, "-c", code, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["cold_start_s"] = result.pop("ready") - spawned
+    return result
+
+
+def run_api(env, timeout=60):
+    port = free_port()
+    spawned = time.time()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        while True:
+            if time.time() - spawned > timeout:
+                raise RuntimeError("API server did not start")
+            try:
+                if requests.get(f"{base_url}/healthz", timeout=1).status_code == 200:
+                    break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.01)
+        cold_start = time.time() - spawned
+        started = time.perf_counter()
+        requests.get(f"{base_url}/v1/events", params={"religion": "Islam"}, timeout=timeout).raise_for_status()
+        return {"cold_start_s": cold_start, "first_request_s": time.perf_counter() - started}
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def collect(samples, name):
+    return summarize([sample[name] for sample in samples])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--skip", default="", help="comma-separated measurements to skip (import, streamlit, api)")
+    parser.add_argument("--output", default=None, help="optional JSON artifact path")
+    args = parser.parse_args(argv)
+    skip = set(filter(None, args.skip.split(",")))
+
+    stub = StubUpstream(token_delay=0).start()
+    env = {**os.environ, "API_KEY": "benchmark-key", "NEWS_API_KEY": "benchmark-news-key", **stub.secrets()}
+    report = {"runs": args.runs}
+    try:
+        if "import" not in skip:
+            samples = [run_child(IMPORT_CHILD, env) for _ in range(args.runs)]
+            report["import"] = {name: collect(samples, name) for name in ("cold_start_s", "import_s")}
+        if "streamlit" not in skip:
+            samples = [run_child(STREAMLIT_CHILD, env, APP_PATH) for _ in range(args.runs)]
+            report["streamlit"] = {name: collect(samples, name) for name in ("cold_start_s", "first_run_s", "warm_run_s")}
+            report["streamlit"]["errors"] = sum(sample["errors"] for sample in samples)
+        if "api" not in skip:
+            samples = [run_api(env) for _ in range(args.runs)]
+            report["api"] = {name: collect(samples, name) for name in ("cold_start_s", "first_request_s")}
+    finally:
+        stub.stop()
+    report["upstream_calls"] = dict(stub.counts)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Local stand-ins for every upstream the app talks to.
+
+One threaded HTTP server answers the completions API (blocking and SSE
+streaming), NewsAPI, the music API, OurManna and LibreTranslate. Each
+route can be given an artificial latency and a failure rate, and every
+request is counted so benchmarks can report upstream call volume.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROUTES = {
+    "/chat/completions": "chat",
+    "/news": "news",
+    "/music": "music",
+    "/verse": "verse",
+    "/translate": "translate",
+}
+
+ANSWER = (
+    "Peace and compassion are at the heart of this teaching. Reflect on it daily, "
+    "share kindness with others and return to prayer whenever the mind is restless."
+)
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Pooled clients drop idle keep-alive connections; that is not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubUpstream:
+    """Threaded stub server; ``secrets()`` gives the endpoint overrides for the app."""
+
+    def __init__(self, latency=None, failure_rate=None, token_delay=0.01, seed=None):
+        self.latency = dict(latency or {})
+        self.failure_rate = dict(failure_rate or {})
+        self.token_delay = token_delay
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self, host="127.0.0.1", port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub._handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                stub._handle(self, json.loads(self.rfile.read(length) or b"{}"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _QuietServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="stub-upstream", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def secrets(self):
+        return {
+            "API_URL": f"{self.base_url}/chat/completions",
+            "NEWS_API_URL": f"{self.base_url}/news",
+            "MUSIC_API_URL": f"{self.base_url}/music",
+            "BIBLE_API_URL": f"{self.base_url}/verse",
+            "TRANSLATION_API_URL": f"{self.base_url}/translate",
+        }
+
+    def _should_fail(self, route):
+        rate = self.failure_rate.get(route, 0.0)
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _handle(self, handler, body):
+        route = ROUTES.get(urlsplit(handler.path).path)
+        with self._lock:
+            self.counts[route or "unknown"] += 1
+        if route is None:
+            self._send_json(handler, 404, {"error": "not found"})
+            return
+        time.sleep(self.latency.get(route, 0.0))
+        if self._should_fail(route):
+            self._send_json(handler, 503, {"error": "injected failure"})
+            return
+        if route == "chat":
+            if body.get("stream"):
+                self._stream_completion(handler)
+            else:
+                self._send_json(handler, 200, {
+                    "choices": [{"message": {"role": "assistant", "content": ANSWER}}],
+                    "usage": {"prompt_tokens": 60, "completion_tokens": len(ANSWER.split()), "total_tokens": 60 + len(ANSWER.split())},
+                })
+        elif route == "news":
+            self._send_json(handler, 200, {"articles": [
+                {"title": f"Stub headline {index}", "url": f"https://example.com/news/{index}"} for index in range(5)
+            ]})
+        elif route == "music":
+            self._send_json(handler, 200, {"music_url": "https://example.com/stub_music.mp3"})
+        elif route == "verse":
+            self._send_json(handler, 200, {"verse": {"details": {"text": "The Lord is my shepherd; I shall not want."}}})
+        elif route == "translate":
+            texts = body.get("q")
+            target = body.get("target")
+            if isinstance(texts, list):
+                translated = [f"[{target}] {text}" for text in texts]
+            else:
+                translated = f"[{target}] {texts}"
+            self._send_json(handler, 200, {"translatedText": translated})
+
+    @staticmethod
+    def _send_json(handler, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _stream_completion(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def chunk(data):
+            handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            handler.wfile.flush()
+
+        for word in ANSWER.split(" "):
+            event = {"choices": [{"delta": {"content": word + " "}}]}
+            chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            time.sleep(self.token_delay)
+        chunk(b"data: [DONE]\n\n")
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
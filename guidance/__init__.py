@@ -0,0 +1,22 @@
+"""Shared, Streamlit-independent helpers for the AI-Powered Multi-Religious Guidance app.
+
+Submodules are imported on first attribute access (``guidance.retrieval``
+only loads NumPy when it is used), so importing the package is cheap.
+"""
+import importlib
+
+_SUBMODULES = frozenset({
+    "accounts", "assets", "astronomy", "breaker", "cache", "config", "content", "context", "daily_store", "fanout",
+    "festivals", "history", "http_client", "locations", "metrics", "prayer_times", "response_cache",
+    "retrieval", "router", "scheduler", "services", "shared_state", "singleflight", "storage", "translation",
+})
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES)
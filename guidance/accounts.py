@@ -0,0 +1,54 @@
+"""Accounts keyed by a secret token, never by a display name.
+
+Profiles and chat history used to be stored under the name typed into
+the profile form, and ``?user=<name>`` loaded them. Anyone who knew or
+guessed a name could read that person's conversation. Now, saving a
+profile creates an account with a random token. The page keeps the
+token in its URL (``?token=``) and API clients send it as a bearer
+token. Everything is stored under ``account_key(token)``, a hash of the
+token, so the store never holds the token itself. The display name is
+just a field of the profile.
+
+Guests have no account. Their history is stored under
+``guest_key(session_id)`` and expires once it has been idle for
+``GUEST_HISTORY_TTL`` (see ``WriteBehindStore.expire_idle``).
+"""
+import hashlib
+import os
+import secrets
+
+TOKEN_BYTES = 24
+# Tokens we issue are 32 characters; shorter ones are rejected outright
+MIN_TOKEN_LENGTH = 20
+GUEST_PREFIX = "guest:"
+GUEST_HISTORY_TTL = float(os.environ.get("GUEST_HISTORY_TTL", 7 * 24 * 60 * 60))
+
+
+def new_token():
+    return secrets.token_urlsafe(TOKEN_BYTES)
+
+
+def account_key(token):
+    """Storage key of the account for ``token``, or ``None`` if it cannot be a token."""
+    if not isinstance(token, str) or len(token) < MIN_TOKEN_LENGTH:
+        return None
+    return "account:" + hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def guest_key(session_id):
+    return GUEST_PREFIX + session_id
+
+
+def load_account(storage, token):
+    """Return ``(key, profile)`` for an existing account, or ``(None, None)`` for an unknown token."""
+    key = account_key(token)
+    profile = storage.load_profile(key) if key else None
+    return (key, profile) if profile is not None else (None, None)
+
+
+def create_account(storage, profile):
+    """Store ``profile`` under a new account; return the account's token and key."""
+    token = new_token()
+    key = account_key(token)
+    storage.save_profile(key, profile)
+    return token, key
@@ -0,0 +1,294 @@
+"""Static assets served once from Streamlit's static folder.
+
+Inlining the theme CSS/JS into the page sends it over the websocket again
+on every rerun. Instead, ``build_assets`` minifies the files in
+``assets/`` into ``static/assets/<name>.<hash>.<ext>``, which Streamlit
+serves at ``app/static/...`` when ``server.enableStaticServing`` is on.
+The content hash is part of the file name, so a changed file gets a new
+URL and the old ones can be cached forever; ``ImmutableAssetsMiddleware``
+adds the long-lived ``Cache-Control`` header (see ``serve.py``).
+
+Remote media (background music) is downloaded once by ``MediaCache`` into
+``static/media/`` on a background thread, transcoded to AAC when it is
+uncompressed and ``ffmpeg`` is installed, and then served locally.
+Streamlit's static file route answers HTTP range requests, so players can
+seek and resume without fetching the whole file.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from urllib.parse import urlsplit
+
+from guidance import http_client, metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.environ.get("ASSETS_SOURCE_DIR", os.path.join(ROOT, "assets"))
+# Streamlit serves the "static" folder next to the main script at app/static/
+STATIC_DIR = os.environ.get("ASSETS_STATIC_DIR", os.path.join(ROOT, "static"))
+STATIC_URL = os.environ.get("ASSETS_STATIC_URL", "app/static")
+
+# Hashed files left over from older builds are kept this long for pages still open
+STALE_ASSET_AGE = 24 * 3600
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+MEDIA_MAX_BYTES = int(os.environ.get("MEDIA_MAX_BYTES", 50 * 1024 * 1024))
+MEDIA_AUDIO_BITRATE = os.environ.get("MEDIA_AUDIO_BITRATE", "96k")
+# How long a failed download is remembered before it is tried again
+MEDIA_RETRY_AFTER = 300.0
+MEDIA_EXTENSIONS = {".mp3", ".m4a", ".aac", ".ogg", ".oga", ".opus", ".wav", ".flac", ".aif", ".aiff", ".mp4", ".webm"}
+UNCOMPRESSED_EXTENSIONS = {".wav", ".flac", ".aif", ".aiff"}
+
+_CSS_COMMENTS = re.compile(r"/\*.*?\*/", re.S)
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_JS_LINE_COMMENT = re.compile(r"^\s*//.*$", re.M)
+
+
+def minify_css(text):
+    """Drop comments and insignificant whitespace (string literals are not special-cased)."""
+    text = _CSS_COMMENTS.sub("", text)
+    text = re.sub(r"\s+", " ", text)
+    text = _CSS_PUNCTUATION.sub(r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text):
+    """Drop whole-line comments, indentation and blank lines; line breaks are kept for ASI."""
+    text = _JS_LINE_COMMENT.sub("", text)
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+_MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(source_dir=SOURCE_DIR, static_dir=STATIC_DIR):
+    """Minify and content-hash the CSS/JS in ``source_dir``; return ``{name: hashed file name}``.
+
+    Unchanged files keep their name, so rebuilding is cheap and safe to
+    run from every process at startup.
+    """
+    out_dir = os.path.join(static_dir, "assets")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    with metrics.span("assets.build"):
+        for name in sorted(os.listdir(source_dir)):
+            stem, ext = os.path.splitext(name)
+            minify = _MINIFIERS.get(ext)
+            if minify is None:
+                continue
+            with open(os.path.join(source_dir, name), encoding="utf-8") as source:
+                body = minify(source.read()).encode("utf-8")
+            filename = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+            if not os.path.exists(os.path.join(out_dir, filename)):
+                _write_atomic(os.path.join(out_dir, filename), body)
+            manifest[name] = filename
+        _write_atomic(os.path.join(out_dir, "manifest.json"), json.dumps(manifest, indent=2).encode("utf-8"))
+        _prune(out_dir, set(manifest.values()) | {"manifest.json"})
+    return manifest
+
+
+def _prune(directory, keep):
+    cutoff = time.time() - STALE_ASSET_AGE
+    for entry in os.scandir(directory):
+        if entry.name not in keep and entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class StaticAssets:
+    """The built asset manifest plus URLs for it; falls back to inlining when not served."""
+
+    def __init__(self, source_dir=SOURCE_DIR, static_dir=STATIC_DIR, url_prefix=STATIC_URL):
+        self.source_dir = source_dir
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        try:
+            self.manifest = build_assets(source_dir, static_dir)
+        except OSError:
+            # e.g. a read-only checkout; the page inlines the minified text instead
+            self.manifest = {}
+        self._texts = {}
+
+    def url(self, name):
+        """Return the cacheable URL for ``name`` (e.g. ``"theme.css"``), or ``None`` if it is not built."""
+        filename = self.manifest.get(name)
+        return f"{self.url_prefix}/assets/{filename}" if filename else None
+
+    def text(self, name):
+        """Return the minified contents of ``name``, for inlining."""
+        text = self._texts.get(name)
+        if text is None:
+            with open(os.path.join(self.source_dir, name), encoding="utf-8") as source:
+                text = self._texts[name] = _MINIFIERS[os.path.splitext(name)[1]](source.read())
+        return text
+
+
+class MediaCache:
+    """Local copies of remote media files, downloaded in the background on first request."""
+
+    def __init__(self, static_dir=STATIC_DIR, url_prefix=STATIC_URL, max_bytes=MEDIA_MAX_BYTES):
+        self.directory = os.path.join(static_dir, "media")
+        self.url_prefix = url_prefix.rstrip("/")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed = {}  # key -> time of the last failed download
+        self._files = {}  # key -> cached file name
+
+    def _find(self, key, ext):
+        # Another process may have downloaded it; the extension depends on the source and transcoding
+        for candidate in (".m4a", ext, *sorted(MEDIA_EXTENSIONS)):
+            if candidate and os.path.exists(os.path.join(self.directory, key + candidate)):
+                self._files[key] = key + candidate
+                return key + candidate
+        return None
+
+    def local_url(self, url):
+        """Return the local URL for ``url`` if it is cached, else start fetching it and return ``None``."""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+        filename = self._files.get(key) or self._find(key, _extension(url))
+        if filename:
+            metrics.registry.inc("app_media_cache_total", result="hit")
+            return f"{self.url_prefix}/media/{filename}"
+        metrics.registry.inc("app_media_cache_total", result="miss")
+        with self._lock:
+            if key in self._pending or time.monotonic() - self._failed.get(key, -MEDIA_RETRY_AFTER) < MEDIA_RETRY_AFTER:
+                return None
+            self._pending.add(key)
+        threading.Thread(target=self._fetch, args=(url, key), name="media-download", daemon=True).start()
+        return None
+
+    def _fetch(self, url, key):
+        try:
+            with metrics.span("media.download", host=urlsplit(url).hostname):
+                self._download(url, key)
+        except Exception:
+            with self._lock:
+                self._failed[key] = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _download(self, url, key):
+        os.makedirs(self.directory, exist_ok=True)
+        response = http_client.get(url, stream=True)
+        part_path = None
+        try:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+            if not content_type.startswith(("audio/", "video/")):
+                raise ValueError(f"Not a media file: {content_type or 'unknown type'}")
+            ext = _extension(url) or mimetypes.guess_extension(content_type) or ""
+            if ext not in MEDIA_EXTENSIONS:
+                raise ValueError(f"Unsupported media type: {content_type}")
+            part_path = os.path.join(self.directory, f"{key}{ext}.{os.getpid()}.part")
+            size = 0
+            with open(part_path, "wb") as part:
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"Media file is larger than {self.max_bytes} bytes")
+                    part.write(chunk)
+        except Exception:
+            if part_path is not None and os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        finally:
+            response.close()
+        metrics.annotate(bytes=size)
+        if ext in UNCOMPRESSED_EXTENSIONS and _transcode(part_path, os.path.join(self.directory, key + ".m4a")):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, os.path.join(self.directory, key + ext))
+
+
+def _extension(url):
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    return ext if ext in MEDIA_EXTENSIONS else ""
+
+
+def _transcode(source_path, target_path):
+    """Encode ``source_path`` to AAC with ffmpeg, if it is installed; return whether it worked."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return False
+    tmp_path = f"{target_path}.{os.getpid()}.tmp.m4a"
+    result = subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", "-i", source_path, "-vn", "-c:a", "aac", "-b:a", MEDIA_AUDIO_BITRATE, tmp_path],
+        capture_output=True,
+        timeout=300,
+    )
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, target_path)
+    return True
+
+
+class ImmutableAssetsMiddleware:
+    """ASGI middleware marking hashed assets and cached media as cacheable for a year.
+
+    Both are safe to cache forever: asset names change with their content
+    and a media file is never rewritten once it is in place.
+    """
+
+    def __init__(self, app, paths=("/app/static/assets/", "/app/static/media/"), max_age=IMMUTABLE_MAX_AGE):
+        self.app = app
+        self.paths = paths
+        self.header = f"public, max-age={max_age}, immutable".encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        # Substring match so a server.baseUrlPath prefix is covered too
+        if scope["type"] != "http" or not any(path in scope["path"] for path in self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cache_control(message):
+            if message["type"] == "http.response.start" and message["status"] in (200, 206, 304):
+                headers = [(name, value) for name, value in message.get("headers", []) if name.lower() != b"cache-control"]
+                headers.append((b"cache-control", self.header))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_control)
+
+
+_assets = None
+_media = None
+_lock = threading.Lock()
+
+
+def get_assets():
+    """Return the process-wide ``StaticAssets``, building them on first use."""
+    global _assets
+    if _assets is None:
+        with _lock:
+            if _assets is None:
+                _assets = StaticAssets()
+    return _assets
+
+
+def get_media_cache():
+    """Return the process-wide ``MediaCache``."""
+    global _media
+    if _media is None:
+        with _lock:
+            if _media is None:
+                _media = MediaCache()
+    return _media
@@ -0,0 +1,144 @@
+"""Solar and lunar positions with NumPy, for prayer times and festival calendars.
+
+Low-precision series are enough here:
+- the US Naval Observatory's approximate solar position, good to about a minute of time;
+- Meeus' lunar phase series (Astronomical Algorithms, ch. 49), good to a few minutes
+  between 1900 and 2100.
+
+So nothing has to be fetched from an external API. Every function takes
+arrays, so a whole year of days (or every lunation of a year) is one call.
+Julian days (``jd``) are in Universal Time.
+"""
+import numpy as np
+
+J2000 = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+SYNODIC_MONTH = 29.530588861
+# Terrestrial minus universal time, close enough for this century
+DELTA_T_DAYS = 69.0 / 86400
+# Apparent altitude of the sun's upper limb at sunrise and sunset (refraction included)
+SUNRISE_ALTITUDE = -0.833
+
+
+def julian_day(days):
+    """Julian day at 0h UT of ``days`` (``datetime64[D]`` values)."""
+    return np.asarray(days, dtype="datetime64[D]").astype(np.int64) + UNIX_EPOCH_JD
+
+
+def to_datetime64(jd):
+    """Inverse of ``julian_day`` for fractional days, as ``datetime64[s]``."""
+    seconds = np.round((np.asarray(jd) - UNIX_EPOCH_JD) * 86400).astype(np.int64)
+    return seconds.astype("datetime64[s]")
+
+
+def sun_position(jd):
+    """Return the sun's apparent ecliptic longitude and declination (degrees) and the equation of time (hours)."""
+    d = np.asarray(jd, dtype=float) - J2000
+    mean_anomaly = np.radians(357.529 + 0.98560028 * d)
+    mean_longitude = 280.459 + 0.98564736 * d
+    longitude = np.radians(mean_longitude + 1.915 * np.sin(mean_anomaly) + 0.020 * np.sin(2 * mean_anomaly))
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+    right_ascension = np.degrees(np.arctan2(np.cos(obliquity) * np.sin(longitude), np.cos(longitude))) / 15
+    equation_of_time = (mean_longitude / 15 - right_ascension + 12) % 24 - 12
+    declination = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(longitude)))
+    # Apparent longitude: aberration and the main nutation term
+    apparent = np.degrees(longitude) - 0.00569 - 0.00478 * np.sin(np.radians(125.04 - 0.052954 * d))
+    return apparent % 360, declination, equation_of_time
+
+
+def solar_longitude_crossings(year, longitudes):
+    """Return the ``jd`` at which the sun reaches each ecliptic longitude (degrees) during ``year``."""
+    targets = np.atleast_1d(np.asarray(longitudes, dtype=float))
+    # Hourly samples over the year; the sun moves about 0.04 degrees an hour
+    jd = julian_day(np.datetime64(f"{year}-01-01", "D")) + np.arange(0, 367 * 24) / 24
+    longitude = sun_position(jd)[0]
+    difference = (longitude[None, :] - targets[:, None] + 180) % 360 - 180
+    crossed = (difference[:, :-1] < 0) & (difference[:, 1:] >= 0)
+    index = crossed.argmax(axis=1)
+    rows = np.arange(len(targets))
+    before, after = difference[rows, index], difference[rows, index + 1]
+    return jd[index] + (-before / (after - before)) / 24
+
+
+_PHASE_TERMS = {
+    # sin argument -> (new moon coefficient, full moon coefficient, power of E)
+    "Mp": (-0.40720, -0.40614, 0),
+    "M": (0.17241, 0.17302, 1),
+    "2Mp": (0.01608, 0.01614, 0),
+    "2F": (0.01039, 0.01043, 0),
+    "Mp-M": (0.00739, 0.00734, 1),
+    "Mp+M": (-0.00514, -0.00515, 1),
+    "2M": (0.00208, 0.00209, 2),
+    "Mp-2F": (-0.00111, -0.00111, 0),
+    "Mp+2F": (-0.00057, -0.00057, 0),
+    "2Mp+M": (0.00056, 0.00056, 1),
+    "3Mp": (-0.00042, -0.00042, 0),
+    "M+2F": (0.00042, 0.00042, 1),
+    "M-2F": (0.00038, 0.00038, 1),
+    "2Mp-M": (-0.00024, -0.00024, 1),
+    "Om": (-0.00017, -0.00017, 0),
+}
+
+
+def lunar_phases(jd_start, jd_end, phase="new"):
+    """Return the ``jd`` of every new (or ``"full"``) moon from ``jd_start`` up to ``jd_end``."""
+    offset = 0.0 if phase == "new" else 0.5
+    first = np.floor((jd_start - 2451550.09766) / SYNODIC_MONTH) - 1
+    k = np.arange(first, first + (jd_end - jd_start) / SYNODIC_MONTH + 3) + offset
+    t = k / 1236.85
+    jde = 2451550.09766 + SYNODIC_MONTH * k + 0.00015437 * t ** 2 - 0.000000150 * t ** 3 + 0.00000000073 * t ** 4
+    m = np.radians(2.5534 + 29.10535670 * k - 0.0000014 * t ** 2 - 0.00000011 * t ** 3)
+    mp = np.radians(201.5643 + 385.81693528 * k + 0.0107582 * t ** 2 + 0.00001238 * t ** 3 - 0.000000058 * t ** 4)
+    f = np.radians(160.7108 + 390.67050284 * k - 0.0016118 * t ** 2 - 0.00000227 * t ** 3 + 0.000000011 * t ** 4)
+    om = np.radians(124.7746 - 1.56375588 * k + 0.0020672 * t ** 2 + 0.00000215 * t ** 3)
+    e = 1 - 0.002516 * t - 0.0000074 * t ** 2
+    arguments = {
+        "Mp": mp, "M": m, "2Mp": 2 * mp, "2F": 2 * f, "Mp-M": mp - m, "Mp+M": mp + m, "2M": 2 * m,
+        "Mp-2F": mp - 2 * f, "Mp+2F": mp + 2 * f, "2Mp+M": 2 * mp + m, "3Mp": 3 * mp, "M+2F": m + 2 * f,
+        "M-2F": m - 2 * f, "2Mp-M": 2 * mp - m, "Om": om,
+    }
+    column = 0 if phase == "new" else 1
+    for name, terms in _PHASE_TERMS.items():
+        jde = jde + terms[column] * e ** terms[2] * np.sin(arguments[name])
+    jd = jde - DELTA_T_DAYS
+    return jd[(jd >= jd_start) & (jd < jd_end)]
+
+
+def prayer_times(latitude, longitude, days, utc_offsets, fajr_angle, isha_angle, asr_factor=1):
+    """Local prayer times for each of ``days``, as hours after local midnight.
+
+    Returns an array of shape ``(len(days), 6)``: fajr, sunrise, dhuhr,
+    asr, maghrib (sunset) and isha. ``utc_offsets`` are the local UTC
+    offsets in hours for each day. Where the sun never gets as low as the
+    fajr or isha angle (high latitudes in summer), those times are clamped
+    to a share of the night (``angle / 60``); where it never rises or
+    sets at all, the times are NaN.
+    """
+    days = np.asarray(days, dtype="datetime64[D]")
+    # Sun position at local solar noon
+    _, declination, equation_of_time = sun_position(julian_day(days) + 0.5 - longitude / 360)
+    dhuhr = 12 - longitude / 15 - equation_of_time
+    lat = np.radians(latitude)
+    dec = np.radians(declination)
+
+    def hours_from_noon(altitude):
+        cos_hour_angle = (np.sin(np.radians(altitude)) - np.sin(lat) * np.sin(dec)) / (np.cos(lat) * np.cos(dec))
+        with np.errstate(invalid="ignore"):
+            return np.degrees(np.arccos(cos_hour_angle)) / 15
+
+    sunrise = dhuhr - hours_from_noon(SUNRISE_ALTITUDE)
+    sunset = dhuhr + hours_from_noon(SUNRISE_ALTITUDE)
+    fajr = dhuhr - hours_from_noon(-fajr_angle)
+    isha = dhuhr + hours_from_noon(-isha_angle)
+    # Asr: an object's shadow is asr_factor times its length plus its noon shadow
+    asr_altitude = np.degrees(np.arctan(1 / (asr_factor + np.tan(np.abs(lat - dec)))))
+    asr = dhuhr + hours_from_noon(asr_altitude)
+
+    night = 24 - (sunset - sunrise)
+    fajr_limit = fajr_angle / 60 * night
+    isha_limit = isha_angle / 60 * night
+    with np.errstate(invalid="ignore"):
+        fajr = np.where(np.isnan(fajr) | (sunrise - fajr > fajr_limit), sunrise - fajr_limit, fajr)
+        isha = np.where(np.isnan(isha) | (isha - sunset > isha_limit), sunset + isha_limit, isha)
+    times = np.stack([fajr, sunrise, dhuhr, asr, sunset, isha], axis=-1)
+    return times + np.asarray(utc_offsets, dtype=float)[:, None]
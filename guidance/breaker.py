@@ -0,0 +1,111 @@
+"""Per-upstream circuit breakers.
+
+A dead or flaky dependency (an unresolvable host, a provider outage)
+would otherwise cost every rerun a full connect timeout before the
+fallback is shown. Each upstream host gets a ``CircuitBreaker``: after
+``failure_threshold`` consecutive failures it opens and calls fail
+instantly with ``CircuitOpenError`` for ``cooldown`` seconds; then it
+goes half-open and lets a single probe through, closing again on
+success or re-opening on failure. ``CircuitOpenError`` is a
+``requests`` ``ConnectionError``, so existing error handling and
+fallbacks apply unchanged.
+
+Breaker state is exported as the ``app_circuit_state`` gauge
+(0 closed, 1 half-open, 2 open) with transition and rejection counters.
+"""
+import os
+import threading
+import time
+
+import requests
+
+from guidance import metrics
+
+FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 30))
+HALF_OPEN_PROBES = int(os.environ.get("BREAKER_HALF_OPEN_PROBES", 1))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a timed cool-down and half-open probes."""
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, half_open_probes=HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        metrics.registry.set_gauge("app_circuit_state", 0, upstream=name)
+
+    def _transition(self, state):
+        self.state = state
+        metrics.registry.set_gauge("app_circuit_state", _STATE_VALUES[state], upstream=self.name)
+        metrics.registry.inc("app_circuit_transitions_total", upstream=self.name, state=state)
+
+    def before_call(self):
+        """Admit a call or raise ``CircuitOpenError``."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+                self._probes = 0
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            remaining = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        metrics.registry.inc("app_circuit_rejections_total", upstream=self.name)
+        metrics.annotate(status="circuit_open", breaker=self.state)
+        raise CircuitOpenError(f"{self.name} is unavailable; retrying in {remaining:.0f}s")
+
+    def record(self, ok):
+        """Record a call's outcome: ``True``, ``False``, or ``None`` for neither (e.g. rate limited)."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+            if ok is None:
+                return
+            if ok:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Return the process-wide breaker for upstream ``name`` (e.g. a host name)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def snapshot():
+    """Return ``{upstream: {"state": ..., "failures": ...}}`` for every breaker."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
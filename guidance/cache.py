@@ -0,0 +1,182 @@
+"""Shared TTL cache with LRU eviction and stale-while-revalidate.
+
+Streamlit reruns the whole script on every widget interaction, so any
+upstream fetch made during the render would otherwise be repeated on
+every keystroke. Entries live in one process-wide, size-bounded cache.
+Once an entry passes its TTL it is still served for ``stale_ttl`` more
+seconds while a single background refresh replaces it, so only the very
+first fetch of a key ever blocks a render, and concurrent misses for the
+same key are coalesced into a single fetch. Failures can be cached too
+(``negative_ttl``), so a failing upstream is asked again at most once per
+window instead of on every rerun.
+
+The process-wide ``shared_cache`` is backed by ``guidance.shared_state``.
+On a local miss, a fresh entry fetched by another process or node is
+used. Otherwise one process at a time fetches while the others wait for
+its entry. Only JSON-serializable values are shared; failures stay local.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from guidance import metrics
+from guidance.shared_state import get_shared_state
+from guidance.singleflight import shared_flights
+
+DEFAULT_MAXSIZE = 512
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries carry their own expiry times."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (value, fresh_until, stale_until)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, now=None):
+        """Return ``(found, value, fresh)``; expired entries are dropped."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None, False
+            value, fresh_until, stale_until = entry
+            if now >= stale_until:
+                del self._entries[key]
+                self.misses += 1
+                return False, None, False
+            self._entries.move_to_end(key)
+            if now < fresh_until:
+                self.hits += 1
+                return True, value, True
+            self.stale_hits += 1
+            return True, value, False
+
+    def set(self, key, value, ttl, stale_ttl=0, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries[key] = (value, now + ttl, now + ttl + stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# One cache shared by every source in the process
+shared_cache = TTLCache()
+
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh(cache, key, fetch, stale_ttl):
+    try:
+        value, ttl = fetch()
+        cache.set(key, value, ttl, stale_ttl)
+    except Exception:
+        # Keep serving the stale value; the next read after it expires refetches
+        pass
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _fetch_shared(fetch, key, ttl, stale_ttl):
+    """Another process's fresh value for ``key``, or ``fetch()`` run by one process at a time and shared."""
+    def compute():
+        return {"value": fetch()[0], "fresh_until": time.time() + ttl}
+
+    entry = get_shared_state().get_or_compute(
+        key, compute, ttl + stale_ttl, accept=lambda entry: entry["fresh_until"] > time.time()
+    )
+    return entry["value"], max(0.0, entry["fresh_until"] - time.time())
+
+
+class _Failure:
+    """Cached stand-in for an exception raised by a fetch."""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _load(cache, key, fetch, stale_ttl, negative_ttl):
+    try:
+        value, ttl = fetch()
+    except Exception as exc:
+        if negative_ttl:
+            cache.set(key, _Failure(exc), negative_ttl)
+        raise
+    cache.set(key, value, ttl, stale_ttl)
+    return value
+
+
+def cached(source, ttl, stale_ttl=0, cache=None, negative_ttl=0):
+    """Cache ``func`` results under ``(source, *args)`` for ``ttl`` seconds.
+
+    Fetch functions should raise on failure and leave the fallback to
+    their caller. Exceptions are only cached when ``negative_ttl`` is set;
+    they are then re-raised without calling ``func`` for that many seconds.
+    Entries older than ``ttl`` but younger than ``ttl + stale_ttl`` are
+    returned immediately while a background refresh runs.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target = shared_cache if cache is None else cache
+            key = (source, args, tuple(sorted(kwargs.items())))
+            # fetch() returns the value and how long it stays fresh
+            fetch = lambda: (func(*args, **kwargs), ttl)
+            if target is shared_cache:
+                fetch = functools.partial(_fetch_shared, fetch, key, ttl, stale_ttl)
+            found, value, fresh = target.get(key)
+            if found and isinstance(value, _Failure):
+                metrics.annotate(cache="negative")
+                raise value.error
+            metrics.annotate(cache="hit" if fresh else "stale" if found else "miss")
+            if found:
+                if not fresh:
+                    with _refreshing_lock:
+                        start = key not in _refreshing
+                        _refreshing.add(key)
+                    if start:
+                        _refresh_pool.submit(_refresh, target, key, fetch, stale_ttl)
+                return value
+            # Concurrent misses for the same key share one fetch
+            return shared_flights.do(key, lambda: _load(target, key, fetch, stale_ttl, negative_ttl))
+
+        wrapper.source = source
+        return wrapper
+
+    return decorator
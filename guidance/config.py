@@ -0,0 +1,100 @@
+"""Typed app configuration, loaded once per process.
+
+Keys and endpoints used to be read from ``st.secrets`` at the top of the
+script on every rerun, which also made importing the helpers impossible
+without a Streamlit runtime. ``Config`` gathers them in one frozen object;
+``get_config()`` builds it on first use from, in order of precedence:
+
+1. environment variables (``API_KEY``, ``API_URL``, ...: the field name in
+   upper case),
+2. the ``secrets`` mapping passed to the first call (the Streamlit page
+   passes ``st.secrets``) or else ``.streamlit/secrets.toml``,
+3. the defaults below.
+
+``configure()`` replaces fields afterwards, e.g. to point at stub servers.
+"""
+import dataclasses
+import os
+import threading
+import tomllib
+from dataclasses import dataclass
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRETS_PATH = os.path.join(ROOT, ".streamlit", "secrets.toml")
+
+
+@dataclass(frozen=True)
+class Config:
+    api_key: Optional[str] = None
+    news_api_key: Optional[str] = None
+    api_url: str = "https://api.aimlapi.com/chat/completions"
+    music_api_url: str = "https://api.religiousmusicapi.com/get_music"
+    bible_api_url: str = "https://beta.ourmanna.com/api/v1/get/?format=json&order=random"
+    news_api_url: str = "https://newsapi.org/v2/everything"
+    translation_api_url: str = "https://libretranslate.de/translate"
+    storage_url: str = "sqlite:///" + os.path.join(ROOT, ".cache", "guidance.sqlite3")
+    # Caches, single-flight leases and quotas shared between processes (see guidance/shared_state.py)
+    shared_state_url: str = "sqlite:///" + os.path.join(ROOT, ".cache", "shared_state.sqlite3")
+    # Daily Prayer of the Day values (see guidance/daily_store.py)
+    prayer_store_path: str = os.path.join(ROOT, ".cache", "prayer_of_the_day.sqlite3")
+    metrics_port: Optional[int] = None
+    # Location for prayer times when the user has not picked one (a name in data/locations.json)
+    default_location: str = "Mecca"
+
+
+def _read_secrets_file(path):
+    try:
+        with open(path, "rb") as secrets_file:
+            return tomllib.load(secrets_file)
+    except FileNotFoundError:
+        return {}
+
+
+def _coerce(field, value):
+    if field.type in (int, Optional[int]):
+        return int(value)
+    return str(value)
+
+
+def load_config(secrets=None, environ=None):
+    """Build a ``Config`` from ``environ`` (default ``os.environ``), ``secrets`` and the defaults."""
+    if secrets is None:
+        secrets = _read_secrets_file(SECRETS_PATH)
+    environ = os.environ if environ is None else environ
+    values = {}
+    for field in dataclasses.fields(Config):
+        name = field.name.upper()
+        value = environ.get(name)
+        if value in (None, ""):
+            try:
+                value = secrets.get(name)
+            except FileNotFoundError:
+                # st.secrets raises this when there is no secrets.toml
+                secrets = {}
+        if value not in (None, ""):
+            values[field.name] = _coerce(field, value)
+    return Config(**values)
+
+
+_config = None
+_lock = threading.Lock()
+
+
+def get_config(secrets=None):
+    """Return the process-wide ``Config``, loading it on first use (``secrets`` is only read then)."""
+    global _config
+    if _config is None:
+        with _lock:
+            if _config is None:
+                _config = load_config(secrets)
+    return _config
+
+
+def configure(**overrides):
+    """Replace fields of the process-wide config, e.g. ``configure(api_url=...)``; ``None`` values are ignored."""
+    global _config
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+    with _lock:
+        _config = dataclasses.replace(_config or load_config(), **overrides)
+    return _config
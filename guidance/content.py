@@ -0,0 +1,109 @@
+"""Versioned static content store (verses, quotes, guides, links).
+
+All static, per-religion content lives in one JSON data file instead of
+dict literals rebuilt on every call. It is loaded once per process into
+a read-only index shared by every session, and reloaded when the file
+changes on disk. The file looks like::
+
+    {
+      "version": 1,
+      "defaults": {"quote": "...", ...},
+      "religions": {"Islam": {"quote": "...", "video": "...", ...}, ...},
+      "languages": {"Spanish": {"Islam": {"quote": "..."}}}
+    }
+
+``languages`` holds optional per-language overrides, so translated
+content can be added without code changes.
+"""
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "content.json")
+# Minimum seconds between checks of the file's modification time
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class ContentIndex:
+    """Immutable lookup of content fields by religion and, optionally, language."""
+
+    __slots__ = ("version", "_defaults", "_religions", "_languages")
+
+    def __init__(self, data):
+        self.version = data.get("version")
+        self._defaults = _freeze(data.get("defaults", {}))
+        self._religions = _freeze(data.get("religions", {}))
+        self._languages = _freeze(data.get("languages", {}))
+
+    def get(self, religion, field, language=None, default=None):
+        if language is not None:
+            value = self._languages.get(language, {}).get(religion, {}).get(field)
+            if value is not None:
+                return value
+        value = self._religions.get(religion, {}).get(field)
+        if value is not None:
+            return value
+        return self._defaults.get(field, default)
+
+    def religions(self):
+        return tuple(self._religions)
+
+
+class ContentStore:
+    """Holds the current ``ContentIndex`` for a file and hot-reloads it on change."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+        self._checked = 0.0
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding="utf-8") as content_file:
+            self._index = ContentIndex(json.load(content_file))
+        self._mtime = mtime
+
+    @property
+    def index(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked < RELOAD_CHECK_INTERVAL:
+            return self._index
+        with self._lock:
+            self._checked = now
+            try:
+                if self._index is None or os.stat(self.path).st_mtime != self._mtime:
+                    self._load()
+            except (OSError, ValueError):
+                # Keep serving the last good version if the file is missing or mid-edit
+                if self._index is None:
+                    raise
+            return self._index
+
+    def get(self, religion, field, language=None, default=None):
+        return self.index.get(religion, field, language, default)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=DEFAULT_PATH):
+    """Return the process-wide store for ``path``."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ContentStore(path)
+        return store
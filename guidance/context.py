@@ -0,0 +1,104 @@
+"""Multi-turn prompt assembly within a per-model token budget.
+
+Sending the whole conversation with every question would make prompt
+size and latency grow without bound. ``ContextBuilder`` sends the most
+recent turns that fit the model's budget and folds everything older into
+a short rolling summary. The summary is kept on the builder (one per
+session) and only the turns that newly fall out of the window are folded
+in, so nothing is recomputed from scratch on each turn.
+"""
+import re
+
+# Prompt token budgets per model, leaving room for the completion itself
+PROMPT_TOKEN_BUDGETS = {
+    "gpt-4": 2500,
+    "gpt-4o-mini": 4000,
+    "gpt-4o": 6000,
+}
+DEFAULT_PROMPT_TOKEN_BUDGET = 2000
+SUMMARY_TOKEN_BUDGET = 300
+# Upper bound on verbatim turns sent, whatever the budget, so each build stays cheap
+MAX_RECENT_MESSAGES = 20
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_LINE_CHARS = 160
+# Separates the rolling summary from the system prompt it is appended to
+SUMMARY_HEADER = "\n\nSummary of the earlier conversation:\n"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate: about four characters per token for English text."""
+    return (len(text) + 3) // 4
+
+
+def message_tokens(content):
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def base_system_prompt(content):
+    """The system prompt of built messages without the rolling summary."""
+    return content.split(SUMMARY_HEADER, 1)[0]
+
+
+def summarize_message(role, content):
+    """Compress a turn to its first sentence, truncated to one short line."""
+    first = _SENTENCE_END.split(content.strip(), 1)[0]
+    if len(first) > SUMMARY_LINE_CHARS:
+        first = first[:SUMMARY_LINE_CHARS - 3].rstrip() + "..."
+    speaker = "User" if role == "user" else "Assistant"
+    return f"{speaker}: {first}"
+
+
+class ContextBuilder:
+    """Builds chat messages from a ``ChatHistory`` plus a rolling summary."""
+
+    def __init__(self, summary_budget=SUMMARY_TOKEN_BUDGET):
+        self.summary_budget = summary_budget
+        self.summary_lines = []
+        self.summarized_upto = 0  # conversation position up to which turns are folded in
+
+    @property
+    def summary(self):
+        return "\n".join(self.summary_lines)
+
+    def _fold(self, messages):
+        for message in messages:
+            self.summary_lines.append(summarize_message(message.role, message.content))
+        # Keep the summary inside its budget by forgetting the oldest lines first
+        while self.summary_lines and estimate_tokens(self.summary) > self.summary_budget:
+            self.summary_lines.pop(0)
+
+    def build(self, history, system_prompt, question, model):
+        """Return the messages to send for ``question`` given the prior ``history``."""
+        budget = PROMPT_TOKEN_BUDGETS.get(model, DEFAULT_PROMPT_TOKEN_BUDGET)
+        remaining = budget - message_tokens(system_prompt) - message_tokens(question) - self.summary_budget
+
+        # Walk back from the newest turn while it fits, never re-sending folded turns
+        recent = []
+        total = len(history)
+        candidates = history.between(max(self.summarized_upto, total - MAX_RECENT_MESSAGES), total)
+        for message in reversed(candidates):
+            cost = message_tokens(message.content)
+            if cost > remaining:
+                break
+            recent.append(message)
+            remaining -= cost
+        recent.reverse()
+
+        window_start = total - len(recent)
+        if window_start > self.summarized_upto:
+            self._fold(history.between(self.summarized_upto, window_start))
+            self.summarized_upto = window_start
+
+        if self.summary_lines:
+            system_prompt = f"{system_prompt}{SUMMARY_HEADER}{self.summary}"
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend({"role": message.role, "content": message.content} for message in recent)
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def reset(self):
+        self.summary_lines = []
+        self.summarized_upto = 0
@@ -0,0 +1,136 @@
+"""Persistent store for values that are generated once per key per day.
+
+Used for the Prayer of the Day, which is the same for everyone with the
+same religion and language on a given day. Values live in a small SQLite
+file so they survive restarts and are shared by every process on the
+host. Concurrent requests for a missing value are single-flighted: one
+caller generates it while the rest wait for its result.
+
+Generation is also coordinated through ``guidance.shared_state``: a
+lease per (day, key) means one process in the deployment generates
+each value. The value is copied into the shared state, so replicas on
+other nodes can read it. The "precomputed today" marker for each batch
+of keys is shared too, so only the first replica of the day starts each
+background precompute.
+"""
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from guidance.shared_state import get_shared_state
+from guidance.singleflight import SingleFlight
+
+# Generation waits for a completion slot and may be retried, so other processes wait this long for it
+LEASE_TTL = 120.0
+# Shared copies and markers outlive the day they belong to
+SHARED_TTL = 2 * 24 * 60 * 60
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path):
+    """Return the process-wide store for ``path``, creating it on first use."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = DailyStore(path)
+        return store
+
+
+class DailyStore:
+    """SQLite-backed ``(day, key) -> text`` store with single-flight generation."""
+
+    def __init__(self, path):
+        self.path = path
+        # Shared state keys use the file name, which is the same on every node
+        self.name = os.path.basename(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._precomputed = set()  # (day, keys) batches already started here
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="daily-precompute")
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS daily (day TEXT, key TEXT, value TEXT, PRIMARY KEY (day, key))")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    @staticmethod
+    def _day(day):
+        return (day or date.today()).isoformat()
+
+    def get(self, key, day=None):
+        row = self._connect().execute(
+            "SELECT value FROM daily WHERE day = ? AND key = ?", (self._day(day), json.dumps(key))
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, value, day=None):
+        day = self._day(day)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO daily (day, key, value) VALUES (?, ?, ?)", (day, json.dumps(key), value))
+            # Earlier days are never served again
+            conn.execute("DELETE FROM daily WHERE day < ?", (day,))
+
+    def get_or_create(self, key, generate, day=None):
+        """Return the day's value for ``key``, generating it at most once.
+
+        ``generate(key)`` must raise on failure so that nothing is stored;
+        callers waiting on that generation receive the same exception.
+        """
+        value = self.get(key, day)
+        if value is not None:
+            return value
+        return self._flights.do((self._day(day), json.dumps(key)), lambda: self._generate(key, generate, day))
+
+    def _shared_key(self, key, day):
+        return "daily", self.name, self._day(day), json.dumps(key)
+
+    def _lookup(self, key, day):
+        value = self.get(key, day)
+        if value is None:
+            # Generated on another node
+            value = get_shared_state().get(self._shared_key(key, day))
+            if value is not None:
+                self.put(key, value, day)
+        return value
+
+    def _generate(self, key, generate, day):
+        def create():
+            value = generate(key)
+            self.put(key, value, day)
+            get_shared_state().set(self._shared_key(key, day), value, SHARED_TTL)
+            return value
+
+        # One process in the deployment generates; the others wait for its value
+        return get_shared_state().single_flight(self._shared_key(key, day), lambda: self._lookup(key, day), create, LEASE_TTL)
+
+    def precompute(self, keys, generate, day=None):
+        """Generate any missing values for ``keys`` in the background, once per day per batch across processes."""
+        batch = (self._day(day), tuple(keys))
+        with self._lock:
+            if batch in self._precomputed:
+                return
+            self._precomputed.add(batch)
+        if not get_shared_state().claim(("daily-precompute", self.name, batch[0], json.dumps(batch[1])), SHARED_TTL):
+            return
+        for key in keys:
+            self._pool.submit(self._precompute_one, key, generate, day)
+
+    def _precompute_one(self, key, generate, day):
+        try:
+            self.get_or_create(key, generate, day)
+        except Exception:
+            # A failed cell is generated on demand by the next request for it
+            pass
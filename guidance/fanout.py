@@ -0,0 +1,43 @@
+"""Concurrent fan-out of independent page data fetches.
+
+The page used to fetch news, music and other data one after another, so its
+latency was the sum of every upstream. ``fetch_concurrently`` submits all
+of them to a shared thread pool at once and waits for each only until its
+own deadline; a source that is late gets its fallback instead of stalling
+the render. Late calls keep running in the background, so any cache they
+populate is warm for the next rerun.
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 16
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="page-fetch")
+
+
+def fetch_concurrently(sources, fell_back=None):
+    """Run ``sources`` in parallel and return ``{name: result}``.
+
+    ``sources`` maps a name to ``(func, fallback, deadline)`` where
+    ``deadline`` is in seconds from the start of the fan-out. A source that
+    raises or misses its deadline resolves to ``fallback``, and its name is
+    added to the ``fell_back`` set when one is given.
+    """
+    start = time.monotonic()
+    # Each source runs in a copy of the caller's context so its spans join the caller's trace
+    futures = {
+        name: (_pool.submit(contextvars.copy_context().run, func), fallback, deadline)
+        for name, (func, fallback, deadline) in sources.items()
+    }
+    results = {}
+    for name, (future, fallback, deadline) in futures.items():
+        remaining = max(0.0, deadline - (time.monotonic() - start))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except Exception:
+            # Covers both a missed deadline and a failing source
+            results[name] = fallback
+            if fell_back is not None:
+                fell_back.add(name)
+    return results
@@ -0,0 +1,255 @@
+"""Rule-based festival calendars, computed locally for any year.
+
+``content.json`` used to carry a hand-maintained list of dated events per
+religion, which went stale every January. ``data/festivals.json`` instead
+holds one rule per festival, and ``FestivalCalendar`` evaluates the rules
+for a whole year at once and caches that year. Rule kinds:
+
+* ``fixed``: a Gregorian ``month`` and ``day``;
+* ``easter``: ``offset`` days from Western Easter (Gregorian computus);
+* ``hebrew``: a ``month`` (1 = Nisan, 7 = Tishrei, 13 = Adar II) and ``day`` of the
+  arithmetic Hebrew calendar. This is exact, and the date given is the
+  first full day; the observance begins at sundown the evening before;
+* ``hijri``: a ``month`` and ``day`` of the Islamic calendar. The month
+  starts on the day after the conjunction in Mecca, or a day later if
+  the conjunction falls after sunset (close to the Umm al-Qura
+  calendar). Sighting-based calendars can differ by a day;
+* ``lunar``: an ``anchor`` of the lunar month (new moon to new moon, in local
+  time at ``utc_offset``) that contains the day the sun reaches
+  ``solar_longitude``. The anchor is ``start`` (the new moon opening the
+  month), ``full`` or ``end``. This covers the Chinese months (principal
+  terms) and the Hindu amanta months (sankrantis, given as tropical
+  longitudes with the Lahiri ayanamsa added);
+* ``solar``: the day the sun reaches ``solar_longitude`` at ``utc_offset``.
+
+``lunar`` and ``solar`` rules take ``shift_hours``, which moves the
+astronomical moment before the local date is taken. For example, a new
+moon during the afternoon still belongs to the previous evening's
+festival. Any rule takes ``offset`` days. Lunisolar dates are good
+approximations; where communities follow local observation or
+almanacs, they can differ by a day.
+"""
+import datetime
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from guidance.astronomy import julian_day, lunar_phases, solar_longitude_crossings, to_datetime64
+
+FESTIVALS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "festivals.json")
+MAX_CACHED_YEARS = 16
+UPCOMING_DAYS = 365
+
+
+def easter(year):
+    """Western Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+# Arithmetic Hebrew calendar (fixed since the 4th century)
+HEBREW_EPOCH = 347995.5
+JD_ORDINAL_OFFSET = 1721424.5
+
+
+def _hebrew_leap(year):
+    return (7 * year + 1) % 19 < 7
+
+
+def _hebrew_elapsed_days(year):
+    months = (235 * year - 234) // 19
+    parts = 12084 + 13753 * months
+    day = months * 29 + parts // 25920
+    # Rosh Hashanah never falls on Sunday, Wednesday or Friday
+    return day + 1 if (3 * (day + 1)) % 7 < 3 else day
+
+
+def _hebrew_delay(year):
+    previous, current, following = (_hebrew_elapsed_days(year + n) for n in (-1, 0, 1))
+    if following - current == 356:
+        return 2
+    if current - previous == 382:
+        return 1
+    return 0
+
+
+def _hebrew_new_year(year):
+    return HEBREW_EPOCH + _hebrew_elapsed_days(year) + _hebrew_delay(year)
+
+
+def _hebrew_month_days(year, month):
+    year_days = _hebrew_new_year(year + 1) - _hebrew_new_year(year)
+    if month in (2, 4, 6, 10, 13) or (month == 12 and not _hebrew_leap(year)):
+        return 29
+    if month == 8:
+        return 30 if year_days % 10 == 5 else 29
+    if month == 9:
+        return 29 if year_days % 10 == 3 else 30
+    return 30
+
+
+def hebrew_to_date(year, month, day):
+    """Gregorian date of ``day`` of ``month`` in Hebrew ``year`` (months counted from Nisan)."""
+    jd = _hebrew_new_year(year) + day + 1
+    last_month = 13 if _hebrew_leap(year) else 12
+    months = list(range(7, month)) if month >= 7 else list(range(7, last_month + 1)) + list(range(1, month))
+    jd += sum(_hebrew_month_days(year, each) for each in months)
+    return datetime.date.fromordinal(int(jd - JD_ORDINAL_OFFSET))
+
+
+# Tabular Islamic calendar, used to pick which lunation is which month
+ISLAMIC_EPOCH = 1948439.5
+MECCA_UTC_OFFSET = 3
+MECCA_SUNSET_HOUR = 18.5
+
+
+def _tabular_hijri_jd(year, month, day):
+    return day + math.ceil(29.5 * (month - 1)) + (year - 1) * 354 + (3 + 11 * year) // 30 + ISLAMIC_EPOCH - 1
+
+
+def _local_dates(jd, utc_offset, shift_hours=0.0):
+    """Local calendar dates (``datetime64[D]``) of UT moments ``jd``."""
+    return to_datetime64(np.asarray(jd) + (utc_offset + shift_hours) / 24).astype("datetime64[D]")
+
+
+def _to_date(value):
+    return value.astype(datetime.date)
+
+
+class FestivalCalendar:
+    """Evaluates festival rules per year and caches each computed year."""
+
+    def __init__(self, rules, max_years=MAX_CACHED_YEARS):
+        self.rules = rules
+        self.max_years = max_years
+        self._years = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path=FESTIVALS_PATH):
+        with open(path, encoding="utf-8") as rules_file:
+            return cls(json.load(rules_file)["religions"])
+
+    def year(self, year):
+        """Return ``{religion: [(date, name), ...]}`` for ``year``, sorted by date."""
+        with self._lock:
+            if year in self._years:
+                self._years.move_to_end(year)
+                return self._years[year]
+        computed = self._compute(year)
+        with self._lock:
+            self._years[year] = computed
+            while len(self._years) > self.max_years:
+                self._years.popitem(last=False)
+        return computed
+
+    def upcoming(self, religion, today=None, days=UPCOMING_DAYS):
+        """Festivals of ``religion`` in the ``days`` from ``today`` on, as ``(date, name)`` pairs."""
+        today = today or datetime.date.today()
+        until = today + datetime.timedelta(days=days)
+        events = [event for year in (today.year, today.year + 1) for event in self.year(year).get(religion, [])]
+        return [event for event in events if today <= event[0] < until]
+
+    def _compute(self, year):
+        # Every astronomical quantity for the year is computed once, vectorized,
+        # and shared by all rules: lunations overlapping the year and the
+        # solar longitude crossings any rule asks for
+        start = julian_day(np.datetime64(f"{year - 1}-12-01", "D"))
+        new_moons = lunar_phases(start, start + 430, "new")
+        full_moons = lunar_phases(start, start + 430, "full")
+        longitudes = sorted({rule["solar_longitude"] for rules in self.rules.values() for rule in rules
+                             if "solar_longitude" in rule})
+        crossings = dict(zip(longitudes, solar_longitude_crossings(year, longitudes))) if longitudes else {}
+        context = {"year": year, "new_moons": new_moons, "full_moons": full_moons, "crossings": crossings}
+
+        calendar = {}
+        for religion, rules in self.rules.items():
+            events = []
+            for rule in rules:
+                day = self._evaluate(rule, context)
+                if day is not None:
+                    day += datetime.timedelta(days=rule.get("offset", 0))
+                    if day.year == year:
+                        events.append((day, rule["name"]))
+            calendar[religion] = sorted(events)
+        return calendar
+
+    def _evaluate(self, rule, context):
+        year = context["year"]
+        kind = rule["rule"]
+        if kind == "fixed":
+            return datetime.date(year, rule["month"], rule["day"])
+        if kind == "easter":
+            return easter(year)
+        if kind == "hebrew":
+            # Tishrei to Tevet fall in Hebrew year year + 3761, Shevat to Elul in year + 3760
+            hebrew_year = year + (3761 if 7 <= rule["month"] <= 10 else 3760)
+            if rule["month"] == 13 and not _hebrew_leap(hebrew_year):
+                return hebrew_to_date(hebrew_year, 12, rule["day"])
+            return hebrew_to_date(hebrew_year, rule["month"], rule["day"])
+        if kind == "hijri":
+            return self._hijri(rule, context)
+        if kind == "lunar":
+            return self._lunar(rule, context)
+        if kind == "solar":
+            moment = context["crossings"][rule["solar_longitude"]]
+            return _to_date(_local_dates(moment, rule.get("utc_offset", 0), rule.get("shift_hours", 0)))
+        raise ValueError(f"Unknown festival rule: {kind}")
+
+    def _hijri(self, rule, context):
+        year = context["year"]
+        # Month starts: the day after the conjunction, or two days after if it falls after sunset in Mecca
+        starts = _local_dates(context["new_moons"], MECCA_UTC_OFFSET, 24 - MECCA_SUNSET_HOUR) + 1
+        approximate_year = int((year - 622) * 33 / 32)
+        for hijri_year in (approximate_year, approximate_year + 1, approximate_year + 2):
+            tabular = _tabular_hijri_jd(hijri_year, rule["month"], 1)
+            tabular_day = _local_dates(tabular + 0.5, 0)
+            nearest = starts[np.abs(starts - tabular_day).argmin()]
+            if abs(int((nearest - tabular_day).astype(int))) > 3:
+                continue
+            day = _to_date(nearest) + datetime.timedelta(days=rule["day"] - 1)
+            if day.year == year:
+                return day
+        return None
+
+    def _lunar(self, rule, context):
+        utc_offset = rule.get("utc_offset", 0)
+        new_moons = context["new_moons"]
+        month_starts = _local_dates(new_moons, utc_offset)
+        contained = _local_dates(context["crossings"][rule["solar_longitude"]], utc_offset)
+        index = np.searchsorted(month_starts, contained, side="right") - 1
+        anchor = rule.get("anchor", "start")
+        if anchor == "start":
+            moment = new_moons[index]
+        elif anchor == "end":
+            moment = new_moons[index + 1]
+        else:
+            full_moons = context["full_moons"]
+            moment = full_moons[np.searchsorted(full_moons, new_moons[index])]
+        return _to_date(_local_dates(moment, utc_offset, rule.get("shift_hours", 0)))
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_festival_calendar():
+    """Return the process-wide ``FestivalCalendar`` for ``data/festivals.json``."""
+    global _calendar
+    if _calendar is None:
+        with _calendar_lock:
+            if _calendar is None:
+                _calendar = FestivalCalendar.from_file()
+    return _calendar
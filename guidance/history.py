@@ -0,0 +1,135 @@
+"""Bounded, compact conversation history.
+
+Each session keeps at most ``maxlen`` recent messages in memory as
+``__slots__`` records in a ring buffer. Older messages are not lost: they
+are appended to a per-session JSONL spill file and can still be read back
+page by page, so memory and render cost stay flat however long a
+session runs.
+
+With a ``store`` (see ``guidance.storage``) the history is a view of
+the account's stored conversation instead (see ``guidance.accounts``).
+Messages are appended to the store, and lengths and positions are read
+from it. So several sessions of one account (two tabs, or the page and
+the API) append to one conversation and agree on its positions. Pages
+are read from the store on demand.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+MAX_MESSAGES = int(os.environ.get("HISTORY_MAX_MESSAGES", "50"))
+
+
+class Message:
+    __slots__ = ("role", "content", "created")
+
+    def __init__(self, role, content, created=None):
+        self.role = role
+        self.content = content
+        self.created = time.time() if created is None else created
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content, "created": self.created}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["role"], data["content"], data.get("created"))
+
+
+class ChatHistory:
+    """Ring buffer of recent messages that spills evicted ones to disk, or a view of a store."""
+
+    def __init__(self, maxlen=MAX_MESSAGES, spill_path=None, store=None, username=None):
+        self.maxlen = maxlen
+        self._recent = deque(maxlen=maxlen)
+        self.spill_path = spill_path
+        self.store = store
+        self.username = username
+        # Stored history before this position is hidden from this view (see clear())
+        self.start = 0
+        self.spilled = 0
+        self._lock = threading.Lock()
+
+    def append(self, role, content):
+        message = Message(role, content)
+        if self.store is not None:
+            self.store.append_message(self.username, message.role, message.content, message.created)
+            return message
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                self._spill(self._recent[0])
+            self._recent.append(message)
+        return message
+
+    def _spill(self, message):
+        if self.spill_path is None:
+            self.spilled += 1
+            return
+        directory = os.path.dirname(self.spill_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+            spill_file.write(json.dumps(message.to_dict()) + "\n")
+        self.spilled += 1
+
+    def __len__(self):
+        if self.store is not None:
+            return self.store.count_messages(self.username) - self.start
+        return self.spilled + len(self._recent)
+
+    def __iter__(self):
+        # Only the most recent window; use page() to reach older messages
+        return iter(self.recent(self.maxlen))
+
+    def recent(self, count):
+        """Return the last ``count`` messages, oldest first."""
+        if self.store is not None:
+            total = len(self)
+            return self.between(max(0, total - count), total)
+        with self._lock:
+            if count >= len(self._recent):
+                return list(self._recent)
+            return list(islice(self._recent, len(self._recent) - count, None))
+
+    def page_count(self, page_size):
+        return max(1, -(-len(self) // page_size))
+
+    def page(self, index, page_size):
+        """Return page ``index`` (0 is the newest) of ``page_size`` messages, oldest first."""
+        end = max(0, len(self) - index * page_size)
+        return self.between(max(0, end - page_size), end)
+
+    def between(self, start, end):
+        """Return messages ``start`` to ``end`` (positions in the whole conversation), oldest first."""
+        if self.store is not None:
+            rows = self.store.load_messages(self.username, self.start + start, self.start + end) if end > start else []
+            return [Message(*row) for row in rows]
+        with self._lock:
+            end = min(end, self.spilled + len(self._recent))
+            messages = []
+            if start < self.spilled:
+                messages.extend(self._read_spilled(start, min(end, self.spilled)))
+            if end > self.spilled:
+                offset = self.spilled
+                messages.extend(islice(self._recent, max(start, offset) - offset, end - offset))
+            return messages
+
+    def _read_spilled(self, start, end):
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return []
+        with open(self.spill_path, encoding="utf-8") as spill_file:
+            return [Message.from_dict(json.loads(line)) for line in islice(spill_file, start, end)]
+
+    def clear(self):
+        if self.store is not None:
+            # Stored history is kept; only this view starts over
+            self.start = self.store.count_messages(self.username)
+            return
+        with self._lock:
+            self._recent.clear()
+            self.spilled = 0
+            if self.spill_path is not None and os.path.exists(self.spill_path):
+                os.remove(self.spill_path)
@@ -0,0 +1,102 @@
+"""Process-wide pooled HTTP client shared by every outbound call.
+
+Streamlit reruns the whole script on every interaction, so a ``requests``
+call made from the script opens a fresh TCP+TLS connection each time.
+This module keeps one keep-alive ``requests.Session`` per process with
+bounded per-host connection pools and default connect/read timeouts.
+Every host is guarded by a circuit breaker (see ``guidance.breaker``).
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from guidance import metrics
+from guidance.breaker import get_breaker
+
+# Defaults can be overridden through the environment or configure()
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "10"))  # number of hosts kept pooled
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "20"))  # connections kept per host
+
+# Per-host overrides of the pool size, keyed by URL prefix (e.g. "https://newsapi.org")
+HOST_POOL_MAXSIZE = {}
+
+_session = None
+_lock = threading.Lock()
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers.update({"Connection": "keep-alive"})
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Longer prefixes win when requests picks an adapter, so these take precedence
+    for prefix, maxsize in HOST_POOL_MAXSIZE.items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=maxsize, max_retries=0))
+    return session
+
+
+def get_session():
+    """Return the shared session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def configure(connect_timeout=None, read_timeout=None, pool_connections=None, pool_maxsize=None, host_pool_maxsize=None):
+    """Change timeouts or pool limits; pool changes rebuild the shared session."""
+    global CONNECT_TIMEOUT, READ_TIMEOUT, POOL_CONNECTIONS, POOL_MAXSIZE, _session
+    if connect_timeout is not None:
+        CONNECT_TIMEOUT = connect_timeout
+    if read_timeout is not None:
+        READ_TIMEOUT = read_timeout
+    if pool_connections is None and pool_maxsize is None and host_pool_maxsize is None:
+        return
+    with _lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if host_pool_maxsize is not None:
+            HOST_POOL_MAXSIZE.update(host_pool_maxsize)
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+
+def request(method, url, timeout=None, **kwargs):
+    """Send a request through the shared session with the default timeouts."""
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    host = urlsplit(url).hostname
+    breaker = get_breaker(host)
+    with metrics.span(f"http:{host}"):
+        # Fails instantly while the host's breaker is open
+        breaker.before_call()
+        try:
+            response = get_session().request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            breaker.record(False)
+            raise
+        # Server errors count against the host; rate limiting is left to the caller's backoff
+        breaker.record(None if response.status_code == 429 else response.status_code < 500)
+        # Streamed bodies are not read here, so fall back to the declared length
+        size = response.headers.get("Content-Length") if kwargs.get("stream") else len(response.content)
+        metrics.annotate(status=response.status_code, bytes=int(size or 0))
+        return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
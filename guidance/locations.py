@@ -0,0 +1,42 @@
+"""Places offered for prayer times, from ``data/locations.json``.
+
+Kept apart from ``guidance.prayer_times`` so the page can list the places
+without importing NumPy.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+LOCATIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "locations.json")
+DEFAULT_METHOD = "MWL"
+
+
+@dataclass(frozen=True)
+class Location:
+    name: str
+    latitude: float
+    longitude: float
+    timezone: str
+    # Prayer time calculation method, a key of guidance.prayer_times.METHODS
+    method: str = DEFAULT_METHOD
+
+
+def load_locations(path=LOCATIONS_PATH):
+    """Return ``{name: Location}`` from ``path``, in file order."""
+    with open(path, encoding="utf-8") as locations_file:
+        return {entry["name"]: Location(**entry) for entry in json.load(locations_file)["locations"]}
+
+
+_locations = None
+_lock = threading.Lock()
+
+
+def get_locations():
+    """Return the process-wide ``{name: Location}`` mapping."""
+    global _locations
+    if _locations is None:
+        with _lock:
+            if _locations is None:
+                _locations = load_locations()
+    return _locations
@@ -0,0 +1,232 @@
+"""Lightweight latency and cost instrumentation.
+
+Code under measurement runs inside ``span(name)``. Each finished span
+records wall time, status, bytes, cache hit/miss and model token usage
+(whatever attributes were attached to it) into a process-wide registry
+of counters and histograms. The registry can be scraped as Prometheus
+text (``start_http_server``) and, when ``METRICS_LOG_PATH`` is set, every
+span is also appended to a JSONL log. Spans finished while a trace is
+active (one per Streamlit rerun) are collected for the debug waterfall.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOG_PATH = os.environ.get("METRICS_LOG_PATH")
+
+_current_span = contextvars.ContextVar("metrics_span", default=None)
+_current_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Registry:
+    """Counters, gauges and histograms keyed by metric name and label set."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        # Label values are strings in the exposition format; mixing 429 and "connection" must still sort
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def record_span(self, finished):
+        call = finished.name
+        attrs = finished.attrs
+        status = str(attrs.get("status", "ok"))
+        self.inc("app_calls_total", call=call, status=status)
+        self.observe("app_call_duration_seconds", finished.duration, call=call)
+        if attrs.get("bytes"):
+            self.inc("app_call_bytes_total", attrs["bytes"], call=call)
+        if attrs.get("coalesced"):
+            self.inc("app_coalesced_calls_total", call=call)
+        if attrs.get("cache"):
+            self.inc("app_cache_lookups_total", call=call, result=attrs["cache"])
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if attrs.get(kind):
+                self.inc("app_model_tokens_total", attrs[kind], model=attrs.get("model", "unknown"), kind=kind)
+
+    def prometheus_text(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (metric, labels), value in sorted(metrics.items()):
+                        if metric == name:
+                            lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+
+registry = Registry()
+_log_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "start", "duration", "attrs", "parent")
+
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.attrs = attrs
+        self.parent = parent
+
+    def to_dict(self):
+        return {"name": self.name, "start": self.start, "duration": self.duration, **self.attrs}
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block and record it under ``name``."""
+    current = Span(name, attrs, _current_span.get())
+    _current_span.set(current)
+    try:
+        yield current
+    except BaseException:
+        current.attrs.setdefault("status", "error")
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        # Restore by value rather than token so spans held open by generators stay safe
+        _current_span.set(current.parent)
+        _finish(current)
+
+
+def _finish(finished):
+    registry.record_span(finished)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append(finished)
+    if LOG_PATH:
+        with _log_lock, open(LOG_PATH, "a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps({"time": time.time(), **finished.to_dict()}, default=str) + "\n")
+
+
+def annotate(**attrs):
+    """Attach attributes (status, bytes, cache, tokens, ...) to the innermost open span."""
+    current = _current_span.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def instrumented(name):
+    """Decorator form of ``span``."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_trace():
+    """Start collecting finished spans for the current rerun and return the list."""
+    trace = []
+    _current_trace.set(trace)
+    return trace
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve ``/metrics`` on ``port`` from a daemon thread; later calls are no-ops."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
@@ -0,0 +1,106 @@
+"""Daily prayer times computed locally, precomputed per year and location cell.
+
+The old answer was five fixed strings for every place and season. Times
+now come from the sun's position (``guidance.astronomy``) with the angles
+of a calculation ``METHODS`` entry. The first request for a location and
+year computes the whole year in one vectorized call: 366 days × 6 times.
+Serving a day is then a row lookup in that table.
+
+Tables are keyed by the location rounded to a ``GRID_DEGREES`` cell (a
+few minutes of solar time at most), the time zone, the method and the
+year. So every user in the same city shares one table. ``data/locations.json``
+(``guidance.locations``) lists the places the app offers.
+"""
+import datetime
+import threading
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from guidance.astronomy import prayer_times
+from guidance.locations import DEFAULT_METHOD
+
+PRAYER_NAMES = ("Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha")
+GRID_DEGREES = 0.25
+MAX_CACHED_TABLES = 512
+
+# Method name -> (fajr angle, isha angle, asr shadow factor)
+METHODS = {
+    "MWL": (18.0, 17.0, 1),  # Muslim World League
+    "ISNA": (15.0, 15.0, 1),  # Islamic Society of North America
+    "Egypt": (19.5, 17.5, 1),  # Egyptian General Authority of Survey
+    "Karachi": (18.0, 18.0, 1),  # University of Islamic Sciences, Karachi
+    "Hanafi": (18.0, 18.0, 2),  # Karachi angles with the Hanafi Asr
+}
+
+
+def grid_cell(latitude, longitude):
+    """Round a position to the shared table grid."""
+    return round(latitude / GRID_DEGREES) * GRID_DEGREES, round(longitude / GRID_DEGREES) * GRID_DEGREES
+
+
+def _utc_offsets(days, timezone):
+    zone = ZoneInfo(timezone)
+    # Offsets in force at noon; daylight saving changes happen at night
+    return np.array([
+        datetime.datetime(day.year, day.month, day.day, 12, tzinfo=zone).utcoffset().total_seconds() / 3600
+        for day in days.astype(datetime.date)
+    ])
+
+
+def format_time(hours):
+    """Format hours after midnight as "5:02 AM"."""
+    minutes = int(round(hours * 60)) % (24 * 60)
+    hour, minute = divmod(minutes, 60)
+    return f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+class PrayerTimesTable:
+    """Yearly prayer time tables per (grid cell, time zone, method), kept in a bounded LRU."""
+
+    def __init__(self, max_tables=MAX_CACHED_TABLES):
+        self.max_tables = max_tables
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def year(self, latitude, longitude, timezone, year, method=DEFAULT_METHOD):
+        """Return the ``(days in year, 6)`` table of local hours for the cell around a position."""
+        latitude, longitude = grid_cell(latitude, longitude)
+        key = (latitude, longitude, timezone, method, year)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+        days = np.arange(np.datetime64(f"{year}-01-01", "D"), np.datetime64(f"{year + 1}-01-01", "D"))
+        fajr_angle, isha_angle, asr_factor = METHODS[method]
+        table = prayer_times(latitude, longitude, days, _utc_offsets(days, timezone), fajr_angle, isha_angle, asr_factor)
+        table.setflags(write=False)
+        with self._lock:
+            self._tables[key] = table
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        return table
+
+    def day(self, location, day=None):
+        """Prayer times at a ``guidance.locations.Location`` on ``day`` (default: today there) as ``[(name, hours), ...]``."""
+        day = day or datetime.datetime.now(ZoneInfo(location.timezone)).date()
+        table = self.year(location.latitude, location.longitude, location.timezone, day.year, location.method)
+        row = table[day.timetuple().tm_yday - 1]
+        # Polar day or night: no sunrise or sunset, so no times to give
+        return [(name, hours) for name, hours in zip(PRAYER_NAMES, row) if not np.isnan(hours)]
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_prayer_times_table():
+    """Return the process-wide ``PrayerTimesTable``."""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = PrayerTimesTable()
+    return _table
@@ -0,0 +1,186 @@
+"""Response cache for chat completions.
+
+Many users ask the same question in slightly different words, and each
+one used to be a full paid completion. Answers are cached under an exact
+hash of (model, system prompt, normalized question). In a conversation,
+only self-contained questions are cached: ones that do not refer back
+to earlier turns ("why is that?", "tell me more"). Optionally, a
+character n-gram similarity index over the cached questions of the same
+model and system prompt also serves near-duplicates whose cosine
+similarity reaches ``similarity_threshold``.
+
+Exact answers are also kept in ``guidance.shared_state`` (when the
+cache is given one), so a question answered by one replica is a hit on
+every other. The similarity index stays per process.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from guidance.shared_state import get_shared_state
+
+MAXSIZE = int(os.environ.get("RESPONSE_CACHE_MAXSIZE", "1000"))
+TTL = float(os.environ.get("RESPONSE_CACHE_TTL", str(24 * 60 * 60)))
+# Cosine similarity needed for a near-duplicate hit; 0 disables the similarity index
+SIMILARITY_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.9"))
+NGRAM_SIZE = 3
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+# Words that make a question depend on the conversation before it
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|he|him|his|she|her|above|previous|earlier|again|"
+    r"more|else|also|another|same|one|ones|you said|example)\b"
+)
+MIN_SELF_CONTAINED_WORDS = 3
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def is_self_contained(question):
+    """Whether ``question`` can be answered without the conversation before it."""
+    normalized = normalize_question(question)
+    return len(normalized.split()) >= MIN_SELF_CONTAINED_WORDS and _FOLLOW_UP.search(normalized) is None
+
+
+def _ngram_vector(normalized):
+    padded = f" {normalized} "
+    vector = Counter(padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+    norm = math.sqrt(sum(count * count for count in vector.values()))
+    return vector, norm
+
+
+def _cosine(a, a_norm, b, b_norm):
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b.get(gram, 0) for gram, count in a.items()) / (a_norm * b_norm)
+
+
+class _Entry:
+    __slots__ = ("partition", "answer", "expires", "vector", "norm")
+
+    def __init__(self, partition, answer, expires, vector, norm):
+        self.partition = partition
+        self.answer = answer
+        self.expires = expires
+        self.vector = vector
+        self.norm = norm
+
+
+class ResponseCache:
+    """Bounded LRU cache of completion answers with exact and similarity lookup."""
+
+    def __init__(self, maxsize=MAXSIZE, ttl=TTL, similarity_threshold=SIMILARITY_THRESHOLD, shared_state=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # Callable returning the SharedState for exact answers, or None to keep them in this process
+        self.shared_state = shared_state
+        self._entries = OrderedDict()  # exact key -> _Entry
+        self._partitions = {}  # (model, system prompt) -> set of exact keys
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.shared_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _keys(model, system_prompt, question):
+        normalized = normalize_question(question)
+        partition = hashlib.sha256(f"{model}\0{system_prompt}".encode("utf-8")).hexdigest()
+        key = hashlib.sha256(f"{partition}\0{normalized}".encode("utf-8")).hexdigest()
+        return partition, key, normalized
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        members = self._partitions.get(entry.partition)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._partitions[entry.partition]
+
+    def lookup(self, model, system_prompt, question):
+        """Return a cached answer for the question, or ``None`` on a miss."""
+        partition, key, normalized = self._keys(model, system_prompt, question)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.answer
+            if entry is not None:
+                self._remove(key)
+        # Outside the lock: the shared state may be a network round trip
+        answer = self.shared_state().get(("response", key)) if self.shared_state else None
+        if answer is not None:
+            self._insert(partition, key, normalized, answer)
+            with self._lock:
+                self.shared_hits += 1
+            return answer
+        with self._lock:
+            if self.similarity_threshold > 0:
+                vector, norm = _ngram_vector(normalized)
+                best_key, best_score = None, self.similarity_threshold
+                for candidate_key in self._partitions.get(partition, ()):
+                    candidate = self._entries[candidate_key]
+                    if candidate.expires <= now:
+                        continue
+                    score = _cosine(vector, norm, candidate.vector, candidate.norm)
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.similar_hits += 1
+                    return self._entries[best_key].answer
+            self.misses += 1
+            return None
+
+    def store(self, model, system_prompt, question, answer):
+        partition, key, normalized = self._keys(model, system_prompt, question)
+        self._insert(partition, key, normalized, answer)
+        if self.shared_state:
+            self.shared_state().set(("response", key), answer, self.ttl)
+
+    def _insert(self, partition, key, normalized, answer):
+        vector, norm = _ngram_vector(normalized)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(partition, answer, time.monotonic() + self.ttl, vector, norm)
+            self._partitions.setdefault(partition, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._partitions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "exact_hits": self.exact_hits,
+            "shared_hits": self.shared_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# One response cache shared by every session in the process, and through the shared state by every replica
+shared_response_cache = ResponseCache(shared_state=get_shared_state)
@@ -0,0 +1,362 @@
+"""Local BM25 retrieval over scripture and commentary text files.
+
+Text files live under ``data/scripture/<Religion>/*.txt``. Each file is
+split into passages at blank lines; a passage whose first line starts
+with ``## `` uses the rest of that line as its reference (e.g.
+``## Psalm 23``), otherwise the reference is the file name and passage
+number.
+
+Each religion gets its own inverted index on disk, made of immutable
+segments. A segment stores its vocabulary (term -> postings offset and
+document frequency) as JSON and its postings, term frequencies, passage
+lengths and passage text as flat arrays that are memory-mapped with
+NumPy, so loading an index costs almost nothing and the OS shares the
+pages between processes. Builds are incremental: new or changed files
+are indexed into a new segment, passages of changed or removed files
+are marked deleted, and segments are merged back into one when there
+are too many. Segment files are never removed while the manifest still
+names them: segments replaced by a merge are deleted by a later build,
+a refresh interval later, so a process opening the index at the same
+moment still finds them. Scoring a question touches only the postings
+of its terms and takes well under a millisecond at this corpus size.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds from several processes are not serialized
+    fcntl = None
+
+from guidance import metrics
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "scripture")
+INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "retrieval")
+INDEX_VERSION = 1
+# Merge all segments into one once an index has more than this many
+MAX_SEGMENTS = 8
+# Minimum seconds between checks of the corpus for added or changed files
+REFRESH_INTERVAL = 10.0
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its me my not of on or our she so "
+    "that the their them they this thou thee thy to was we were what when where which who will with you your "
+    "unto shall hath doth".split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, with plural "s" stripped."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        token = token.split("'")[0]
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def split_passages(path):
+    """Return ``[(reference, text), ...]`` for a corpus file."""
+    with open(path, encoding="utf-8") as corpus_file:
+        blocks = re.split(r"\n\s*\n", corpus_file.read())
+    stem = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+    passages = []
+    for block in blocks:
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if not lines:
+            continue
+        if lines[0].startswith("## "):
+            reference, lines = lines[0][3:].strip(), lines[1:]
+            if not lines:
+                continue
+        else:
+            reference = f"{stem} {len(passages) + 1}"
+        passages.append((reference, " ".join(lines)))
+    return passages
+
+
+class Passage:
+    __slots__ = ("reference", "text", "score")
+
+    def __init__(self, reference, text, score):
+        self.reference = reference
+        self.text = text
+        self.score = score
+
+
+class Segment:
+    """One immutable, memory-mapped slice of an index."""
+
+    def __init__(self, directory, name):
+        prefix = os.path.join(directory, name)
+        with open(f"{prefix}.vocab.json", encoding="utf-8") as vocab_file:
+            self.vocab = json.load(vocab_file)  # term -> [postings offset, document frequency]
+        self.postings = np.load(f"{prefix}.postings.npy", mmap_mode="r")
+        self.frequencies = np.load(f"{prefix}.tfs.npy", mmap_mode="r")
+        self.lengths = np.load(f"{prefix}.lengths.npy", mmap_mode="r")
+        self.offsets = np.load(f"{prefix}.offsets.npy", mmap_mode="r")
+        self.text = np.memmap(f"{prefix}.text.bin", dtype=np.uint8, mode="r") if self.offsets[-1] else b""
+        self.live = np.ones(len(self.lengths), dtype=bool)
+
+    def passage(self, doc):
+        raw = bytes(self.text[self.offsets[doc]:self.offsets[doc + 1]]).decode("utf-8")
+        reference, _, text = raw.partition("\t")
+        return reference, text
+
+    @staticmethod
+    def write(directory, name, passages):
+        """Write ``[(reference, text), ...]`` as segment ``name``."""
+        postings = {}
+        lengths = np.zeros(len(passages), dtype=np.uint32)
+        for doc, (reference, text) in enumerate(passages):
+            tokens = tokenize(f"{reference} {text}")
+            lengths[doc] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((doc, count))
+        vocab = {}
+        docs, frequencies = [], []
+        for term in sorted(postings):
+            vocab[term] = [len(docs), len(postings[term])]
+            for doc, count in postings[term]:
+                docs.append(doc)
+                frequencies.append(min(count, 65535))
+        encoded = [f"{reference}\t{text}".encode("utf-8") for reference, text in passages]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(item) for item in encoded], dtype=np.uint64)
+
+        prefix = os.path.join(directory, name)
+        np.save(f"{prefix}.postings.npy", np.asarray(docs, dtype=np.uint32))
+        np.save(f"{prefix}.tfs.npy", np.asarray(frequencies, dtype=np.uint16))
+        np.save(f"{prefix}.lengths.npy", lengths)
+        np.save(f"{prefix}.offsets.npy", offsets)
+        with open(f"{prefix}.text.bin", "wb") as text_file:
+            text_file.write(b"".join(encoded))
+        with open(f"{prefix}.vocab.json", "w", encoding="utf-8") as vocab_file:
+            json.dump(vocab, vocab_file, separators=(",", ":"))
+
+
+def _empty_manifest():
+    return {"version": INDEX_VERSION, "generation": 0, "next_segment": 0, "segments": [], "files": {}, "deleted": {},
+            "retired": [], "retired_at": 0.0}
+
+
+def _read_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") == INDEX_VERSION:
+            manifest.setdefault("retired", [])
+            manifest.setdefault("retired_at", 0.0)
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return _empty_manifest()
+
+
+def _write_manifest(index_dir, manifest):
+    # Write then rename, so readers never see a half-written manifest
+    path = os.path.join(index_dir, "manifest.json")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def _remove_segment(index_dir, name):
+    for suffix in (".vocab.json", ".postings.npy", ".tfs.npy", ".lengths.npy", ".offsets.npy", ".text.bin"):
+        try:
+            os.remove(os.path.join(index_dir, name + suffix))
+        except OSError:
+            pass
+
+
+@contextmanager
+def _build_lock(index_dir):
+    with open(os.path.join(index_dir, "build.lock"), "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def build_index(corpus_dir, index_dir):
+    """Bring the index for ``corpus_dir`` up to date; return ``True`` if anything changed."""
+    os.makedirs(index_dir, exist_ok=True)
+    # Processes sharing the index directory take turns; the lock is released on close
+    with _build_lock(index_dir):
+        return _build(corpus_dir, index_dir)
+
+
+def _build(corpus_dir, index_dir):
+    manifest = _read_manifest(index_dir)
+    if manifest["retired"] and time.time() - manifest["retired_at"] >= REFRESH_INTERVAL:
+        # Segments replaced by the last merge; readers have had a whole refresh interval to move on
+        for segment in manifest["retired"]:
+            _remove_segment(index_dir, segment)
+        manifest["retired"] = []
+        _write_manifest(index_dir, manifest)
+    current = {}
+    if os.path.isdir(corpus_dir):
+        for entry in sorted(os.scandir(corpus_dir), key=lambda entry: entry.name):
+            if entry.is_file() and entry.name.endswith(".txt"):
+                stat = entry.stat()
+                current[entry.name] = [stat.st_mtime_ns, stat.st_size]
+
+    files = manifest["files"]
+    changed = [name for name, signature in current.items() if files.get(name, {}).get("signature") != signature]
+    removed = [name for name in files if name not in current]
+    if not changed and not removed:
+        return False
+
+    # Passages of changed or removed files are tombstoned in their old segment
+    for name in removed + [name for name in changed if name in files]:
+        old = files.pop(name)
+        manifest["deleted"].setdefault(old["segment"], []).append(old["docs"])
+
+    if len(manifest["segments"]) + 1 > MAX_SEGMENTS:
+        # Too many segments: fold everything into a single fresh one. The old
+        # files stay until the next build, as readers may still be opening them
+        manifest["retired"] = manifest["retired"] + manifest["segments"]
+        manifest["retired_at"] = time.time()
+        manifest["segments"], manifest["deleted"], files = [], {}, {}
+        manifest["files"] = files
+        changed = list(current)
+
+    if changed:
+        name = f"seg{manifest['next_segment']}"
+        manifest["next_segment"] += 1
+        passages = []
+        for file_name in changed:
+            start = len(passages)
+            passages.extend(split_passages(os.path.join(corpus_dir, file_name)))
+            files[file_name] = {"signature": current[file_name], "segment": name, "docs": [start, len(passages)]}
+        Segment.write(index_dir, name, passages)
+        manifest["segments"].append(name)
+    manifest["generation"] += 1
+    _write_manifest(index_dir, manifest)
+    return True
+
+
+class RetrievalIndex:
+    """Read-only BM25 searcher over an index directory's segments."""
+
+    def __init__(self, index_dir, manifest=None):
+        manifest = _read_manifest(index_dir) if manifest is None else manifest
+        self.generation = manifest["generation"]
+        self.segments = []
+        for name in manifest["segments"]:
+            segment = Segment(index_dir, name)
+            for start, end in manifest["deleted"].get(name, []):
+                segment.live[start:end] = False
+            self.segments.append(segment)
+        self.documents = sum(int(segment.live.sum()) for segment in self.segments)
+        # Including tombstoned passages, to match the document frequencies
+        self.indexed = sum(len(segment.lengths) for segment in self.segments)
+        total_length = sum(int(segment.lengths[segment.live].sum()) for segment in self.segments)
+        self.average_length = total_length / self.documents if self.documents else 0.0
+
+    def search(self, query, k=3):
+        """Return the ``k`` best ``Passage`` matches for ``query``, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self.documents:
+            return []
+        # Document frequencies are summed over segments (tombstoned passages still count, as in Lucene)
+        frequencies = {term: sum(segment.vocab.get(term, (0, 0))[1] for segment in self.segments) for term in terms}
+        candidates = []
+        for segment in self.segments:
+            scores = None
+            for term in terms:
+                entry = segment.vocab.get(term)
+                if entry is None:
+                    continue
+                offset, count = entry
+                docs = segment.postings[offset:offset + count]
+                tfs = segment.frequencies[offset:offset + count].astype(np.float32)
+                df = frequencies[term]
+                idf = np.log(1 + (self.indexed - df + 0.5) / (df + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths[docs] / self.average_length)
+                if scores is None:
+                    scores = np.zeros(len(segment.lengths), dtype=np.float32)
+                # Each document appears once per term's postings, so fancy-index += is safe
+                scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+            if scores is None:
+                continue
+            scores[~segment.live] = 0
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k] if len(scores) > k else np.arange(len(scores))
+            candidates.extend((float(scores[doc]), segment, int(doc)) for doc in top if scores[doc] > 0)
+        candidates.sort(key=lambda candidate: -candidate[0])
+        passages = []
+        for score, segment, doc in candidates[:k]:
+            reference, text = segment.passage(doc)
+            passages.append(Passage(reference, text, score))
+        return passages
+
+
+class Retriever:
+    """Per-religion indexes, built and refreshed from the corpus on demand."""
+
+    def __init__(self, corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR):
+        self.corpus_dir = corpus_dir
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._indexes = {}  # religion -> (RetrievalIndex, last checked)
+
+    def index(self, religion):
+        entry = self._indexes.get(religion)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < REFRESH_INTERVAL:
+            return entry[0]
+        with self._lock:
+            entry = self._indexes.get(religion)
+            if entry is not None and now - entry[1] < REFRESH_INTERVAL:
+                return entry[0]
+            slug = re.sub(r"[^a-z0-9]+", "_", religion.lower())
+            index_dir = os.path.join(self.index_dir, slug)
+            index = entry[0] if entry is not None else None
+            try:
+                with metrics.span("retrieval.refresh", religion=religion):
+                    build_index(os.path.join(self.corpus_dir, religion), index_dir)
+                # Reload when this or another process has changed the index since it was opened
+                if index is None or index.generation != _read_manifest(index_dir)["generation"]:
+                    index = RetrievalIndex(index_dir)
+            except Exception:
+                # Answer from the index we had (or without passages) and try again next interval
+                metrics.registry.inc("app_retrieval_errors_total", religion=religion)
+                if index is None:
+                    index = RetrievalIndex(index_dir, _empty_manifest())
+            self._indexes[religion] = (index, now)
+            return index
+
+    def search(self, religion, query, k=3):
+        with metrics.span("retrieval", religion=religion) as search_span:
+            passages = self.index(religion).search(query, k)
+            search_span.attrs["passages"] = len(passages)
+            return passages
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR):
+    """Return the process-wide retriever for ``corpus_dir``."""
+    key = (os.path.abspath(corpus_dir), os.path.abspath(index_dir))
+    with _retrievers_lock:
+        retriever = _retrievers.get(key)
+        if retriever is None:
+            retriever = _retrievers[key] = Retriever(*key)
+        return retriever
@@ -0,0 +1,112 @@
+"""Routes each chat question to the cheapest tier that can answer it well.
+
+A local heuristic (no model call) classifies the question into one of
+three tiers:
+
+* ``static``: questions about upcoming events or prayer times that the
+  app's own content can answer directly, with no upstream call at all;
+* ``fast``: short, factual or simple questions, sent to a cheaper and
+  faster model;
+* ``strong``: long, comparative, interpretive or multi-part questions,
+  sent to gpt-4.
+
+``max_tokens`` is sized to the kind of answer the question needs instead
+of a flat 500. Every decision is counted in ``app_routes_total`` and
+attached to the current metrics span (and so to the JSONL log).
+"""
+import os
+import re
+
+from guidance import metrics
+
+FAST_MODEL = os.environ.get("ROUTER_FAST_MODEL", "gpt-4o-mini")
+STRONG_MODEL = os.environ.get("ROUTER_STRONG_MODEL", "gpt-4")
+
+# Completion budgets per kind of answer
+SHORT_ANSWER_TOKENS = 150
+MEDIUM_ANSWER_TOKENS = 300
+LONG_ANSWER_TOKENS = 600
+
+# Questions longer than this (in words) go to the strong model
+LONG_QUESTION_WORDS = 40
+SHORT_QUESTION_WORDS = 12
+
+_WORDS = re.compile(r"[\w'-]+")
+_FACTUAL_START = re.compile(r"^(who|what|when|where|which|is|are|does|do|can|how many|how much|what time)\b")
+_HARD_CUES = re.compile(
+    r"\b(why|explain|compare|comparison|difference|differences|versus|vs|interpret|interpretation|analy[sz]e|"
+    r"theolog\w*|philosoph\w*|history of|meaning of|argue|debate|reconcile|contradict\w*|in depth|detailed)\b"
+)
+_LIST_CUES = re.compile(r"\b(list|steps|ways|tips|guide|how (do|can|should) i|how to|practices)\b")
+_WHEN_CUES = re.compile(r"\b(when|date|what day|which day|next)\b")
+_EVENT_CUES = re.compile(r"\b(upcoming|events?|festivals?|holidays?|celebrations?)\b")
+_PRAYER_TIME_CUES = re.compile(r"\b(prayer times?|time (for|of) prayer|what time)\b")
+
+
+class Route:
+    __slots__ = ("tier", "model", "max_tokens", "reason", "answer")
+
+    def __init__(self, tier, model=None, max_tokens=0, reason="", answer=None):
+        self.tier = tier
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reason = reason
+        self.answer = answer
+
+
+def _entry_name(entry):
+    # Content entries look like "Diwali - November 1, 2024" or "Fajr: 5:00 AM"
+    return re.split(r"\s+-\s+|:", entry, 1)[0].strip().lower()
+
+
+def _mentions(text, entry):
+    name = _entry_name(entry)
+    return bool(name) and re.search(rf"\b{re.escape(name)}\b", text) is not None
+
+
+def _static_answer(text, events, prayer_times):
+    asks_when = _WHEN_CUES.search(text) is not None
+    mentioned_events = [event for event in events if _mentions(text, event)]
+    if mentioned_events and asks_when:
+        return "\n".join(f"- {event}" for event in mentioned_events), "event_date"
+    if events and _EVENT_CUES.search(text) and (asks_when or "upcoming" in text):
+        return "Upcoming events:\n" + "\n".join(f"- {event}" for event in events), "event_list"
+    asks_prayer_time = _PRAYER_TIME_CUES.search(text) is not None
+    mentioned_prayers = [prayer for prayer in prayer_times if _mentions(text, prayer)]
+    if mentioned_prayers and (asks_when or asks_prayer_time):
+        return "\n".join(f"- {prayer}" for prayer in mentioned_prayers), "prayer_time"
+    if prayer_times and asks_prayer_time:
+        return "Prayer times:\n" + "\n".join(f"- {prayer}" for prayer in prayer_times), "prayer_times"
+    return None, None
+
+
+def route_question(question, events=(), prayer_times=(), allow_static=True):
+    """Pick the tier, model and ``max_tokens`` for ``question``.
+
+    ``events`` and ``prayer_times`` are the app's static entries for the
+    user's religion; they are only used to answer directly when
+    ``allow_static`` is set (e.g. the answer needs no translation).
+    """
+    text = " ".join(question.lower().split())
+    words = len(_WORDS.findall(text))
+
+    if allow_static:
+        answer, reason = _static_answer(text, events, prayer_times)
+        if answer is not None:
+            return _decided(Route("static", reason=reason, answer=answer))
+
+    questions = max(1, text.count("?"))
+    if _HARD_CUES.search(text) or words > LONG_QUESTION_WORDS or questions > 1:
+        reason = "hard_cue" if _HARD_CUES.search(text) else "long" if words > LONG_QUESTION_WORDS else "multi_part"
+        return _decided(Route("strong", STRONG_MODEL, LONG_ANSWER_TOKENS, reason))
+    if _LIST_CUES.search(text):
+        return _decided(Route("fast", FAST_MODEL, MEDIUM_ANSWER_TOKENS, "list"))
+    if words <= SHORT_QUESTION_WORDS and _FACTUAL_START.search(text):
+        return _decided(Route("fast", FAST_MODEL, SHORT_ANSWER_TOKENS, "short_factual"))
+    return _decided(Route("fast", FAST_MODEL, MEDIUM_ANSWER_TOKENS, "simple"))
+
+
+def _decided(route):
+    metrics.registry.inc("app_routes_total", tier=route.tier, reason=route.reason)
+    metrics.annotate(tier=route.tier, route_reason=route.reason, model=route.model, max_tokens=route.max_tokens)
+    return route
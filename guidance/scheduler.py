@@ -0,0 +1,284 @@
+"""Process-wide scheduler in front of the completions API.
+
+Every completion request (chat answers, prayer generation) takes a slot
+from one shared ``CompletionScheduler`` before it is sent, so the number
+of requests in flight towards the provider stays bounded however many
+sessions press "Send" at once. Waiting requests are queued per session
+and granted round-robin, so one busy session cannot starve the others.
+Background work (the Prayer of the Day precompute) runs at low priority:
+it only gets a slot while no other request is waiting, holds at most
+``MAX_BACKGROUND_IN_FLIGHT`` slots, and only takes quota that is spare
+at that moment, giving up (``SchedulerBusy``) if none turns up within
+``MAX_QUEUE_WAIT``. So it never delays a user's request by more than the
+background call already in flight. A token bucket paces requests to
+the provider's per-minute quota, and 429/5xx responses and connection
+errors are retried with jittered exponential backoff (honouring
+``Retry-After``). Under overload, requests wait in the queue up to a
+deadline instead of piling onto the provider and failing with 429s.
+
+The quota buckets live in ``guidance.shared_state``, so every process
+and node draws on the one provider quota. The in-flight limit and the
+fair queue stay per process.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+from guidance import metrics
+from guidance.breaker import CircuitOpenError
+from guidance.shared_state import SharedTokenBucket
+
+MAX_IN_FLIGHT = int(os.environ.get("COMPLETIONS_MAX_IN_FLIGHT", 8))
+MAX_BACKGROUND_IN_FLIGHT = int(os.environ.get("COMPLETIONS_MAX_BACKGROUND_IN_FLIGHT", 1))
+# Provider quota; 0 disables the corresponding limit
+REQUESTS_PER_MINUTE = float(os.environ.get("COMPLETIONS_REQUESTS_PER_MINUTE", 60))
+TOKENS_PER_MINUTE = float(os.environ.get("COMPLETIONS_TOKENS_PER_MINUTE", 0))
+MAX_RETRIES = int(os.environ.get("COMPLETIONS_MAX_RETRIES", 3))
+RETRY_BASE_DELAY = float(os.environ.get("COMPLETIONS_RETRY_BASE_DELAY", 0.5))
+RETRY_MAX_DELAY = float(os.environ.get("COMPLETIONS_RETRY_MAX_DELAY", 8.0))
+# Backpressure: how long a request may wait for a slot, and how many may wait at all
+MAX_QUEUE_WAIT = float(os.environ.get("COMPLETIONS_MAX_QUEUE_WAIT", 60))
+MAX_QUEUED = int(os.environ.get("COMPLETIONS_MAX_QUEUED", 200))
+# How often a queued caller is told its (possibly changed) queue position
+POSITION_POLL_INTERVAL = 0.5
+# How often background requests look for spare quota
+BACKGROUND_POLL_INTERVAL = 0.25
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request cannot be queued or waits longer than allowed."""
+
+
+class _Ticket:
+    __slots__ = ("session", "background", "granted")
+
+    def __init__(self, session, background=False):
+        self.session = session
+        self.background = background
+        self.granted = False
+
+
+class CompletionScheduler:
+    """Bounded, fair, rate-limited access to the completions API."""
+
+    def __init__(
+        self,
+        max_in_flight=MAX_IN_FLIGHT,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        tokens_per_minute=TOKENS_PER_MINUTE,
+        max_retries=MAX_RETRIES,
+        retry_base_delay=RETRY_BASE_DELAY,
+        retry_max_delay=RETRY_MAX_DELAY,
+        max_queue_wait=MAX_QUEUE_WAIT,
+        max_queued=MAX_QUEUED,
+        max_background_in_flight=MAX_BACKGROUND_IN_FLIGHT,
+        name="completions",
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_background_in_flight = max_background_in_flight
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.max_queue_wait = max_queue_wait
+        self.max_queued = max_queued
+        # Allow a burst of up to ten seconds' worth of quota; buckets are shared by every process under name
+        self.request_bucket = SharedTokenBucket(
+            f"{name}:requests", requests_per_minute / 60, max(1.0, requests_per_minute / 6)
+        ) if requests_per_minute else None
+        self.token_bucket = SharedTokenBucket(
+            f"{name}:tokens", tokens_per_minute / 60, max(1.0, tokens_per_minute / 6)
+        ) if tokens_per_minute else None
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._queues = {}  # session -> deque of waiting tickets
+        self._order = deque()  # sessions with waiting tickets, in round-robin order
+        self._background = deque()  # waiting background tickets, served only when no one else waits
+        self._background_in_flight = 0
+
+    # ---- fair queue ----
+
+    def _dispatch(self):
+        granted = False
+        while self._in_flight < self.max_in_flight and self._order:
+            session = self._order.popleft()
+            queue = self._queues[session]
+            queue.popleft().granted = True
+            self._in_flight += 1
+            self._queued -= 1
+            granted = True
+            if queue:
+                self._order.append(session)
+            else:
+                del self._queues[session]
+        while (self._background and not self._order and self._in_flight < self.max_in_flight
+               and self._background_in_flight < self.max_background_in_flight):
+            self._background.popleft().granted = True
+            self._in_flight += 1
+            self._background_in_flight += 1
+            self._queued -= 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+        self._publish()
+
+    def _publish(self):
+        metrics.registry.set_gauge("app_scheduler_in_flight", self._in_flight)
+        metrics.registry.set_gauge("app_scheduler_queued", self._queued)
+
+    def _position(self, ticket):
+        """1-based number of grants until ``ticket``'s turn under round-robin."""
+        if ticket.background:
+            return self._queued - len(self._background) + self._background.index(ticket) + 1
+        index = self._queues[ticket.session].index(ticket)
+        ahead = index
+        passed_own = False
+        for session in self._order:
+            if session == ticket.session:
+                passed_own = True
+                continue
+            ahead += min(len(self._queues[session]), index if passed_own else index + 1)
+        return ahead + 1
+
+    def _withdraw(self, ticket):
+        if ticket.background:
+            if ticket in self._background:
+                self._background.remove(ticket)
+                self._queued -= 1
+                self._publish()
+            return
+        queue = self._queues.get(ticket.session)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        self._queued -= 1
+        if not queue:
+            del self._queues[ticket.session]
+            self._order.remove(ticket.session)
+        self._publish()
+
+    def acquire(self, session=None, on_wait=None, background=False):
+        """Block until a slot is free; ``on_wait(position)`` is called while queued.
+
+        ``background`` requests wait until no other request is waiting.
+        """
+        started = time.monotonic()
+        ticket = _Ticket(session, background)
+        with self._cond:
+            if self._queued >= self.max_queued:
+                raise SchedulerBusy("The assistant is very busy right now. Please try again in a moment.")
+            if background:
+                self._background.append(ticket)
+            else:
+                if ticket.session not in self._queues:
+                    self._queues[ticket.session] = deque()
+                    self._order.append(ticket.session)
+                self._queues[ticket.session].append(ticket)
+            self._queued += 1
+            self._dispatch()
+        last_position = None
+        while True:
+            with self._cond:
+                if ticket.granted:
+                    break
+                if time.monotonic() - started > self.max_queue_wait:
+                    self._withdraw(ticket)
+                    raise SchedulerBusy("The assistant is very busy right now. Please try again in a moment.")
+                position = self._position(ticket)
+                if on_wait is None or position == last_position:
+                    self._cond.wait(POSITION_POLL_INTERVAL)
+                    continue
+            # Report outside the lock; the callback may be slow (e.g. UI updates)
+            last_position = position
+            on_wait(position)
+        waited = time.monotonic() - started
+        metrics.annotate(queue_wait_ms=round(waited * 1000, 1))
+        metrics.registry.observe("app_scheduler_wait_seconds", waited)
+
+    def release(self, background=False):
+        with self._cond:
+            self._in_flight -= 1
+            if background:
+                self._background_in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session=None, on_wait=None, background=False):
+        """Hold one in-flight slot for the duration of the block (e.g. a whole stream)."""
+        self.acquire(session, on_wait, background)
+        try:
+            yield
+        finally:
+            self.release(background)
+
+    # ---- rate limiting and retries ----
+
+    def _pace(self, cost_tokens, background=False):
+        waited = 0.0
+        deadline = time.monotonic() + self.max_queue_wait
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, cost_tokens)):
+            if bucket is None or not amount:
+                continue
+            if not background:
+                waited += bucket.acquire(amount)
+                continue
+            # Only spare quota: foreground requests reserve ahead (into debt), which leaves none.
+            # The caller holds a slot meanwhile, so under sustained load it gives up instead
+            while not bucket.try_acquire(amount):
+                if time.monotonic() >= deadline:
+                    metrics.registry.inc("app_scheduler_rejections_total", reason="background_quota")
+                    raise SchedulerBusy("No spare completion quota for background work.")
+                time.sleep(BACKGROUND_POLL_INTERVAL)
+                waited += BACKGROUND_POLL_INTERVAL
+        if waited:
+            metrics.annotate(rate_limit_wait_ms=round(waited * 1000, 1))
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.retry_max_delay))
+            except ValueError:
+                pass
+        return delay
+
+    def call(self, func, cost_tokens=0, background=False):
+        """Run ``func()`` within the rate limits, retrying 429/5xx and connection errors."""
+        attempt = 0
+        while True:
+            self._pace(cost_tokens, background)
+            try:
+                return func()
+            except (requests.exceptions.HTTPError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+                status = error.response.status_code if isinstance(error, requests.exceptions.HTTPError) and error.response is not None else None
+                # An open breaker already knows the upstream is down; retrying only adds latency
+                if isinstance(error, CircuitOpenError) or isinstance(error, requests.exceptions.HTTPError) and status not in RETRY_STATUS_CODES:
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                metrics.registry.inc("app_completion_retries_total", status=str(status or "connection"))
+                time.sleep(self._backoff(attempt, error))
+                attempt += 1
+                metrics.annotate(retries=attempt)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "sessions_waiting": len(self._order),
+                "background_in_flight": self._background_in_flight,
+                "background_waiting": len(self._background),
+            }
+
+
+completion_scheduler = CompletionScheduler()
@@ -0,0 +1,467 @@
+"""The app's helpers, independent of any user interface.
+
+Everything that talks to an upstream or reads the app's content lives
+here, so the Streamlit page (``streamlit_app.py``) and the headless JSON
+API (``api.py``) share one implementation, one connection pool and one
+set of caches. Keys and endpoints come from ``guidance.config``.
+
+The retrieval index, the festival calendar and the prayer time tables
+(and with them NumPy) are only imported when first used, so a new
+process can render the page or answer its first request sooner.
+"""
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+from guidance import http_client, metrics
+from guidance.cache import cached
+from guidance.config import get_config
+from guidance.content import get_store as get_content_store
+from guidance.context import base_system_prompt, estimate_tokens
+from guidance.daily_store import open_store
+from guidance.locations import Location, get_locations
+from guidance.response_cache import is_self_contained, shared_response_cache
+from guidance.router import route_question
+from guidance.scheduler import SchedulerBusy, completion_scheduler
+from guidance.shared_state import RateLimited, SharedTokenBucket
+from guidance.singleflight import shared_flights
+from guidance.translation import translate_batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RELIGIONS = [
+    "Christianity", "Islam", "Hinduism", "Buddhism", "Judaism",
+    "Sikhism", "Jainism", "Baha'i", "Shinto", "Taoism"
+]
+LANGUAGES = [
+    "English", "Spanish", "French", "German", "Chinese",
+    "Hindi", "Arabic", "Portuguese", "Russian", "Japanese"
+]
+
+# Cache lifetimes (seconds) for external fetches; stale entries are
+# served for the extra window while they refresh in the background
+NEWS_CACHE_TTL, NEWS_CACHE_STALE_TTL = 15 * 60, 60 * 60
+MUSIC_CACHE_TTL, MUSIC_CACHE_STALE_TTL = 24 * 60 * 60, 24 * 60 * 60
+VERSE_CACHE_TTL, VERSE_CACHE_STALE_TTL = 60 * 60, 24 * 60 * 60
+# Failed fetches are remembered this long, so a broken upstream is not retried on every request
+NEGATIVE_CACHE_TTL = 60
+# NewsAPI plan quota, shared by every replica (the free plan allows 100 a day); 0 disables the limit
+NEWS_REQUESTS_PER_DAY = float(os.environ.get("NEWS_REQUESTS_PER_DAY", 0))
+news_quota = SharedTokenBucket(
+    "newsapi:requests", NEWS_REQUESTS_PER_DAY / 86400, max(1.0, NEWS_REQUESTS_PER_DAY / 24)
+) if NEWS_REQUESTS_PER_DAY else None
+# Shown instead of headlines while NewsAPI is failing
+NEWS_FALLBACK = "Unable to fetch news at this time."
+
+# Static content (verses, quotes, guides, links) shared by all sessions and hot-reloaded on change
+CONTENT_PATH = os.path.join(ROOT, "data", "content.json")
+
+# Scripture/commentary text files per religion, indexed locally for grounding chat answers
+SCRIPTURE_DIR = os.path.join(ROOT, "data", "scripture")
+RETRIEVAL_INDEX_DIR = os.path.join(ROOT, ".cache", "retrieval")
+RETRIEVAL_PASSAGES = 3
+PASSAGE_PROMPT_CHARS = 500
+
+# Religions whose daily prayer times are computed per location
+COMPUTED_PRAYER_TIMES = {"Islam"}
+
+def content_store():
+    return get_content_store(CONTENT_PATH)
+
+
+# ============================
+# Chat Completion API
+# ============================
+
+# Function to build the Chat Completion API payload and headers
+def build_api_request(model, messages, max_tokens, temperature, top_p, frequency_penalty, stream):
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "top_p": top_p,
+        "frequency_penalty": frequency_penalty,
+        "stream": stream
+    }
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {get_config().api_key}"
+    }
+    return payload, headers
+
+# Function to estimate a request's cost against the provider's tokens-per-minute quota
+def completion_cost(payload):
+    return sum(estimate_tokens(message["content"]) for message in payload["messages"]) + payload["max_tokens"]
+
+# Function to send one Chat Completion API request (raises on HTTP errors so they can be retried)
+def post_completion(payload, headers, stream=False):
+    if not get_config().api_key:
+        raise RuntimeError("API_KEY is not configured")
+    response = http_client.post(get_config().api_url, headers=headers, data=json.dumps(payload), stream=stream)
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        response.close()
+        raise
+    return response
+
+# Function to call the Chat Completion API and return the message text (raises on failure)
+# background=True sends at low priority, only when no user request is waiting
+def fetch_api_response(model, messages, max_tokens=500, temperature=0.7, top_p=1.0, frequency_penalty=0.0, session_id=None, background=False):
+    payload, headers = build_api_request(model, messages, max_tokens, temperature, top_p, frequency_penalty, False)
+    # Wait for a slot in the process-wide scheduler, then send within the provider quota
+    with completion_scheduler.slot(session_id, background=background):
+        response = completion_scheduler.call(lambda: post_completion(payload, headers), completion_cost(payload), background)
+    data = response.json()
+
+    # Record token usage for cost tracking
+    usage = data.get('usage') or {}
+    metrics.annotate(model=model, prompt_tokens=usage.get('prompt_tokens'), completion_tokens=usage.get('completion_tokens'))
+
+    # Adjust based on your API's response structure
+    return data.get('choices', [])[0].get('message', {}).get('content', '').strip()
+
+# Function to call the custom Chat Completion API
+@metrics.instrumented("completion")
+def get_api_response(model, messages, max_tokens=500, temperature=0.7, top_p=1.0, frequency_penalty=0.0, stream=False, use_cache=False, session_id=None, on_queue=None):
+    # Serve repeated (or near-identical) questions from the response cache
+    cache_key = response_cache_key(model, messages) if use_cache else None
+    cached_answer = shared_response_cache.lookup(*cache_key) if cache_key else None
+    if cache_key:
+        metrics.annotate(cache="miss" if cached_answer is None else "hit")
+
+    # Streaming responses are returned as a generator of text chunks;
+    # identical requests already in flight share one upstream stream
+    if stream:
+        if cached_answer is not None:
+            return iter([cached_answer])
+        payload, headers = build_api_request(model, messages, max_tokens, temperature, top_p, frequency_penalty, True)
+        return shared_flights.stream(
+            completion_flight_key(payload),
+            lambda on_wait: stream_api_response(payload, headers, cache_key, session_id, on_wait),
+            on_queue
+        )
+    if cached_answer is not None:
+        return cached_answer
+
+    try:
+        payload, _ = build_api_request(model, messages, max_tokens, temperature, top_p, frequency_penalty, False)
+        ai_message = shared_flights.do(
+            completion_flight_key(payload),
+            lambda: fetch_api_response(model, messages, max_tokens, temperature, top_p, frequency_penalty, session_id)
+        )
+        if cache_key:
+            shared_response_cache.store(*cache_key, ai_message)
+        return ai_message
+    except SchedulerBusy as busy:
+        metrics.annotate(status="busy")
+        return str(busy)
+    except requests.exceptions.HTTPError as http_err:
+        return f"HTTP error occurred: {http_err}"
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+# Function to build the single-flight key of a completion request (identical payloads share one call)
+def completion_flight_key(payload):
+    return "completion", hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Function to yield content deltas from a server-sent events (SSE) response
+def iter_stream_chunks(response):
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        # Skip keep-alive blank lines, comments and non-data fields
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if not isinstance(chunk, dict):
+            continue
+        # Providers that report usage on streams send it with the final chunk
+        usage = chunk.get('usage') or {}
+        if usage:
+            metrics.annotate(prompt_tokens=usage.get('prompt_tokens'), completion_tokens=usage.get('completion_tokens'))
+        choices = chunk.get('choices') or [{}]
+        content = (choices[0].get('delta') or {}).get('content')
+        if content:
+            yield content
+
+# Function to stream the Chat Completion API response chunk by chunk;
+# on_queue(position) is called while the request waits for a scheduler slot
+def stream_api_response(payload, headers, cache_key=None, session_id=None, on_queue=None):
+    answer = ""
+    with metrics.span("completion.stream", model=payload["model"]) as stream_span:
+        try:
+            # The slot is held for the whole stream; only opening the stream is retried
+            with completion_scheduler.slot(session_id, on_queue):
+                with completion_scheduler.call(lambda: post_completion(payload, headers, stream=True), completion_cost(payload)) as response:
+                    # SSE is always UTF-8, whatever the Content-Type header says
+                    response.encoding = "utf-8"
+                    for chunk in iter_stream_chunks(response):
+                        if not answer:
+                            stream_span.attrs["ttft_ms"] = round((time.perf_counter() - stream_span.start) * 1000, 1)
+                        answer += chunk
+                        yield chunk
+            stream_span.attrs["bytes"] = len(answer.encode("utf-8"))
+        except SchedulerBusy as busy:
+            stream_span.attrs["status"] = "busy"
+            yield str(busy)
+            return
+        except requests.exceptions.HTTPError as http_err:
+            stream_span.attrs["status"] = http_err.response.status_code if http_err.response is not None else "error"
+            yield f"HTTP error occurred: {http_err}"
+            return
+        except Exception as e:
+            stream_span.attrs["status"] = "error"
+            yield f"An error occurred: {str(e)}"
+            return
+    # Only complete, successful answers are cached
+    if cache_key and answer.strip():
+        shared_response_cache.store(*cache_key, answer.strip())
+
+# Function to build the response cache key (model, system prompt, question), or None if the answer depends on earlier turns
+def response_cache_key(model, messages):
+    if len(messages) < 2 or messages[0]["role"] != "system" or messages[-1]["role"] != "user":
+        return None
+    system_prompt, question = messages[0]["content"], messages[-1]["content"]
+    base_prompt = base_system_prompt(system_prompt)
+    # Earlier turns (or their summary) only matter to questions that refer back to them
+    if (len(messages) > 2 or base_prompt != system_prompt) and not is_self_contained(question):
+        return None
+    return model, base_prompt, question
+
+# ============================
+# Questions and Answers
+# ============================
+
+# Function to route a question and build its completion messages; messages is None for static answers
+def prepare_answer(question, religion, language, history, context_builder, location=None):
+    # Imported here: the index pulls in NumPy, which only questions need
+    from guidance.retrieval import get_retriever
+
+    # Pick a static answer, the cheaper model or gpt-4 for this question (English static content only)
+    with metrics.span("route"):
+        route = route_question(question, get_upcoming_events(religion), get_prayer_times(religion, location), allow_static=language == "English")
+    if route.answer is not None:
+        return route, None
+
+    system_prompt = f"You are a knowledgeable and respectful assistant for {religion} followers. Answer the following question based on {religion} teachings in {language}."
+    # Ground the answer in the most relevant local passages instead of relying on recall alone
+    passages = get_retriever(SCRIPTURE_DIR, RETRIEVAL_INDEX_DIR).search(religion, question, RETRIEVAL_PASSAGES)
+    if passages:
+        system_prompt += "\n\nRelevant passages (quote or cite them where they help):\n" + "\n".join(
+            f"[{passage.reference}] {passage.text[:PASSAGE_PROMPT_CHARS]}" for passage in passages
+        )
+    # Recent turns plus a rolling summary of older ones, within the model's token budget
+    messages = context_builder.build(history, system_prompt, question, route.model)
+    return route, messages
+
+# Function to stream the answer for a prepared route as text chunks
+def stream_answer(route, messages, session_id=None, on_queue=None):
+    if route.answer is not None:
+        return iter([route.answer])
+    # The system prompt already asks for the answer in the target language, so no translation is needed
+    return get_api_response(
+        model=route.model,
+        messages=messages,
+        max_tokens=route.max_tokens,
+        temperature=0.7,
+        stream=True,
+        use_cache=True,
+        session_id=session_id,
+        on_queue=on_queue
+    )
+
+# ============================
+# Content and Feeds
+# ============================
+
+# Function to fetch background music URL from the music API (raises on failure)
+@cached("music", ttl=MUSIC_CACHE_TTL, stale_ttl=MUSIC_CACHE_STALE_TTL, negative_ttl=NEGATIVE_CACHE_TTL)
+def fetch_background_music(religion):
+    # Example: Fetch music from a hypothetical API
+    params = {"religion": religion}
+    response = http_client.get(get_config().music_api_url, params=params)
+    response.raise_for_status()
+    data = response.json()
+    return data.get("music_url")
+
+# Function to get background music URL based on religion
+@metrics.instrumented("music")
+def get_background_music(religion):
+    try:
+        return fetch_background_music(religion)
+    except Exception:
+        # Fallback to predefined music URLs if API fails
+        metrics.annotate(status="fallback")
+        return get_predefined_music(religion)
+
+# Function to get the predefined background music URL for a religion
+def get_predefined_music(religion):
+    return content_store().get(religion, "music")
+
+# Function to fetch a random Bible verse from OurManna (raises on failure)
+@cached("verse", ttl=VERSE_CACHE_TTL, stale_ttl=VERSE_CACHE_STALE_TTL, negative_ttl=NEGATIVE_CACHE_TTL)
+def fetch_daily_verse(religion, language):
+    response = http_client.get(get_config().bible_api_url)
+    response.raise_for_status()
+    data = response.json()
+    text = ((data.get("verse") or {}).get("details") or {}).get("text")
+    if not text:
+        # An error body is not a verse; let the caller fall back instead of caching it
+        raise ValueError("OurManna response has no verse text")
+    return text
+
+# Function to get daily verse or scripture
+@metrics.instrumented("verse")
+def get_daily_verse(religion, language):
+    if religion == "Christianity":
+        # Using OurManna API for random Bible verses
+        try:
+            return fetch_daily_verse(religion, language)
+        except Exception:
+            metrics.annotate(status="fallback")
+            return content_store().get(None, "daily_verse")
+    else:
+        # Placeholder verses for other religions, with per-language overrides from the content store
+        return content_store().get(religion, "daily_verse", language)
+
+# Function to get inspirational quotes
+def get_inspirational_quote(religion):
+    return content_store().get(religion, "quote")
+
+# Function to look up a prayer time location by name (the configured default for unknown names)
+def get_location(name=None):
+    locations = get_locations()
+    return locations.get(name) or locations[get_config().default_location]
+
+# Function to get today's prayer times at a location (a Location or its name), computed from the sun's position
+def get_prayer_times(religion, location=None):
+    if religion not in COMPUTED_PRAYER_TIMES:
+        return []
+    from guidance.prayer_times import format_time, get_prayer_times_table
+
+    if not isinstance(location, Location):
+        location = get_location(location)
+    return [f"{name}: {format_time(hours)}" for name, hours in get_prayer_times_table().day(location)]
+
+# Function to get the religion's festivals in the coming year from the rule-based calendar
+def get_upcoming_events(religion):
+    from guidance.festivals import get_festival_calendar
+
+    return [f"{name} - {day:%B} {day.day}, {day.year}" for day, name in get_festival_calendar().upcoming(religion)]
+
+# Function to get donation links (Simplified)
+def get_donation_links(religion):
+    return content_store().get(religion, "donation_link")
+
+# Function to get inspirational videos (Using YouTube API - requires API key)
+def get_inspirational_videos(religion):
+    # Placeholder: static video links from the content store
+    # (a YouTube Data API integration would need an API key and quota handling)
+    return content_store().get(religion, "video")
+
+# Function to translate several English strings in one LibreTranslate request
+@metrics.instrumented("translation")
+def translate_texts(texts, target_language):
+    # Falls back to the original strings if translation fails
+    return translate_batch(texts, target_language, get_config().translation_api_url)
+
+# Function to translate text using LibreTranslate API
+def translate_text(text, target_language):
+    return translate_texts([text], target_language)[0]
+
+# Function to fetch religious news headlines from NewsAPI (raises on failure)
+@cached("news", ttl=NEWS_CACHE_TTL, stale_ttl=NEWS_CACHE_STALE_TTL, negative_ttl=NEGATIVE_CACHE_TTL)
+def fetch_religious_news(religion, news_api_key):
+    params = {
+        "q": religion,
+        "apiKey": news_api_key,
+        "language": "en",
+        "pageSize": 5,
+        "sortBy": "relevancy"
+    }
+    if news_quota is not None and not news_quota.try_acquire():
+        raise RateLimited("NewsAPI quota used up")
+    response = http_client.get(get_config().news_api_url, params=params)
+    response.raise_for_status()
+    data = response.json()
+    articles = data.get("articles", [])
+    return [f"[{article['title']}]({article['url']})" for article in articles]
+
+# Function to get religious news headlines using NewsAPI (raises if the upstream fails)
+def fetch_news_headlines(religion):
+    # Note: You need to obtain a NewsAPI key (NEWS_API_KEY)
+    news_api_key = get_config().news_api_key
+    if not news_api_key:
+        return ["News API key not found."]
+    news = fetch_religious_news(religion, news_api_key)
+    return news if news else ["No recent news found."]
+
+# Function to get religious news using NewsAPI
+@metrics.instrumented("news")
+def get_religious_news(religion):
+    try:
+        return fetch_news_headlines(religion)
+    except Exception:
+        metrics.annotate(status="fallback")
+        return [NEWS_FALLBACK]
+
+# Function to get meditation guides (Placeholder)
+def get_meditation_guide(religion):
+    return content_store().get(religion, "meditation_guide")
+
+# Function to get community forum links
+def get_community_forums(religion):
+    return content_store().get(religion, "forum")
+
+# ============================
+# Prayer of the Day
+# ============================
+
+# Function to generate a fresh Prayer of the Day (raises on failure)
+@metrics.instrumented("prayer_of_the_day.generate")
+def generate_prayer_of_the_day(key, session_id=None, background=False):
+    religion, language = key
+    system_prompt = f"You are a respectful assistant providing detailed prayers for {religion} in {language}."
+    user_prompt = "Please provide the Prayer of the Day with a relevant quotation."
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    prayer = fetch_api_response(
+        model="gpt-4o",
+        messages=messages,
+        max_tokens=300,
+        temperature=0.7,
+        session_id=session_id,
+        background=background
+    )
+    # The system prompt already asks for the prayer in the target language, so no translation is needed
+    return prayer
+
+# Function to get Prayer of the Day, generated once per day per religion and language
+@metrics.instrumented("prayer_of_the_day")
+def get_prayer_of_the_day(religion, language, session_id=None):
+    prayer_store = open_store(get_config().prayer_store_path)
+    try:
+        # The requested prayer first, as the caller's own request
+        prayer = prayer_store.get_or_create((religion, language), lambda key: generate_prayer_of_the_day(key, session_id))
+        # Then warm the other religions in this language at low priority, for the next visitors
+        prayer_store.precompute(
+            [(r, language) for r in RELIGIONS],
+            lambda key: generate_prayer_of_the_day(key, background=True)
+        )
+        return prayer
+    except requests.exceptions.HTTPError as http_err:
+        return f"HTTP error occurred: {http_err}"
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
@@ -0,0 +1,461 @@
+"""State shared by every process and node running the app.
+
+Each replica used to keep its caches, single-flight locks and provider
+quotas to itself. A new replica started cold, and N replicas spent N
+times the completions and NewsAPI quota. ``SharedStateBackend`` is the
+interface for the three primitives that need sharing: values with a
+TTL, leases (expiring locks) and token buckets. Backends are picked by
+URL (``SHARED_STATE_URL``), like storage backends:
+
+* ``sqlite:///path``: shared by every process on the host. This is the
+  default, at ``.cache/shared_state.sqlite3``;
+* ``redis://host:port/db``: shared across nodes (needs the ``redis`` package);
+* ``memory://name``: this process only, e.g. as a stand-in in tests.
+
+``register_backend`` adds others. ``SharedState`` layers JSON values,
+hashed namespaced keys and lease-based single-flight on top. When the
+backend fails, callers fall back to process-local behaviour instead of
+failing the request.
+"""
+import abc
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from guidance import metrics
+from guidance.config import get_config
+
+NAMESPACE = "guidance"
+# How long a process may hold a single-flight lease before others stop waiting for it
+LEASE_TTL = 30.0
+POLL_INTERVAL = 0.05
+# Expired rows are purged from SQLite at most this often
+PURGE_INTERVAL = 60.0
+# Stand-in for an unbounded wait where a backend needs a number
+_FOREVER = 1e18
+
+
+class RateLimited(Exception):
+    """Raised when a shared quota has no tokens left."""
+
+
+def _take(tokens, updated, now, amount, rate, capacity, max_wait):
+    """Token bucket arithmetic shared by the backends: return ``(tokens left, wait)``, or ``(None, None)`` if refused."""
+    tokens = capacity if tokens is None else min(capacity, tokens + max(0.0, now - updated) * rate)
+    wait = max(0.0, (amount - tokens) / rate)
+    if wait > max_wait:
+        return None, None
+    return tokens - amount, wait
+
+
+class SharedStateBackend(abc.ABC):
+    """Interface for values, leases and token buckets shared between processes.
+
+    Values are bytes. Expiry times are the backend's own clock, so
+    callers only ever pass durations.
+    """
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Return the bytes stored under ``key``, or ``None`` if missing or expired."""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Remove ``key`` if present."""
+
+    @abc.abstractmethod
+    def acquire_lease(self, key, owner, ttl):
+        """Take ``key`` for ``ttl`` seconds unless another owner holds it; return whether it was taken."""
+
+    @abc.abstractmethod
+    def release_lease(self, key, owner):
+        """Release ``key`` if ``owner`` still holds it."""
+
+    @abc.abstractmethod
+    def take_tokens(self, key, amount, rate, capacity, max_wait):
+        """Take ``amount`` tokens from the bucket ``key`` (refilled at ``rate`` a second up to ``capacity``).
+
+        The tokens are taken, going into debt if needed, when the caller
+        would then wait at most ``max_wait`` seconds; the wait is returned.
+        Otherwise nothing is taken and ``None`` is returned.
+        """
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(SharedStateBackend):
+    """Process-local backend: the single-replica default behaviour, and a stand-in for tests."""
+
+    def __init__(self):
+        self._values = {}  # key -> (value, expires)
+        self._leases = {}  # key -> (owner, expires)
+        self._buckets = {}  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def acquire_lease(self, key, owner, ttl):
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(key)
+            if holder is not None and holder[0] != owner and holder[1] > now:
+                return False
+            self._leases[key] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, key, owner):
+        with self._lock:
+            if self._leases.get(key, (None,))[0] == owner:
+                del self._leases[key]
+
+    def take_tokens(self, key, amount, rate, capacity, max_wait):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, now))
+            tokens, wait = _take(tokens, updated, now, amount, rate, capacity, max_wait)
+            if tokens is not None:
+                self._buckets[key] = (tokens, now)
+            return wait
+
+
+class SQLiteBackend(SharedStateBackend):
+    """SQLite file shared by the processes on one host (WAL, per-thread connections)."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._purged = 0.0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, expires REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; multi-statement updates open their own IMMEDIATE transactions
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute("SELECT value FROM kv WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, now + ttl))
+        if now - self._purged > PURGE_INTERVAL:
+            self._purged = now
+            conn.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+            conn.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def acquire_lease(self, key, owner, ttl):
+        now = time.time()
+        # One statement, so taking the lease is atomic across processes
+        cursor = self._connect().execute(
+            "INSERT INTO leases (key, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.expires <= ? OR leases.owner = excluded.owner",
+            (key, owner, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key, owner):
+        self._connect().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def take_tokens(self, key, amount, rate, capacity, max_wait):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, wait = _take(row[0] if row else None, row[1] if row else now, now, amount, rate, capacity, max_wait)
+            if tokens is not None:
+                conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_ACQUIRE_LEASE = """
+local owner = redis.call('GET', KEYS[1])
+if owner and owner ~= ARGV[1] then return 0 end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+_RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+_TAKE_TOKENS = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local amount, rate, capacity, max_wait = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = capacity
+if state[1] then tokens = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate) end
+local wait = math.max(0, (amount - tokens) / rate)
+if wait > max_wait then return false end
+redis.call('HSET', KEYS[1], 'tokens', tokens - amount, 'updated', now)
+-- A full bucket needs no state; let it expire once refilled
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens + amount) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBackend(SharedStateBackend):
+    """Redis server shared by every node; leases and buckets are Lua scripts, so each is atomic."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("redis:// shared state needs the redis package (pip install redis)") from exc
+        self.client = redis.Redis.from_url(url)
+        self._acquire = self.client.register_script(_ACQUIRE_LEASE)
+        self._release = self.client.register_script(_RELEASE_LEASE)
+        self._take_tokens = self.client.register_script(_TAKE_TOKENS)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def acquire_lease(self, key, owner, ttl):
+        return bool(self._acquire(keys=[key], args=[owner, max(1, int(ttl * 1000))]))
+
+    def release_lease(self, key, owner):
+        self._release(keys=[key], args=[owner])
+
+    def take_tokens(self, key, amount, rate, capacity, max_wait):
+        wait = self._take_tokens(keys=[key], args=[amount, rate, capacity, min(max_wait, _FOREVER)])
+        return None if wait is None else float(wait)
+
+    def close(self):
+        self.client.close()
+
+
+class SharedState:
+    """JSON values, single-flight and token buckets over a backend, under one key namespace."""
+
+    def __init__(self, backend, namespace=NAMESPACE):
+        self.backend = backend
+        self.namespace = namespace
+
+    def _key(self, kind, key):
+        # Keys are hashed: they may hold API keys, and backends limit key length
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{kind}:{digest}"
+
+    def _failed(self, operation):
+        metrics.registry.inc("app_shared_state_errors_total", operation=operation)
+
+    def get(self, key):
+        """Return the value stored under ``key``, or ``None`` (also when the backend fails)."""
+        try:
+            raw = self.backend.get(self._key("value", key))
+        except Exception:
+            self._failed("get")
+            return None
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        """Store a JSON-serializable ``value`` for ``ttl`` seconds; return whether it was stored."""
+        try:
+            raw = json.dumps(value).encode("utf-8")
+        except (TypeError, ValueError):
+            return False
+        try:
+            self.backend.set(self._key("value", key), raw, ttl)
+            return True
+        except Exception:
+            self._failed("set")
+            return False
+
+    def _acquire(self, key, ttl):
+        """Return ``(taken, owner)``; a failing backend counts as taken, with no lease to release."""
+        owner = uuid.uuid4().hex
+        try:
+            return (True, owner) if self.backend.acquire_lease(self._key("lease", key), owner, ttl) else (False, None)
+        except Exception:
+            self._failed("lease")
+            return True, None
+
+    def _release(self, key, owner):
+        try:
+            self.backend.release_lease(self._key("lease", key), owner)
+        except Exception:
+            self._failed("lease")
+
+    def claim(self, key, ttl):
+        """Take ``key`` for ``ttl`` seconds if no process holds it; return whether this call took it.
+
+        A once-per-period marker (the lease is never released). If the
+        backend fails, every caller takes it, as with no sharing at all.
+        """
+        return self._acquire(key, ttl)[0]
+
+    def single_flight(self, key, lookup, compute, lease_ttl=LEASE_TTL):
+        """Return ``lookup()`` once it finds a value, running ``compute()`` in one process at a time.
+
+        ``lookup()`` returns ``None`` while there is nothing to serve. The
+        caller that takes the key's lease runs ``compute()``, which must
+        store its result where ``lookup()`` finds it, while other callers
+        poll ``lookup()``. If the holder fails or takes longer than
+        ``lease_ttl``, they compute it themselves.
+        """
+        deadline = time.monotonic() + lease_ttl
+        while True:
+            value = lookup()
+            if value is not None:
+                metrics.annotate(shared_state="hit")
+                return value
+            taken, owner = self._acquire(key, lease_ttl)
+            if taken or time.monotonic() >= deadline:
+                try:
+                    if taken:
+                        # The previous holder may have stored it since our read
+                        value = lookup()
+                        if value is not None:
+                            metrics.annotate(shared_state="hit")
+                            return value
+                    return compute()
+                finally:
+                    if owner is not None:
+                        self._release(key, owner)
+            time.sleep(POLL_INTERVAL)
+
+    def get_or_compute(self, key, compute, ttl, accept=None, lease_ttl=LEASE_TTL):
+        """Return the shared value for ``key``, computing it in one process at a time.
+
+        Without a stored value (that ``accept`` allows), ``compute()`` runs
+        under ``single_flight`` and its result is stored for ``ttl`` seconds.
+        """
+        def lookup():
+            value = self.get(key)
+            return value if value is not None and (accept is None or accept(value)) else None
+
+        def store():
+            value = compute()
+            self.set(key, value, ttl)
+            return value
+
+        return self.single_flight(key, lookup, store, lease_ttl)
+
+    def take_tokens(self, name, amount, rate, capacity, max_wait=math.inf):
+        """``SharedStateBackend.take_tokens`` for bucket ``name``; backend errors propagate."""
+        return self.backend.take_tokens(self._key("bucket", name), amount, rate, capacity, max_wait)
+
+
+class SharedTokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second, drawn on by every process.
+
+    The bucket lives in the process-wide ``SharedState`` (or ``state``).
+    If the backend fails, a process-local bucket with the same limits
+    takes over, so each process still keeps to the quota on its own.
+    """
+
+    def __init__(self, name, rate, capacity, state=None):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._state = state
+        self._fallback = MemoryBackend()
+
+    def _take(self, amount, max_wait):
+        # Requests larger than the bucket would otherwise never fit
+        amount = min(amount, self.capacity)
+        try:
+            return (self._state or get_shared_state()).take_tokens(self.name, amount, self.rate, self.capacity, max_wait)
+        except Exception:
+            metrics.registry.inc("app_shared_state_errors_total", operation="tokens")
+            return self._fallback.take_tokens(self.name, amount, self.rate, self.capacity, max_wait)
+
+    def reserve(self, amount=1):
+        """Take ``amount`` tokens (going into debt if needed); return the seconds to wait first."""
+        return self._take(amount, math.inf)
+
+    def try_acquire(self, amount=1):
+        """Take ``amount`` tokens only if they are available now."""
+        return self._take(amount, 0.0) is not None
+
+    def acquire(self, amount=1):
+        delay = self.reserve(amount)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+_backends = {
+    "memory": lambda location: MemoryBackend(),
+    "sqlite": lambda location: SQLiteBackend(location),
+    "redis": lambda location: RedisBackend(location),
+    "rediss": lambda location: RedisBackend(location),
+}
+_states = {}
+_states_lock = threading.Lock()
+
+
+def register_backend(scheme, factory):
+    """Make ``factory(location)`` available as ``open_shared_state("<scheme>://<location>")``."""
+    _backends[scheme] = factory
+
+
+def open_shared_state(url):
+    """Return the process-wide ``SharedState`` for ``url``, creating it on first use."""
+    with _states_lock:
+        state = _states.get(url)
+        if state is None:
+            parts = urlsplit(url)
+            if parts.scheme not in _backends:
+                raise ValueError(f"Unknown shared state backend: {parts.scheme!r}")
+            # sqlite:///relative/path and sqlite:////absolute/path, as in SQLAlchemy URLs
+            location = parts.netloc + parts.path[1:] if parts.scheme == "sqlite" else url
+            state = _states[url] = SharedState(_backends[parts.scheme](location))
+        return state
+
+
+def get_shared_state():
+    """Return the ``SharedState`` for the configured ``shared_state_url``."""
+    return open_shared_state(get_config().shared_state_url)
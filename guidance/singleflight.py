@@ -0,0 +1,133 @@
+"""Request coalescing (single-flight) for identical in-flight calls.
+
+When many sessions ask for the same thing at the same moment (typically
+right after a cache entry expires), only the first caller (the leader)
+runs the call and every concurrent caller with the same key waits for
+and shares its outcome, result or exception. Keys are forgotten as soon
+as the call finishes, so this never serves stale data; it only merges
+calls that overlap in time.
+
+``stream`` does the same for streamed completions: the leader's stream
+is pumped by a background thread into a shared buffer and every
+subscriber replays the chunks as they arrive.
+"""
+import contextvars
+import threading
+from concurrent.futures import Future
+
+from guidance import metrics
+
+
+class SharedStream:
+    """Append-only chunk buffer read by any number of subscribers."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = None
+        self.done = False
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def set_position(self, position):
+        with self._cond:
+            self.position = position
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def subscribe(self, on_wait=None):
+        """Yield every chunk from the start; ``on_wait(position)`` reports queueing upstream."""
+        index = 0
+        reported = None
+        while True:
+            with self._cond:
+                while index == len(self.chunks) and not self.done and self.position == reported:
+                    self._cond.wait()
+                new_chunks = self.chunks[index:]
+                index += len(new_chunks)
+                position = self.position
+                finished = self.done and index == len(self.chunks)
+            # Deliver outside the lock; consumers may be slow (e.g. UI updates)
+            if position != reported:
+                reported = position
+                # Queue positions only matter until the first chunk arrives
+                if on_wait is not None and position is not None and not index:
+                    on_wait(position)
+            yield from new_chunks
+            if finished:
+                return
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future of the call in progress
+        self._streams = {}  # key -> SharedStream being filled
+
+    def do(self, key, func):
+        """Return ``func()``, or the result of an identical call already in flight."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            metrics.annotate(coalesced=True)
+            return future.result()
+        try:
+            value = func()
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stream(self, key, open_stream, on_wait=None):
+        """Subscribe to the stream for ``key``, starting ``open_stream(on_wait)`` if none is running.
+
+        The stream is pumped to completion by a background thread, so
+        subscribers that stop reading early never cut the others short.
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = SharedStream()
+        if leader:
+            # Carry the metrics context so the pumped spans land in the leader's trace
+            context = contextvars.copy_context()
+            threading.Thread(
+                target=context.run, args=(self._pump, key, shared, open_stream), name="singleflight-stream", daemon=True
+            ).start()
+        else:
+            metrics.annotate(coalesced=True)
+        return shared.subscribe(on_wait)
+
+    def _pump(self, key, shared, open_stream):
+        try:
+            for chunk in open_stream(shared.set_position):
+                shared.publish(chunk)
+        finally:
+            with self._lock:
+                del self._streams[key]
+            shared.finish()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+
+# One group shared by every upstream call in the process
+shared_flights = SingleFlight()
@@ -0,0 +1,287 @@
+"""Persistent storage for user profiles and chat history.
+
+Profiles and conversations outlive the browser session and the process,
+so any replica behind a load balancer can serve any user without sticky
+sessions. ``StorageBackend`` is the interface; ``SQLiteBackend`` is the
+default and other backends can be plugged in with ``register_backend``
+and selected by URL scheme (``open_storage("sqlite:///path/to/db")``).
+
+Writes go through ``WriteBehindStore``: saves only append to an in-memory
+queue and a background thread commits them in batches, so the render
+never waits on disk. Reads see queued writes as well (read-your-writes),
+including a batch that is still being committed, so they never wait for a
+commit either; history is read page by page, never loaded whole. Histories under a
+prefix registered with ``expire_idle`` (guest sessions) are deleted once
+they have been idle for the given time.
+"""
+import abc
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from guidance import metrics
+
+FLUSH_INTERVAL = float(os.environ.get("STORAGE_FLUSH_INTERVAL", 0.5))
+MAX_BATCH = int(os.environ.get("STORAGE_MAX_BATCH", 500))
+# Idle histories are looked for at most this often
+EXPIRE_INTERVAL = 60 * 60
+
+
+class StorageBackend(abc.ABC):
+    """Interface for profile and chat history storage.
+
+    ``messages`` are ``(role, content, created)`` tuples; positions count
+    from 0 at the start of a user's history.
+    """
+
+    @abc.abstractmethod
+    def load_profile(self, username):
+        """Return ``username``'s profile dict, or None if there is none."""
+
+    @abc.abstractmethod
+    def save_profiles(self, profiles):
+        """Upsert ``{username: profile_dict}`` in one batch."""
+
+    @abc.abstractmethod
+    def append_messages(self, rows):
+        """Append ``[(username, role, content, created), ...]`` in one batch."""
+
+    @abc.abstractmethod
+    def count_messages(self, username):
+        """Return the number of messages in ``username``'s history."""
+
+    @abc.abstractmethod
+    def load_messages(self, username, start, end):
+        """Return messages ``start`` to ``end`` of ``username``'s history, oldest first."""
+
+    @abc.abstractmethod
+    def delete_idle_histories(self, prefix, idle_before):
+        """Delete the histories of users starting with ``prefix`` with no message since ``idle_before``."""
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite file with per-thread connections; WAL lets processes on one host share it."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS profiles (username TEXT PRIMARY KEY, data TEXT, updated REAL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, role TEXT, content TEXT, created REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_by_username ON messages (username, id)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load_profile(self, username):
+        row = self._connect().execute("SELECT data FROM profiles WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_profiles(self, profiles):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO profiles (username, data, updated) VALUES (?, ?, ?)",
+                [(username, json.dumps(profile), now) for username, profile in profiles.items()],
+            )
+
+    def append_messages(self, rows):
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO messages (username, role, content, created) VALUES (?, ?, ?, ?)", rows)
+
+    def count_messages(self, username):
+        return self._connect().execute("SELECT COUNT(*) FROM messages WHERE username = ?", (username,)).fetchone()[0]
+
+    def load_messages(self, username, start, end):
+        if end <= start:
+            return []
+        return self._connect().execute(
+            "SELECT role, content, created FROM messages WHERE username = ? ORDER BY id LIMIT ? OFFSET ?",
+            (username, end - start, start),
+        ).fetchall()
+
+    def delete_idle_histories(self, prefix, idle_before):
+        # Whole histories go at once, so positions in a history that is still in use never shift
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM messages WHERE username IN ("
+                "SELECT username FROM messages WHERE username >= ? AND username < ? "
+                "GROUP BY username HAVING MAX(created) < ?)",
+                (prefix, prefix + "\uffff", idle_before),
+            )
+
+
+class WriteBehindStore:
+    """Batches writes to a backend on a background thread; reads include queued writes."""
+
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending_lock = threading.Lock()
+        # Serializes commits and expiry; reads never take it
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending_profiles = {}
+        self._pending_messages = []  # (username, role, content, created)
+        # The batch being committed, still visible to reads until the commit is done
+        self._flushing_profiles = {}
+        self._flushing_messages = []
+        self._expiry = {}  # username prefix -> idle seconds
+        self._expired = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="storage-write-behind", daemon=True)
+        self._thread.start()
+
+    # ---- writes (never block on I/O) ----
+
+    def save_profile(self, username, profile):
+        with self._pending_lock:
+            self._pending_profiles[username] = dict(profile)
+        self._wake.set()
+
+    def append_message(self, username, role, content, created):
+        with self._pending_lock:
+            self._pending_messages.append((username, role, content, created))
+            full = len(self._pending_messages) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def expire_idle(self, prefix, ttl):
+        """Delete histories of users starting with ``prefix`` once idle for ``ttl`` seconds (checked hourly)."""
+        self._expiry[prefix] = ttl
+
+    # ---- reads ----
+
+    def load_profile(self, username):
+        with self._pending_lock:
+            pending = self._pending_profiles.get(username, self._flushing_profiles.get(username))
+        return dict(pending) if pending is not None else self.backend.load_profile(username)
+
+    def count_messages(self, username):
+        stored, pending = self._history(username)
+        return stored + len(pending)
+
+    def load_messages(self, username, start, end):
+        stored, pending = self._history(username)
+        rows = list(self.backend.load_messages(username, start, min(end, stored))) if start < stored else []
+        if end > stored:
+            rows.extend(pending[max(0, start - stored):end - stored])
+        return rows
+
+    def _history(self, username):
+        """Return how many of ``username``'s messages are stored, and the ones queued after them."""
+        with self._pending_lock:
+            flushing = [row[1:] for row in self._flushing_messages if row[0] == username]
+            pending = [row[1:] for row in self._pending_messages if row[0] == username]
+        stored = self.backend.count_messages(username)
+        if flushing and stored >= len(flushing):
+            # The batch may have been committed since the snapshot; it is then the last rows stored
+            committed = self.backend.load_messages(username, stored - len(flushing), stored)
+            if [tuple(row) for row in committed] == flushing:
+                flushing = []
+        return stored, flushing + pending
+
+    # ---- background flushing ----
+
+    def flush(self):
+        """Commit everything queued so far."""
+        with self._io_lock:
+            with self._pending_lock:
+                profiles, self._pending_profiles = self._pending_profiles, {}
+                messages, self._pending_messages = self._pending_messages, []
+                self._flushing_profiles, self._flushing_messages = profiles, messages
+            if not profiles and not messages:
+                return
+            with metrics.span("storage.flush", rows=len(profiles) + len(messages)):
+                try:
+                    if profiles:
+                        self.backend.save_profiles(profiles)
+                    if messages:
+                        self.backend.append_messages(messages)
+                except Exception:
+                    # Requeue in front of newer writes and retry on the next flush
+                    with self._pending_lock:
+                        self._pending_profiles = {**profiles, **self._pending_profiles}
+                        self._pending_messages = messages + self._pending_messages
+                        self._flushing_profiles, self._flushing_messages = {}, []
+                    raise
+            with self._pending_lock:
+                self._flushing_profiles, self._flushing_messages = {}, []
+
+    def _expire(self):
+        now = time.time()
+        if not self._expiry or now - self._expired < EXPIRE_INTERVAL:
+            return
+        self._expired = now
+        with self._io_lock:
+            for prefix, ttl in list(self._expiry.items()):
+                self.backend.delete_idle_histories(prefix, now - ttl)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                self._expire()
+            except Exception:
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        self.backend.close()
+
+
+_backends = {"sqlite": lambda location: SQLiteBackend(location)}
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def register_backend(scheme, factory):
+    """Make ``factory(location)`` available as ``open_storage("<scheme>://<location>")``."""
+    _backends[scheme] = factory
+
+
+def open_storage(url):
+    """Return the process-wide write-behind store for ``url``, creating it on first use."""
+    with _stores_lock:
+        store = _stores.get(url)
+        if store is None:
+            parts = urlsplit(url)
+            if parts.scheme not in _backends:
+                raise ValueError(f"Unknown storage backend: {parts.scheme!r}")
+            # sqlite:///relative/path and sqlite:////absolute/path, as in SQLAlchemy URLs
+            location = parts.netloc + parts.path[1:] if parts.scheme == "sqlite" else url
+            store = _stores[url] = WriteBehindStore(_backends[parts.scheme](location))
+        return store
+
+
+@atexit.register
+def _close_all():
+    for store in list(_stores.values()):
+        try:
+            store.close()
+        except Exception:
+            pass
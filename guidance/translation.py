@@ -0,0 +1,79 @@
+"""Batched, cached translation through LibreTranslate.
+
+LibreTranslate expects ISO 639-1 codes ("es", not "spanish") and accepts
+a list of strings in ``q``, so every string a render needs is sent in one
+request. Translations are cached by a hash of (target code, text); only
+strings not already cached go over the wire.
+"""
+import hashlib
+import json
+
+from guidance import http_client
+from guidance.cache import TTLCache
+
+# ISO 639-1 codes for the languages offered in the sidebar
+LANGUAGE_CODES = {
+    "English": "en",
+    "Spanish": "es",
+    "French": "fr",
+    "German": "de",
+    "Chinese": "zh",
+    "Hindi": "hi",
+    "Arabic": "ar",
+    "Portuguese": "pt",
+    "Russian": "ru",
+    "Japanese": "ja",
+}
+
+SOURCE_CODE = "en"
+CACHE_TTL = 7 * 24 * 60 * 60
+
+translation_cache = TTLCache(maxsize=4096)
+
+
+def language_code(language):
+    """Return the ISO code for a sidebar language name, or ``None`` if unsupported."""
+    return LANGUAGE_CODES.get(language)
+
+
+def _cache_key(code, text):
+    return hashlib.sha256(f"{code}\0{text}".encode("utf-8")).hexdigest()
+
+
+def translate_batch(texts, language, url):
+    """Translate ``texts`` from English into ``language`` with at most one request.
+
+    Returns a list in the same order. Strings that cannot be translated
+    (unsupported language, empty text, API failure) come back unchanged,
+    and failures are not cached.
+    """
+    code = language_code(language)
+    if code is None or code == SOURCE_CODE:
+        return list(texts)
+    results = list(texts)
+    missing = {}  # text -> positions still needing a translation
+    for index, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        found, value, _ = translation_cache.get(_cache_key(code, text))
+        if found:
+            results[index] = value
+        else:
+            missing.setdefault(text, []).append(index)
+    if not missing:
+        return results
+    batch = list(missing)
+    payload = {"q": batch, "source": SOURCE_CODE, "target": code, "format": "text"}
+    try:
+        response = http_client.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
+        response.raise_for_status()
+        translated = response.json().get("translatedText")
+    except Exception:
+        return results
+    if not isinstance(translated, list) or len(translated) != len(batch):
+        return results
+    for text, value in zip(batch, translated):
+        translation_cache.set(_cache_key(code, text), value, CACHE_TTL)
+        for index in missing[text]:
+            results[index] = value
+    return results
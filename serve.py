@@ -0,0 +1,15 @@
+"""ASGI entry point: the Streamlit app with long-lived cache headers on static assets.
+
+Content-hashed theme files and cached media under ``app/static/`` never
+change at a given URL, so they are served with a one-year immutable
+``Cache-Control`` header. Run with either of:
+
+    streamlit run serve.py
+    uvicorn serve:app --port 8501
+"""
+import streamlit as st
+from starlette.middleware import Middleware
+
+from guidance.assets import ImmutableAssetsMiddleware
+
+app = st.App("streamlit_app.py", middleware=[Middleware(ImmutableAssetsMiddleware)])
@@ -1,147 +1,91 @@
 import streamlit as st
-import requests
 import json
-from datetime import datetime
-import random
+import re
 import time
-import streamlit.components.v1 as components
+import uuid
+from guidance import breaker, metrics
+from guidance.accounts import GUEST_HISTORY_TTL, GUEST_PREFIX, create_account, guest_key, load_account
+from guidance.assets import get_assets, get_media_cache
+from guidance.config import get_config
+from guidance.context import ContextBuilder
+from guidance.fanout import fetch_concurrently
+from guidance.history import ChatHistory
+from guidance.locations import get_locations
+from guidance.services import (
+    LANGUAGES, NEWS_FALLBACK, RELIGIONS, fetch_background_music, fetch_news_headlines, get_community_forums,
+    get_donation_links, get_inspirational_videos, get_meditation_guide, get_predefined_music, get_prayer_of_the_day,
+    get_prayer_times, get_upcoming_events, prepare_answer, stream_answer, translate_texts,
+)
+from guidance.storage import open_storage
 
 # ============================
 # Configuration and Setup
 # ============================
 
+# Collect instrumentation spans for this rerun (shown in the optional debug panel)
+rerun_started = time.perf_counter()
+rerun_trace = metrics.start_trace()
+
 # Set page configuration
 st.set_page_config(page_title="🙏 AI-Powered Multi-Religious Guidance 🙏", layout="wide")
 
-# Hide Streamlit's default style elements for a cleaner look
-hide_streamlit_style = """
-            <style>
-            #MainMenu {visibility: hidden;}
-            footer {visibility: hidden;}
-            </style>
-            """
-st.markdown(hide_streamlit_style, unsafe_allow_html=True)
-
-# Define CSS for themes, animations, and chat bubbles
-theme_css = """
-<style>
-/* Theme Styles */
-body.light-theme {
-    background-color: #FFFFFF;
-    color: #000000;
-}
-.sidebar.light-theme {
-    background-color: #F0F0F0;
-    color: #000000;
-}
-
-body.dark-theme {
-    background-color: #2C2C2C;
-    color: #FFFFFF;
-}
-.sidebar.dark-theme {
-    background-color: #1E1E1E;
-    color: #FFFFFF;
-}
-
-body.blue-theme {
-    background-color: #E6F0FF;
-    color: #003366;
-}
-.sidebar.blue-theme {
-    background-color: #CCE0FF;
-    color: #003366;
-}
-
-body.green-theme {
-    background-color: #E6FFE6;
-    color: #006600;
-}
-.sidebar.green-theme {
-    background-color: #CCFFCC;
-    color: #006600;
-}
-
-/* Chat Bubble Styles */
-.chat-container {
-    display: flex;
-    flex-direction: column;
-}
-
-.user-bubble {
-    align-self: flex-end;
-    background-color: #DCF8C6;
-    border-radius: 15px;
-    padding: 10px;
-    margin: 5px;
-    max-width: 70%;
-    animation: fadeIn 0.5s ease-in-out;
-}
-
-.assistant-bubble {
-    align-self: flex-start;
-    background-color: #FFFFFF;
-    border-radius: 15px;
-    padding: 10px;
-    margin: 5px;
-    max-width: 70%;
-    animation: fadeIn 0.5s ease-in-out;
-}
-
-@keyframes fadeIn {
-    from { opacity: 0; transform: translateY(20px); }
-    to { opacity: 1; transform: translateY(0); }
-}
-
-/* Invisible Audio Player */
-#audio_player {
-    display: none;
-}
-
-/* Additional Animations */
-.message {
-    animation: slideIn 0.5s ease-in-out;
-}
-
-@keyframes slideIn {
-    from { opacity: 0; transform: translateX(-50px); }
-    to { opacity: 1; transform: translateX(0); }
-}
-
-/* Button Styles */
-.stButton > button {
-    background-color: #4CAF50;
-    color: white;
-    padding: 8px 16px;
-    border: none;
-    border-radius: 5px;
-    cursor: pointer;
-}
-
-.stButton > button:hover {
-    background-color: #45a049;
-}
-</style>
-"""
+# The heading is sent before anything else is set up, so a new replica shows something straight away
+st.title("🙏 AI-Powered Multi-Religious Guidance 🙏")
+st.markdown("""
+Welcome to the AI-Powered Multi-Religious Guidance platform. Select your religion and language to receive personalized prayers, scriptures, inspirational content, and more.
+""")
 
-st.markdown(theme_css, unsafe_allow_html=True)
+# API keys and endpoints are read once per process (environment first, then Streamlit secrets);
+# the helpers in guidance.services get them from the same config
+config = get_config(st.secrets)
 
-# JavaScript for setting body and sidebar classes based on theme
-theme_js = """
-<script>
-function setTheme(theme) {
-    document.body.className = theme + '-theme';
-    document.querySelector('.sidebar').className = theme + '-theme';
-}
-</script>
-"""
+# Theme, chat bubble and footer styles plus the theme script live in assets/ and are
+# served as minified, content-hashed files from Streamlit's static folder
+static_assets = get_assets()
+media_cache = get_media_cache()
+STATIC_SERVING = st.get_option("server.enableStaticServing")
 
-st.markdown(theme_js, unsafe_allow_html=True)
+# The stylesheet and script are added to the page's <head> once per session by a
+# small component; later reruns only send a setTheme call when the theme changes
+STATIC_ASSETS_ID = "guidance-static-assets"
 
 # Function to set the theme
 def apply_theme(theme):
     st.session_state.theme = theme
-    st.markdown(f"<script>setTheme('{theme}');</script>", unsafe_allow_html=True)
+    if st.session_state.get("applied_theme") == theme:
+        return
+    assets = ""
+    if "applied_theme" not in st.session_state:
+        css_url = static_assets.url("theme.css") if STATIC_SERVING else None
+        js_url = static_assets.url("theme.js") if STATIC_SERVING else None
+        if css_url and js_url:
+            styles = f'<link rel="stylesheet" href="{css_url}">'
+            script = f"script.src = {json.dumps(js_url)};"
+        else:
+            # Static serving is off or the assets could not be built: inline them instead
+            styles = f"<style>{static_assets.text('theme.css')}</style>"
+            script = f"script.textContent = {json.dumps(static_assets.text('theme.js'))};"
+        assets = f"""
+    if (!doc.getElementById("{STATIC_ASSETS_ID}")) {{
+        doc.head.insertAdjacentHTML("beforeend", {json.dumps(styles)});
+        const script = doc.createElement("script");
+        script.id = "{STATIC_ASSETS_ID}";
+        {script}
+        doc.head.appendChild(script);
+    }}"""
+    st.session_state.applied_theme = theme
+    st.iframe(f"""
+<script>
+    const doc = window.parent.document;{assets}
+    const setTheme = () => window.parent.setTheme({json.dumps(theme)});
+    // The theme script loads asynchronously the first time
+    if (window.parent.setTheme) {{
+        setTheme();
+    }} else {{
+        doc.getElementById("{STATIC_ASSETS_ID}").addEventListener("load", setTheme);
+    }}
+</script>
+""", height="content")
 
 # ============================
 # Sidebar - User Preferences
@@ -150,19 +94,20 @@ def apply_theme(theme):
 st.sidebar.header("Setup Your Preferences")
 
 # Religion Selection
-religions = [
-    "Christianity", "Islam", "Hinduism", "Buddhism", "Judaism",
-    "Sikhism", "Jainism", "Baha'i", "Shinto", "Taoism"
-]
+religions = RELIGIONS
 religion = st.sidebar.selectbox("Select Your Religion", religions)
 
 # Language Selection
-languages = [
-    "English", "Spanish", "French", "German", "Chinese",
-    "Hindi", "Arabic", "Portuguese", "Russian", "Japanese"
-]
+languages = LANGUAGES
 language = st.sidebar.selectbox("Select Language", languages)
 
+# Location Selection (prayer times are computed for this place)
+locations = list(get_locations())
+location = st.sidebar.selectbox(
+    "Select Your Location", locations,
+    index=locations.index(config.default_location) if config.default_location in locations else 0,
+)
+
 # Theme Selection
 themes = ["Light", "Dark", "Blue", "Green"]
 theme = st.sidebar.selectbox("Select Theme", themes)
@@ -172,310 +117,101 @@ if 'theme' not in st.session_state:
     st.session_state.theme = "Light"
 apply_theme(theme.lower())
 
-# Initialize session state for messages and user profile
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'user_profile' not in st.session_state:
-    st.session_state.user_profile = {"username": "Guest"}
-
-# ============================
-# API Keys and Endpoints
-# ============================
-
-# Retrieve the API key from Streamlit secrets
-API_KEY = st.secrets["API_KEY"]
+# Profiles and chat history are persisted here so any replica can serve any user
+# (set STORAGE_URL in Streamlit secrets to use another registered backend)
+storage = open_storage(config.storage_url)
+# Guest conversations are only kept while they are in use
+storage.expire_idle(GUEST_PREFIX, GUEST_HISTORY_TTL)
+
+# Number of messages shown per conversation page
+HISTORY_PAGE_SIZE = 20
+
+# Function to bind the session to a stored history, its profile and a fresh context builder
+def bind_history(key, profile):
+    st.session_state.account_key = key
+    st.session_state.user_profile = profile
+    st.session_state.messages = ChatHistory(store=storage, username=key)
+    st.session_state.context_builder = ContextBuilder()
+
+# Function to bind the session to the account of a secret token, or to a private guest history
+def load_session(token):
+    key, profile = load_account(storage, token)
+    if key is None:
+        bind_history(guest_key(st.session_state.session_id), {"username": "Guest"})
+        if token is not None:
+            # Unknown token: don't keep it in the URL
+            del st.query_params["token"]
+        return
+    bind_history(key, profile)
 
-# Define the Chat Completion API endpoint
-API_URL = "https://api.aimlapi.com/chat/completions"
+# Initialize session state for the session id, user profile and messages
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'user_profile' not in st.session_state:
+    # The account token in the URL brings the profile and history back after a reload or restart
+    load_session(st.query_params.get("token"))
 
-# Define the Background Music API endpoint (Assuming a hypothetical API)
-MUSIC_API_URL = "https://api.religiousmusicapi.com/get_music"
+# Optional Prometheus scrape endpoint for the instrumentation metrics
+if config.metrics_port:
+    metrics.start_http_server(config.metrics_port)
 
-# Define additional API endpoints
-BIBLE_API_URL = "https://beta.ourmanna.com/api/v1/get/?format=json&order=random"  # For daily verses
-NEWS_API_URL = "https://newsapi.org/v2/everything"  # Requires API key
-TRANSLATION_API_URL = "https://libretranslate.de/translate"  # Free translation API
+# Per-source deadlines (seconds) for the concurrent page fetches
+NEWS_FETCH_DEADLINE = 2.0
+MUSIC_FETCH_DEADLINE = 1.5
+TRANSLATION_FETCH_DEADLINE = 2.0
 
 # ============================
 # Helper Functions
 # ============================
 
-# Function to call the custom Chat Completion API
-def get_api_response(model, messages, max_tokens=500, temperature=0.7, top_p=1.0, frequency_penalty=0.0, stream=False):
-    payload = {
-        "model": model,
-        "messages": messages,
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": top_p,
-        "frequency_penalty": frequency_penalty,
-        "stream": stream
-    }
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {API_KEY}"
-    }
-    
-    try:
-        response = requests.post(API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        data = response.json()
-        
-        # Adjust based on your API's response structure
-        ai_message = data.get('choices', [])[0].get('message', {}).get('content', '').strip()
-        return ai_message
-    except requests.exceptions.HTTPError as http_err:
-        return f"HTTP error occurred: {http_err}"
-    except Exception as e:
-        return f"An error occurred: {str(e)}"
-
-# Function to get background music URL based on religion
-def get_background_music(religion):
-    # Example: Fetch music from a hypothetical API
-    params = {"religion": religion}
-    try:
-        response = requests.get(MUSIC_API_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        music_url = data.get("music_url")
-        return music_url
-    except:
-        # Fallback to predefined music URLs if API fails
-        predefined_music = {
-            "Christianity": "https://example.com/christian_music.mp3",
-            "Islam": "https://example.com/islam_music.mp3",
-            "Hinduism": "https://example.com/hindu_music.mp3",
-            "Buddhism": "https://example.com/buddhism_music.mp3",
-            "Judaism": "https://example.com/judaism_music.mp3",
-            "Sikhism": "https://example.com/sikhism_music.mp3",
-            "Jainism": "https://example.com/jainism_music.mp3",
-            "Baha'i": "https://example.com/bahai_music.mp3",
-            "Shinto": "https://example.com/shinto_music.mp3",
-            "Taoism": "https://example.com/taoism_music.mp3"
-        }
-        return predefined_music.get(religion, "")
-
-# Function to get daily verse or scripture
-def get_daily_verse(religion, language):
-    if religion == "Christianity":
-        # Using OurManna API for random Bible verses
-        try:
-            response = requests.get(BIBLE_API_URL)
-            data = response.json()
-            verse = data.get("verse", {}).get("details", {}).get("text", "Stay blessed and have a peaceful day.")
-            return verse
-        except:
-            return "Stay blessed and have a peaceful day."
-    else:
-        # Placeholder for other religions
-        daily_verses = {
-            "Islam": "Quran 2:255 - Allah! There is no deity except Him...",
-            "Hinduism": "Bhagavad Gita 2:47 - You have the right to perform your prescribed duties...",
-            "Buddhism": "Dhammapada 1: Mind precedes all...",
-            "Judaism": "Psalm 23: The Lord is my shepherd...",
-            "Sikhism": "Japji Sahib - Meditation on God's name...",
-            "Jainism": "Acharanga Sutra - Non-violence is the highest duty...",
-            "Baha'i": "The Hidden Words - By Him that loveth best...",
-            "Shinto": "Kojiki - Kami are revered...",
-            "Taoism": "Tao Te Ching 1 - The Tao that can be told..."
-        }
-        return daily_verses.get(religion, "Stay blessed and have a peaceful day.")
-
-# Function to get inspirational quotes
-def get_inspirational_quote(religion):
-    # Placeholder for actual implementation
-    quotes = {
-        "Christianity": "Faith is taking the first step even when you don't see the whole staircase.",
-        "Islam": "The best among you are those who have the best manners and character.",
-        "Hinduism": "Where there is Dharma, there is victory.",
-        "Buddhism": "Peace comes from within. Do not seek it without.",
-        "Judaism": "Whoever saves one life, it is as if they have saved the entire world.",
-        "Sikhism": "Live without regret, love without limits.",
-        "Jainism": "A man is great by deeds, not by birth.",
-        "Baha'i": "Be generous in prosperity, and thankful in adversity.",
-        "Shinto": "Harmony with nature brings peace.",
-        "Taoism": "Nature does not hurry, yet everything is accomplished."
-    }
-    return quotes.get(religion, "Inspirational quote here.")
-
-# Function to get prayer times (Simplified - based on fixed times)
-def get_prayer_times(religion):
-    prayer_times = {
-        "Islam": ["Fajr: 5:00 AM", "Dhuhr: 12:30 PM", "Asr: 3:45 PM", "Maghrib: 6:15 PM", "Isha: 7:30 PM"],
-        # Add other religions' prayer times if applicable
-    }
-    return prayer_times.get(religion, [])
-
-# Function to get upcoming religious events (Simplified)
-def get_upcoming_events(religion):
-    events = {
-        "Christianity": ["Easter - April 9, 2024", "Christmas - December 25, 2024"],
-        "Islam": ["Ramadan - Starts March 10, 2024", "Eid al-Fitr - April 9, 2024"],
-        "Hinduism": ["Diwali - November 1, 2024", "Holi - March 25, 2024"],
-        "Buddhism": ["Vesak - May 23, 2024"],
-        "Judaism": ["Yom Kippur - October 11, 2024", "Hanukkah - December 25, 2024"],
-        # Add more as needed
-    }
-    return events.get(religion, [])
-
-# Function to get donation links (Simplified)
-def get_donation_links(religion):
-    donation_links = {
-        "Christianity": "https://www.christiancharities.org/donate",
-        "Islam": "https://www.islamiccharities.org/donate",
-        "Hinduism": "https://www.hinducharities.org/donate",
-        "Buddhism": "https://www.buddhistcharities.org/donate",
-        "Judaism": "https://www.jewishcharities.org/donate",
-        "Sikhism": "https://www.sikhcharities.org/donate",
-        "Jainism": "https://www.jaincharities.org/donate",
-        "Baha'i": "https://www.bahaicharities.org/donate",
-        "Shinto": "https://www.shintocharities.org/donate",
-        "Taoism": "https://www.taaocharities.org/donate"
-    }
-    return donation_links.get(religion, "")
-
-# Function to get inspirational videos (Using YouTube API - requires API key)
-def get_inspirational_videos(religion):
-    # Placeholder: Using YouTube search for religious inspirational videos
-    # You need a YouTube Data API key and handle quotas
-    # For simplicity, returning static video links
-    videos = {
-        "Christianity": "https://www.youtube.com/embed/1i3Z3vZJh0Y",
-        "Islam": "https://www.youtube.com/embed/YOUR_ISLAM_VIDEO_ID",
-        "Hinduism": "https://www.youtube.com/embed/YOUR_HINDUISM_VIDEO_ID",
-        "Buddhism": "https://www.youtube.com/embed/YOUR_BUDDHISM_VIDEO_ID",
-        "Judaism": "https://www.youtube.com/embed/YOUR_JUDAISM_VIDEO_ID",
-        "Sikhism": "https://www.youtube.com/embed/YOUR_SIKHISM_VIDEO_ID",
-        "Jainism": "https://www.youtube.com/embed/YOUR_JAINISM_VIDEO_ID",
-        "Baha'i": "https://www.youtube.com/embed/YOUR_BAHAI_VIDEO_ID",
-        "Shinto": "https://www.youtube.com/embed/YOUR_SHINTO_VIDEO_ID",
-        "Taoism": "https://www.youtube.com/embed/YOUR_TAOISM_VIDEO_ID"
-    }
-    return videos.get(religion, "")
-
-# Function to translate text using LibreTranslate API
-def translate_text(text, target_language):
-    payload = {
-        "q": text,
-        "source": "en",
-        "target": target_language.lower(),
-        "format": "text"
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
-    try:
-        response = requests.post(TRANSLATION_API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        data = response.json()
-        translated_text = data.get("translatedText", text)
-        return translated_text
-    except:
-        return text  # Fallback to original text if translation fails
-
-# Function to get religious news using NewsAPI
-def get_religious_news(religion):
-    # Note: You need to obtain a NewsAPI key and add it to Streamlit secrets
-    NEWS_API_KEY = st.secrets.get("NEWS_API_KEY")
-    if not NEWS_API_KEY:
-        return ["News API key not found."]
-    params = {
-        "q": religion,
-        "apiKey": NEWS_API_KEY,
-        "language": "en",
-        "pageSize": 5,
-        "sortBy": "relevancy"
-    }
-    try:
-        response = requests.get(NEWS_API_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        articles = data.get("articles", [])
-        news = [f"[{article['title']}]({article['url']})" for article in articles]
-        return news if news else ["No recent news found."]
-    except:
-        return ["Unable to fetch news at this time."]
-
-# Function to get meditation guides (Placeholder)
-def get_meditation_guide(religion):
-    guides = {
-        "Christianity": "Focus on the presence of God and reflect on His blessings.",
-        "Islam": "Concentrate on the remembrance of Allah and your daily prayers.",
-        "Hinduism": "Engage in deep breathing and focus on the divine within.",
-        "Buddhism": "Practice mindfulness and observe your thoughts without judgment.",
-        "Judaism": "Reflect on your daily deeds and seek inner peace through prayer.",
-        "Sikhism": "Meditate on the divine name and cultivate inner harmony.",
-        "Jainism": "Practice deep breathing and focus on non-violence and truth.",
-        "Baha'i": "Contemplate the unity of humanity and the presence of God.",
-        "Shinto": "Connect with nature and honor the spirits around you.",
-        "Taoism": "Embrace the flow of the Tao and maintain inner balance."
-    }
-    return guides.get(religion, "Focus on your breath and find inner peace.")
-
-# Function to get community forum links
-def get_community_forums(religion):
-    forums = {
-        "Christianity": "https://www.reddit.com/r/Christianity/",
-        "Islam": "https://www.reddit.com/r/islam/",
-        "Hinduism": "https://www.reddit.com/r/hinduism/",
-        "Buddhism": "https://www.reddit.com/r/Buddhism/",
-        "Judaism": "https://www.reddit.com/r/Judaism/",
-        "Sikhism": "https://www.reddit.com/r/sikh/",
-        "Jainism": "https://www.reddit.com/r/Jainism/",
-        "Baha'i": "https://www.reddit.com/r/Bahai/",
-        "Shinto": "https://www.reddit.com/r/shinto/",
-        "Taoism": "https://www.reddit.com/r/taoism/"
-    }
-    return forums.get(religion, "")
-
-# ============================
-# Prayer of the Day Section
-# ============================
-
-# Function to get Prayer of the Day
-def get_prayer_of_the_day(religion, language):
-    system_prompt = f"You are a respectful assistant providing detailed prayers for {religion} in {language}."
-    user_prompt = "Please provide the Prayer of the Day with a relevant quotation."
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
-    prayer = get_api_response(
-        model="gpt-4o",
-        messages=messages,
-        max_tokens=300,
-        temperature=0.7,
-        stream=False
-    )
-    # Translate if necessary
-    if language != "English":
-        prayer = translate_text(prayer, language)
-    return prayer
+# Function to render streamed chunks into a placeholder as they arrive
+def render_stream(chunks, render):
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        render(text)
+    return text.strip()
 
 # ============================
 # Meditation Guide Section
 # ============================
 
 # Function to display meditation guide
-def display_meditation_guide():
-    guide = get_meditation_guide(religion)
+def display_meditation_guide(guide):
     st.markdown("### 🧘‍♂️ Guided Meditation 🧘‍♀️")
     st.write(guide)
 
+YOUTUBE_VIDEO_ID = re.compile(r"(?:youtube(?:-nocookie)?\.com/(?:embed/|watch\?v=)|youtu\.be/)([\w-]{11})")
+
+# Function to show a video; YouTube's player is only loaded once the thumbnail is clicked
+def display_video(video_url):
+    match = YOUTUBE_VIDEO_ID.search(video_url)
+    if not match:
+        st.video(video_url)
+        return
+    video_id = match.group(1)
+    st.iframe(f"""
+<style>
+    body {{ margin: 0; }}
+    .video {{ position: relative; aspect-ratio: 16 / 9; cursor: pointer; background: #000; }}
+    .video img, .video iframe {{ width: 100%; height: 100%; object-fit: cover; border: 0; }}
+    .video button {{ position: absolute; inset: 0; margin: auto; width: 68px; height: 48px; border: 0;
+        border-radius: 12px; background: rgba(255, 0, 0, 0.85); color: #fff; font-size: 24px; cursor: pointer; }}
+</style>
+<div class="video" onclick="this.innerHTML = '<iframe src=&quot;https://www.youtube-nocookie.com/embed/{video_id}?autoplay=1&quot; allow=&quot;autoplay; encrypted-media; picture-in-picture&quot; allowfullscreen></iframe>'">
+    <img src="https://i.ytimg.com/vi/{video_id}/hqdefault.jpg" loading="lazy" alt="Play video">
+    <button aria-label="Play video">&#9654;</button>
+</div>
+""", height="content")
+
 # ============================
 # Main Content
 # ============================
 
-st.title("🙏 AI-Powered Multi-Religious Guidance 🙏")
-st.markdown("""
-Welcome to the AI-Powered Multi-Religious Guidance platform. Select your religion and language to receive personalized prayers, scriptures, inspirational content, and more.
-""")
-
 # Display Prayer of the Day Button
 if st.button("Show Prayer of the Day"):
     with st.spinner('Generating Prayer of the Day...'):
-        prayer = get_prayer_of_the_day(religion, language)
+        prayer = get_prayer_of_the_day(religion, language, st.session_state.session_id)
     st.markdown("### 🕊️ Prayer of the Day 🕊️")
     st.write(prayer)
 
@@ -484,47 +220,68 @@ st.markdown("---")
 # Chat Interface
 st.markdown("### 💬 Ask Your Religious Questions 💬")
 
-# Function to handle user input and AI response
+# Function to build the HTML for a chat bubble
+def chat_bubble_html(role, content):
+    bubble_class = 'user-bubble' if role == 'user' else 'assistant-bubble'
+    return f"<div class='chat-container'><div class='{bubble_class}'>{content}</div></div>"
+
+# Function to handle user input and stream the AI response into the conversation
 def handle_user_input(user_input):
     if user_input.strip() == "":
         return
-    st.session_state.messages.append({"role": "user", "content": user_input})
     
-    system_prompt = f"You are a knowledgeable and respectful assistant for {religion} followers. Answer the following question based on {religion} teachings in {language}."
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_input}
-    ]
+    # Route the question (static answer, cheaper model or gpt-4) and ground it in local passages
+    route, messages = prepare_answer(user_input, religion, language, st.session_state.messages, st.session_state.context_builder, location)
     
-    with st.spinner('Generating response...'):
-        ai_response = get_api_response(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7,
-            stream=False
-        )
-    
-    # Translate if necessary
-    if language != "English":
-        ai_response = translate_text(ai_response, language)
+    st.session_state.messages.append("user", user_input)
+    st.markdown(chat_bubble_html("user", user_input), unsafe_allow_html=True)
     
-    st.session_state.messages.append({"role": "assistant", "content": ai_response})
-
-# User Input with Emoji Support and Voice Input
-user_input = st.text_input("You:", key="input", placeholder="Type your message here... 😊")
+    # Render the assistant bubble straight away and fill it in as tokens arrive
+    bubble = st.empty()
+    render_bubble = lambda text: bubble.markdown(chat_bubble_html("assistant", text), unsafe_allow_html=True)
+    with metrics.span(f"answer.{route.tier}", model=route.model, route_reason=route.reason):
+        if route.answer is not None:
+            ai_response = route.answer
+            render_bubble(ai_response)
+        else:
+            render_bubble("...")
+            ai_response = render_stream(
+                stream_answer(
+                    route,
+                    messages,
+                    session_id=st.session_state.session_id,
+                    on_queue=lambda position: render_bubble(f"⏳ Many people are asking right now. You are number {position} in the queue...")
+                ),
+                render_bubble
+            )
+    st.session_state.messages.append("assistant", ai_response)
+
+# Chat interface as a fragment: typing, sending and paging rerun only this part of the page
+@st.fragment
+def chat_interface():
+    # User Input with Emoji Support and Voice Input
+    user_input = st.text_input("You:", key="input", placeholder="Type your message here... 😊")
+
+    send_clicked = st.button("Send")
+
+    # Display the conversation with animated chat bubbles, one page at a time
+    st.markdown("### Conversation")
+    history_page = 0
+    history_pages = st.session_state.messages.page_count(HISTORY_PAGE_SIZE)
+    if history_pages > 1:
+        history_page = st.number_input("Conversation page (1 is the most recent)", min_value=1, max_value=history_pages, value=1) - 1
+    conversation_html = "".join(
+        chat_bubble_html(message.role, message.content)
+        for message in st.session_state.messages.page(history_page, HISTORY_PAGE_SIZE)
+    )
+    if conversation_html:
+        st.markdown(conversation_html, unsafe_allow_html=True)
 
-# Handle user input on Send button click
-if st.button("Send"):
-    handle_user_input(user_input)
+    # Handle user input on Send button click, streaming the reply below the history
+    if send_clicked:
+        handle_user_input(user_input)
 
-# Display the conversation with animated chat bubbles
-st.markdown("### Conversation")
-for message in st.session_state.messages:
-    if message['role'] == 'user':
-        st.markdown(f"<div class='chat-container'><div class='user-bubble'>{message['content']}</div></div>", unsafe_allow_html=True)
-    else:
-        st.markdown(f"<div class='chat-container'><div class='assistant-bubble'>{message['content']}</div></div>", unsafe_allow_html=True)
+chat_interface()
 
 # ============================
 # Additional Features Section
@@ -533,70 +290,143 @@ for message in st.session_state.messages:
 st.markdown("---")
 st.markdown("## Additional Features")
 
-col1, col2, col3, col4, col5 = st.columns(5)
-
-with col1:
-    # Meditation Guides
-    display_meditation_guide()
-
-with col2:
-    # Religious News Feed
-    st.markdown("### 📰 Religious News 📰")
-    news = get_religious_news(religion)
-    for item in news:
-        st.markdown(f"- {item}")
-
-with col3:
-    # Inspirational Videos
-    st.markdown("### 📹 Inspirational Videos 📹")
-    video_url = get_inspirational_videos(religion)
-    if video_url:
-        st.video(video_url)
-    else:
-        st.write("No videos available.")
-
-with col4:
-    # Community Forums
-    st.markdown("### 🗣️ Community Forums 🗣️")
-    forum_link = get_community_forums(religion)
-    if forum_link:
-        st.markdown(f"[Join the Discussion]({forum_link})")
-    else:
-        st.write("Community forums not available.")
-
-with col5:
-    # Language Translation Toggle
-    st.markdown("### 🌐 Language Translation 🌐")
-    translate = st.checkbox("Enable Translation")
-    if translate and language != "English":
-        st.markdown(f"**Translations are enabled. Responses will be in {language}.**")
-    elif translate:
-        st.markdown("**Translations are enabled but already in English.**")
-    else:
-        st.markdown("**Translations are disabled. Responses will be in English.**")
+# Language Translation Toggle, always rendered so the setting is kept while panels are closed
+st.markdown("### 🌐 Language Translation 🌐")
+translate = st.checkbox("Enable Translation", key="enable_translation")
+if translate and language != "English":
+    st.markdown(f"**Translations are enabled. Responses will be in {language}.**")
+elif translate:
+    st.markdown("**Translations are enabled but already in English.**")
+else:
+    st.markdown("**Translations are disabled. Responses will be in English.**")
+translate_static = translate and language != "English"
+
+# Panel data is memoized per session for this long, so reruns (e.g. typing in the chat)
+# and reopening a panel don't touch the upstream fetches again
+PANEL_DATA_TTL = 5 * 60
+
+if 'panel_data' not in st.session_state:
+    st.session_state.panel_data = {}
+
+# Function to load the open panels' data in one concurrent fan-out, memoized per session;
+# a source that misses its deadline shows its fallback and is asked again on the next rerun,
+# by which time the fetch left running in the background has usually warmed the cache
+def load_panel_data(sources):
+    now = time.monotonic()
+    memo = st.session_state.panel_data
+    values = {key: memo[key][0] for key in sources if key in memo and now - memo[key][1] <= PANEL_DATA_TTL}
+    missing = {key: source for key, source in sources.items() if key not in values}
+    if missing:
+        fell_back = set()
+        fetched = fetch_concurrently(missing, fell_back)
+        for key, value in fetched.items():
+            if key not in fell_back:
+                memo[key] = (value, now)
+        values.update(fetched)
+    return values
+
+# Function to describe the one batched fetch that shows static English content in the selected language
+def translation_source(texts):
+    return ("translation", language, *texts), (lambda: translate_texts(list(texts), language), list(texts), TRANSLATION_FETCH_DEADLINE)
+
+# Function to split the static content of the open panels, in the selected language when translation is enabled,
+# back into one list per panel
+def localize(panel_data, groups):
+    texts = [text for group in groups for text in group]
+    if translate_static and texts:
+        texts = panel_data[translation_source(texts)[0]]
+    localized = []
+    for group in groups:
+        localized.append(texts[:len(group)])
+        texts = texts[len(group):]
+    return localized
+
+# Only the selected tab and the open panels below are executed on each rerun
+meditation_tab, news_tab, videos_tab, forums_tab = st.tabs(
+    ["🧘 Meditation", "📰 News", "📹 Videos", "🗣️ Forums"], key="feature_tab", on_change="rerun"
+)
+events_panel = st.expander("📅 Upcoming Religious Events 📅", key="events_panel", on_change="rerun")
+donation_panel = st.expander("💖 Support Us 💖", key="donation_panel", on_change="rerun")
+# The music lookup only runs (and the audio only plays) once the panel is opened
+music_panel = st.expander("🎶 Background Music 🎶", key="music_panel", on_change="rerun")
+
+# Every open panel's upstream data is fetched in one fan-out, so their deadlines overlap instead of adding up
+meditation_guide = [get_meditation_guide(religion)] if meditation_tab.open else []
+upcoming_events = get_upcoming_events(religion) if events_panel.open else []
+# Static texts of every open panel are translated in a single request
+static_texts = meditation_guide + upcoming_events
+panel_sources = {}
+if static_texts and translate_static:
+    translation_key, translation = translation_source(static_texts)
+    panel_sources[translation_key] = translation
+# The sources raise on failure, so fallbacks are reported by the fan-out and never memoized
+if news_tab.open:
+    panel_sources[("news", religion)] = (lambda: fetch_news_headlines(religion), [NEWS_FALLBACK], NEWS_FETCH_DEADLINE)
+if music_panel.open:
+    panel_sources[("music", religion)] = (lambda: fetch_background_music(religion), get_predefined_music(religion), MUSIC_FETCH_DEADLINE)
+panel_data = load_panel_data(panel_sources)
+meditation_guide, upcoming_events = localize(panel_data, [meditation_guide, upcoming_events])
+
+if meditation_tab.open:
+    with meditation_tab:
+        # Meditation Guides
+        display_meditation_guide(meditation_guide[0])
+
+if news_tab.open:
+    with news_tab:
+        # Religious News Feed
+        st.markdown("### 📰 Religious News 📰")
+        for item in panel_data[("news", religion)]:
+            st.markdown(f"- {item}")
+
+if videos_tab.open:
+    with videos_tab:
+        # Inspirational Videos
+        st.markdown("### 📹 Inspirational Videos 📹")
+        video_url = get_inspirational_videos(religion)
+        if video_url:
+            display_video(video_url)
+        else:
+            st.write("No videos available.")
+
+if forums_tab.open:
+    with forums_tab:
+        # Community Forums
+        st.markdown("### 🗣️ Community Forums 🗣️")
+        forum_link = get_community_forums(religion)
+        if forum_link:
+            st.markdown(f"[Join the Discussion]({forum_link})")
+        else:
+            st.write("Community forums not available.")
 
 # ============================
 # Religious Events Calendar
 # ============================
 
-st.markdown("### 📅 Upcoming Religious Events 📅")
-events = get_upcoming_events(religion)
-if events:
-    for event in events:
-        st.write(f"- {event}")
-else:
-    st.write("No upcoming events available.")
+if events_panel.open:
+    with events_panel:
+        prayer_times = get_prayer_times(religion, location)
+        if prayer_times:
+            st.write(f"**Today's prayer times in {location}:**")
+            for prayer_time in prayer_times:
+                st.write(f"- {prayer_time}")
+        if upcoming_events:
+            for event in upcoming_events:
+                st.write(f"- {event}")
+        else:
+            st.write("No upcoming events available.")
 
 # ============================
 # Donation Links
 # ============================
 
-st.markdown("### 💖 Support Us 💖")
-donation_link = get_donation_links(religion)
-if donation_link:
-    st.markdown(f"[Donate Here]({donation_link})")
-else:
-    st.write("Donation links are not available for the selected religion.")
+if donation_panel.open:
+    with donation_panel:
+        donation_link = get_donation_links(religion)
+        if donation_link:
+            st.markdown(f"[Donate Here]({donation_link})")
+        else:
+            st.write("Donation links are not available for the selected religion.")
 
 # ============================
 # Religious News Feed
@@ -608,42 +438,33 @@ else:
 # Background Music Integration (Invisible)
 # ============================
 
-music_url = get_background_music(religion)
-if music_url:
-    st.markdown(f"""
-    <audio autoplay loop>
-        <source src="{music_url}" type="audio/mp3">
-    </audio>
-    """, unsafe_allow_html=True)
-else:
-    st.write("🎶 No background music available for the selected religion.")
+if music_panel.open:
+    with music_panel:
+        music_url = panel_data[("music", religion)]
+        if music_url:
+            # Served from the local media cache once downloaded (the first play streams the remote file)
+            local_music_url = media_cache.local_url(music_url) if STATIC_SERVING else None
+            st.markdown(f"""
+            <audio autoplay loop preload="none">
+                <source src="{local_music_url or music_url}">
+            </audio>
+            """, unsafe_allow_html=True)
+            st.write("🎶 Background music is playing.")
+        else:
+            st.write("🎶 No background music available for the selected religion.")
 
 # ============================
 # Footer with Animation
 # ============================
 
-footer_css = """
-<style>
-.footer {
-    position: fixed;
-    left: 0;
-    bottom: 0;
-    width: 100%;
-    background-color: #f1f1f1;
-    color: #333333;
-    text-align: center;
-    animation: fadeIn 2s;
-}
-</style>
-"""
-
+# The footer's styles are part of assets/theme.css
 footer_html = """
 <div class="footer">
     &copy; 2024 AI-Powered Multi-Religious Guidance. All rights reserved.
 </div>
 """
 
-st.markdown(footer_css + footer_html, unsafe_allow_html=True)
+st.markdown(footer_html, unsafe_allow_html=True)
 
 # ============================
 # Voice Interaction (Optional)
@@ -662,12 +483,27 @@ st.write("*Voice interaction feature is under development. Stay tuned!*")
 # ============================
 
 # Placeholder for user profile management
-st.markdown("### 👤 User Profile 👤")
-username = st.text_input("Enter your name:", value=st.session_state.user_profile.get("username", "Guest"))
-
-if st.button("Save Profile"):
-    st.session_state.user_profile["username"] = username
-    st.success("Profile saved!")
+profile_panel = st.expander("👤 User Profile 👤", key="profile_panel", on_change="rerun")
+if profile_panel.open:
+    with profile_panel:
+        username = st.text_input("Enter your name:", value=st.session_state.user_profile.get("username", "Guest"))
+
+        if st.button("Save Profile"):
+            profile = {**st.session_state.user_profile, "username": username}
+            if st.session_state.account_key.startswith(GUEST_PREFIX):
+                # A new account, identified by a secret token rather than the name; the guest conversation moves to it
+                guest_history = st.session_state.messages
+                token, key = create_account(storage, profile)
+                for message in guest_history.between(0, len(guest_history)):
+                    storage.append_message(key, message.role, message.content, message.created)
+                st.query_params["token"] = token
+                bind_history(key, profile)
+                st.success("Profile saved! Bookmark this page to come back to your profile and conversation; keep the link private.")
+            else:
+                # Queued for the background writer, so saving never waits on storage
+                storage.save_profile(st.session_state.account_key, profile)
+                st.session_state.user_profile = profile
+                st.success("Profile saved!")
 
 st.write(f"**Welcome, {st.session_state.user_profile['username']}!**")
 
@@ -687,3 +523,33 @@ st.markdown("""
     &copy; 2024 AI-Powered Multi-Religious Guidance. All rights reserved.
 </div>
 """, unsafe_allow_html=True)
+
+# ============================
+# Performance Debug Panel (Optional)
+# ============================
+
+# Function to render the waterfall of instrumented calls made during this rerun
+def display_debug_panel(trace, started):
+    total = max(time.perf_counter() - started, 1e-6)
+    st.markdown("### ⏱️ Performance Debug Panel ⏱️")
+    st.write(f"Rerun time: {total * 1000:.1f} ms, {len(trace)} instrumented calls")
+    tripped = {name: state for name, state in breaker.snapshot().items() if state["state"] != breaker.CLOSED}
+    if tripped:
+        st.write("Circuit breakers: " + ", ".join(f"{name} {state['state']}" for name, state in tripped.items()))
+    rows = []
+    for call in sorted(trace, key=lambda span: span.start):
+        offset = max(0.0, (call.start - started) / total * 100)
+        width = max(0.5, min(call.duration / total * 100, 100 - offset))
+        details = ", ".join(f"{key}={value}" for key, value in call.attrs.items() if value is not None)
+        rows.append(
+            f"<div style='display:flex;align-items:center;font-size:12px'>"
+            f"<div style='width:30%'>{call.name} ({call.duration * 1000:.1f} ms) {details}</div>"
+            f"<div style='width:70%'><div style='margin-left:{offset:.1f}%;width:{width:.1f}%;height:10px;background-color:#4CAF50'></div></div>"
+            f"</div>"
+        )
+    if rows:
+        st.markdown("".join(rows), unsafe_allow_html=True)
+
+if st.sidebar.checkbox("Show performance debug panel"):
+    display_debug_panel(rerun_trace, rerun_started)
+
@@ -0,0 +1,32 @@
+import pytest
+
+from benchmarks.stub_servers import StubUpstream
+from guidance import breaker, config
+from guidance.cache import shared_cache
+from guidance.response_cache import shared_response_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path):
+    """Keep every test's persistent and shared state out of the real ``.cache/``."""
+    config.configure(
+        shared_state_url=f"memory://{tmp_path}",
+        storage_url="sqlite:///" + str(tmp_path / "guidance.sqlite3"),
+        prayer_store_path=str(tmp_path / "prayer_of_the_day.sqlite3"),
+    )
+    shared_cache.clear()
+    shared_response_cache.clear()
+    with breaker._breakers_lock:
+        breaker._breakers.clear()
+    yield
+    shared_cache.clear()
+
+
+@pytest.fixture
+def stub():
+    """A running ``StubUpstream`` that the app's config points at."""
+    upstream = StubUpstream(token_delay=0).start()
+    config.configure(api_key="test-key", news_api_key="test-news-key",
+                     **{name.lower(): url for name, url in upstream.secrets().items()})
+    yield upstream
+    upstream.stop()
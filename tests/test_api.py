@@ -0,0 +1,52 @@
+import pytest
+import requests
+
+from benchmarks.api_bench import free_port, start_api
+from guidance import config
+from guidance.accounts import account_key
+from guidance.storage import open_storage
+
+
+@pytest.fixture
+def base_url(stub):
+    port = free_port()
+    server = start_api(port)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+
+
+def test_ask_with_an_account_token_extends_its_history(base_url):
+    import api
+
+    token = requests.post(f"{base_url}/v1/accounts", json={"username": "Ali"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for question in ("How do I forgive my brother?", "What is grace in daily life?"):
+        response = requests.post(f"{base_url}/v1/ask", json={"question": question}, headers=headers)
+        assert response.status_code == 200
+
+    key = account_key(token)
+    assert open_storage(config.get_config().storage_url).count_messages(key) == 4
+    # One builder per account, reused across requests
+    assert list(api._builders) == [key]
+
+
+def test_ask_rejects_names_and_unknown_tokens(base_url):
+    question = {"question": "How do I forgive my brother?"}
+
+    assert requests.post(f"{base_url}/v1/ask", json={**question, "username": "Ali"}).status_code == 400
+    response = requests.post(f"{base_url}/v1/ask", json=question, headers={"Authorization": "Bearer " + "x" * 32})
+    assert response.status_code == 401
+    assert requests.post(f"{base_url}/v1/ask", json=question).status_code == 200
+
+
+@pytest.mark.parametrize("session_id", [["a"], {"id": 1}, 7, "", "x" * 101])
+def test_ask_rejects_malformed_session_ids(base_url, session_id):
+    response = requests.post(f"{base_url}/v1/ask", json={"question": "What is grace?", "session_id": session_id})
+
+    assert response.status_code == 400
+
+
+def test_ask_accepts_a_session_id(base_url):
+    response = requests.post(f"{base_url}/v1/ask", json={"question": "What is grace?", "session_id": "client-1"})
+
+    assert response.status_code == 200
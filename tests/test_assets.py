@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import re
+
+from guidance import assets
+from guidance.assets import ImmutableAssetsMiddleware, StaticAssets, build_assets, minify_css, minify_js
+
+CSS = """/* theme */
+body {
+    color: #333;
+    margin: 0 ;
+}
+"""
+JS = """// theme toggles
+function toggle() {
+    // flip the class
+    document.body.classList.toggle("dark");
+}
+"""
+
+
+def sources(tmp_path, css=CSS):
+    source_dir = tmp_path / "assets"
+    source_dir.mkdir(exist_ok=True)
+    (source_dir / "theme.css").write_text(css, encoding="utf-8")
+    (source_dir / "theme.js").write_text(JS, encoding="utf-8")
+    (source_dir / "README.txt").write_text("not an asset", encoding="utf-8")
+    return str(source_dir)
+
+
+def test_minifiers_drop_comments_and_whitespace():
+    assert minify_css(CSS) == "body{color:#333;margin:0}"
+    assert minify_js(JS) == 'function toggle() {\ndocument.body.classList.toggle("dark");\n}'
+
+
+def test_build_writes_content_hashed_minified_files(tmp_path):
+    static_dir = str(tmp_path / "static")
+    manifest = build_assets(sources(tmp_path), static_dir)
+
+    assert set(manifest) == {"theme.css", "theme.js"}
+    assert re.fullmatch(r"theme\.[0-9a-f]{12}\.css", manifest["theme.css"])
+    with open(os.path.join(static_dir, "assets", manifest["theme.css"]), encoding="utf-8") as built:
+        assert built.read() == "body{color:#333;margin:0}"
+    with open(os.path.join(static_dir, "assets", "manifest.json"), encoding="utf-8") as manifest_file:
+        assert json.load(manifest_file) == manifest
+
+
+def test_names_change_only_with_content_and_old_files_are_pruned_later(tmp_path, monkeypatch):
+    static_dir = str(tmp_path / "static")
+    first = build_assets(sources(tmp_path), static_dir)
+    assert build_assets(sources(tmp_path), static_dir) == first
+
+    second = build_assets(sources(tmp_path, CSS.replace("#333", "#444")), static_dir)
+    assert second["theme.css"] != first["theme.css"] and second["theme.js"] == first["theme.js"]
+    # Pages still open may ask for the old file for a while
+    old_path = os.path.join(static_dir, "assets", first["theme.css"])
+    assert os.path.exists(old_path)
+
+    monkeypatch.setattr(assets, "STALE_ASSET_AGE", -1)
+    build_assets(sources(tmp_path, CSS.replace("#333", "#444")), static_dir)
+    assert not os.path.exists(old_path)
+
+
+def test_static_assets_urls_and_inline_text(tmp_path):
+    static = StaticAssets(sources(tmp_path), str(tmp_path / "static"), "app/static/")
+
+    assert static.url("theme.css") == f"app/static/assets/{static.manifest['theme.css']}"
+    assert static.url("missing.css") is None
+    assert static.text("theme.css") == "body{color:#333;margin:0}"
+
+
+def serve(path, status=200):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": [(b"cache-control", b"no-cache")]})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(ImmutableAssetsMiddleware(app)({"type": "http", "path": path}, None, send))
+    return dict(sent[0]["headers"])[b"cache-control"]
+
+
+def test_only_hashed_assets_and_media_are_immutable():
+    immutable = f"public, max-age={assets.IMMUTABLE_MAX_AGE}, immutable".encode()
+
+    assert serve("/app/static/assets/theme.0123456789ab.css") == immutable
+    assert serve("/base/app/static/media/abc.m4a", status=206) == immutable
+    assert serve("/app/static/other.png") == b"no-cache"
+    assert serve("/") == b"no-cache"
+    assert serve("/app/static/assets/missing.css", status=404) == b"no-cache"
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+import requests
+
+from guidance import metrics
+from guidance.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, get_breaker
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record(False)
+
+
+def test_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker("news.test", failure_threshold=3, cooldown=60)
+    fail(breaker, 2)
+    breaker.record(True)
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_admits_one_probe_and_closes_on_success():
+    breaker = CircuitBreaker("verse.test", failure_threshold=1, cooldown=0.1)
+    fail(breaker, 1)
+    time.sleep(0.15)
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(True)
+    assert breaker.snapshot() == {"state": CLOSED, "failures": 0}
+
+
+def test_failed_probe_reopens_for_a_new_cooldown():
+    breaker = CircuitBreaker("music.test", failure_threshold=1, cooldown=0.1)
+    fail(breaker, 1)
+    time.sleep(0.15)
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_neutral_outcomes_do_not_count():
+    breaker = CircuitBreaker("chat.test", failure_threshold=2, cooldown=60)
+    fail(breaker, 1)
+    for _ in range(5):
+        breaker.before_call()
+        breaker.record(None)
+
+    assert breaker.snapshot() == {"state": CLOSED, "failures": 1}
+
+
+def test_open_error_is_a_connection_error_and_state_is_exported():
+    breaker = get_breaker("down.test")
+    assert get_breaker("down.test") is breaker
+    fail(breaker, breaker.failure_threshold)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        breaker.before_call()
+    assert 'app_circuit_state{upstream="down.test"} 2' in metrics.registry.prometheus_text()
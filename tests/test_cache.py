@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from guidance.cache import TTLCache, cached
+
+
+def test_entries_go_stale_then_expire():
+    cache = TTLCache()
+    cache.set("k", "v", ttl=10, stale_ttl=5, now=100)
+
+    assert cache.get("k", now=105) == (True, "v", True)
+    assert cache.get("k", now=112) == (True, "v", False)
+    assert cache.get("k", now=115) == (False, None, False)
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("b")[0] is False
+    assert cache.get("a")[1] == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stale_value_is_served_while_one_refresh_runs():
+    calls = []
+
+    @cached("test", ttl=0.1, stale_ttl=60, cache=TTLCache())
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return len(calls)
+
+    assert fetch() == 1
+    time.sleep(0.15)
+    started = time.monotonic()
+    # Both reads get the stale value at once; only one refresh is started
+    assert [fetch(), fetch()] == [1, 1]
+    assert time.monotonic() - started < 0.05
+    time.sleep(0.2)
+    assert fetch() == 2
+    assert len(calls) == 2
+
+
+def test_failures_are_cached_only_with_a_negative_ttl():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError("upstream down")
+
+    retried = cached("retried", ttl=60, cache=TTLCache())(failing)
+    remembered = cached("remembered", ttl=60, cache=TTLCache(), negative_ttl=0.1)(failing)
+
+    for func in (retried, retried):
+        with pytest.raises(RuntimeError):
+            func()
+    assert len(calls) == 2
+
+    for func in (remembered, remembered):
+        with pytest.raises(RuntimeError):
+            func()
+    assert len(calls) == 3
+    time.sleep(0.15)
+    with pytest.raises(RuntimeError):
+        remembered()
+    assert len(calls) == 4
+
+
+def test_concurrent_misses_share_one_fetch():
+    calls = []
+
+    @cached("test", ttl=60)
+    def fetch(key):
+        calls.append(key)
+        time.sleep(0.2)
+        return key.upper()
+
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(fetch("news"))) for _ in range(5)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert results == ["NEWS"] * 5
+    assert calls == ["news"]
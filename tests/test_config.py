@@ -0,0 +1,71 @@
+import pytest
+
+from guidance import config
+from guidance.config import Config, configure, load_config
+
+
+class MissingSecrets:
+    """Behaves like ``st.secrets`` without a secrets.toml."""
+
+    def get(self, name, default=None):
+        raise FileNotFoundError("No secrets found")
+
+
+def test_environment_beats_secrets_beats_defaults():
+    loaded = load_config(
+        secrets={"API_KEY": "from-secrets", "NEWS_API_KEY": "news-from-secrets"},
+        environ={"API_KEY": "from-env"},
+    )
+
+    assert loaded.api_key == "from-env"
+    assert loaded.news_api_key == "news-from-secrets"
+    assert loaded.api_url == Config.api_url
+    assert loaded.default_location == "Mecca"
+
+
+def test_empty_environment_values_fall_through_to_secrets():
+    loaded = load_config(secrets={"API_KEY": "from-secrets", "API_URL": ""}, environ={"API_KEY": ""})
+
+    assert loaded.api_key == "from-secrets"
+    assert loaded.api_url == Config.api_url
+
+
+def test_values_are_coerced_to_the_field_type():
+    loaded = load_config(secrets={"METRICS_PORT": "9100"}, environ={"API_KEY": 12345})
+
+    assert loaded.metrics_port == 9100
+    assert loaded.api_key == "12345"
+    assert load_config(secrets={}, environ={}).metrics_port is None
+    with pytest.raises(ValueError):
+        load_config(secrets={}, environ={"METRICS_PORT": "not-a-port"})
+
+
+def test_missing_streamlit_secrets_are_tolerated():
+    loaded = load_config(secrets=MissingSecrets(), environ={"API_KEY": "from-env"})
+
+    assert loaded.api_key == "from-env"
+    assert loaded.news_api_key is None
+
+
+def test_secrets_file_is_read_when_no_mapping_is_given(tmp_path, monkeypatch):
+    secrets_path = tmp_path / "secrets.toml"
+    secrets_path.write_text('NEWS_API_KEY = "from-file"\nMETRICS_PORT = 9200\n', encoding="utf-8")
+    monkeypatch.setattr(config, "SECRETS_PATH", str(secrets_path))
+
+    loaded = load_config(environ={})
+    assert loaded.news_api_key == "from-file"
+    assert loaded.metrics_port == 9200
+
+    monkeypatch.setattr(config, "SECRETS_PATH", str(tmp_path / "missing.toml"))
+    assert load_config(environ={}) == Config()
+
+
+def test_configure_ignores_none_overrides(monkeypatch):
+    # Put the process-wide config back afterwards
+    monkeypatch.setattr(config, "_config", config.get_config())
+    configure(api_key="first")
+    updated = configure(api_key=None, default_location="Rome")
+
+    assert updated.api_key == "first"
+    assert updated.default_location == "Rome"
+    assert config.get_config() is updated
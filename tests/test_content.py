@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+from guidance import content
+from guidance.content import ContentStore, get_store
+
+DATA = {
+    "version": 1,
+    "defaults": {"quote": "Be still."},
+    "religions": {"Islam": {"quote": "Patience is light."}, "Buddhism": {}},
+    "languages": {"Spanish": {"Islam": {"quote": "La paciencia es luz."}}},
+}
+
+
+def write(path, data, mtime):
+    path.write_text(json.dumps(data) if isinstance(data, dict) else data, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    # Check the file on every read
+    monkeypatch.setattr(content, "RELOAD_CHECK_INTERVAL", 0.0)
+    path = tmp_path / "content.json"
+    write(path, DATA, 1_000_000)
+    return path
+
+
+def test_lookups_fall_back_from_language_to_religion_to_defaults(path):
+    store = ContentStore(str(path))
+
+    assert store.get("Islam", "quote", "Spanish") == "La paciencia es luz."
+    assert store.get("Islam", "quote", "French") == "Patience is light."
+    assert store.get("Buddhism", "quote") == "Be still."
+    assert store.get("Buddhism", "video", default="none") == "none"
+    assert store.index.religions() == ("Islam", "Buddhism")
+
+
+def test_content_is_read_only(path):
+    index = ContentStore(str(path)).index
+
+    with pytest.raises(TypeError):
+        index._religions["Islam"]["quote"] = "changed"
+
+
+def test_changed_files_are_reloaded(path):
+    store = ContentStore(str(path))
+    assert store.get("Islam", "quote") == "Patience is light."
+
+    write(path, {**DATA, "version": 2, "religions": {"Islam": {"quote": "Updated."}}}, 1_000_100)
+
+    assert store.get("Islam", "quote") == "Updated."
+    assert store.index.version == 2
+
+
+def test_a_bad_or_missing_file_keeps_the_last_good_version(path):
+    store = ContentStore(str(path))
+    assert store.get("Islam", "quote") == "Patience is light."
+
+    write(path, '{"version": 2, "religions": {', 1_000_100)
+    assert store.get("Islam", "quote") == "Patience is light."
+    os.remove(path)
+    assert store.get("Islam", "quote") == "Patience is light."
+
+
+def test_a_missing_file_on_first_load_raises(tmp_path):
+    with pytest.raises(OSError):
+        ContentStore(str(tmp_path / "missing.json")).get("Islam", "quote")
+
+
+def test_stores_are_shared_per_path(path):
+    assert get_store(str(path)) is get_store(str(path.parent / "." / path.name))
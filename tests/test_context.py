@@ -0,0 +1,70 @@
+from guidance.context import (
+    DEFAULT_PROMPT_TOKEN_BUDGET, MAX_RECENT_MESSAGES, ContextBuilder, estimate_tokens, message_tokens, summarize_message,
+)
+from guidance.history import ChatHistory
+
+
+def conversation(turns, words=10):
+    history = ChatHistory(maxlen=1000)
+    for index in range(turns):
+        role = "user" if index % 2 == 0 else "assistant"
+        history.append(role, f"Turn {index} says something. " + "word " * words)
+    return history
+
+
+def prompt_tokens(messages):
+    return sum(message_tokens(message["content"]) for message in messages)
+
+
+def test_short_conversations_are_sent_verbatim():
+    history = conversation(4)
+
+    messages = ContextBuilder().build(history, "Be kind.", "And then?", "gpt-4o")
+
+    assert [message["content"] for message in messages[1:-1]] == [message.content for message in history]
+    assert messages[0] == {"role": "system", "content": "Be kind."}
+    assert messages[-1] == {"role": "user", "content": "And then?"}
+
+
+def test_recent_turns_are_capped_and_older_ones_summarized():
+    history = conversation(MAX_RECENT_MESSAGES + 6)
+    builder = ContextBuilder()
+
+    messages = builder.build(history, "Be kind.", "And then?", "gpt-4o")
+
+    assert len(messages) == MAX_RECENT_MESSAGES + 2
+    assert builder.summarized_upto == 6
+    assert "User: Turn 0 says something." in messages[0]["content"]
+    assert "Turn 6 says something." not in messages[0]["content"]
+
+
+def test_prompt_stays_within_the_model_budget():
+    history = conversation(MAX_RECENT_MESSAGES, words=200)
+    builder = ContextBuilder()
+
+    messages = builder.build(history, "Be kind.", "And then?", "unknown-model")
+
+    assert prompt_tokens(messages) <= DEFAULT_PROMPT_TOKEN_BUDGET
+    assert len(messages) < MAX_RECENT_MESSAGES + 2
+    assert builder.summarized_upto > 0
+
+
+def test_summary_keeps_to_its_budget_and_only_folds_new_turns():
+    builder = ContextBuilder(summary_budget=40)
+    history = conversation(MAX_RECENT_MESSAGES + 10)
+    builder.build(history, "Be kind.", "Next?", "gpt-4o")
+    folded = builder.summarized_upto
+
+    history.append("user", "One more.")
+    builder.build(history, "Be kind.", "Next?", "gpt-4o")
+
+    assert builder.summarized_upto == folded + 1
+    assert estimate_tokens(builder.summary) <= 40
+    # The oldest lines are the ones forgotten
+    assert builder.summary_lines[-1].startswith("User: Turn 10 ")
+
+
+def test_summary_lines_are_first_sentences():
+    assert summarize_message("user", "What is grace? Tell me more.") == "User: What is grace?"
+    line = summarize_message("assistant", "x" * 500)
+    assert line.startswith("Assistant: ") and line.endswith("...") and len(line) < 200
@@ -0,0 +1,89 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from guidance.daily_store import DailyStore
+
+DAY = datetime.date(2026, 10, 18)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DailyStore(str(tmp_path / "daily.sqlite3"))
+
+
+def test_concurrent_callers_generate_once(store):
+    calls = []
+
+    def generate(key):
+        calls.append(key)
+        time.sleep(0.2)
+        return f"prayer for {key[0]}"
+
+    results = []
+    workers = [
+        threading.Thread(target=lambda: results.append(store.get_or_create(("Islam", "English"), generate, DAY)))
+        for _ in range(5)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert results == ["prayer for Islam"] * 5
+    assert calls == [("Islam", "English")]
+    assert store.get(("Islam", "English"), DAY) == "prayer for Islam"
+
+
+def test_failures_are_not_stored(store):
+    def fail(key):
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        store.get_or_create(("Islam", "English"), fail, DAY)
+
+    assert store.get(("Islam", "English"), DAY) is None
+    assert store.get_or_create(("Islam", "English"), lambda key: "recovered", DAY) == "recovered"
+
+
+def test_values_belong_to_their_day(store):
+    store.get_or_create(("Islam", "English"), lambda key: "yesterday", DAY - datetime.timedelta(days=1))
+
+    assert store.get_or_create(("Islam", "English"), lambda key: "today", DAY) == "today"
+    # Earlier days are dropped once a newer one is written
+    assert store.get(("Islam", "English"), DAY - datetime.timedelta(days=1)) is None
+
+
+def test_precompute_runs_once_per_day_per_batch(store, tmp_path):
+    calls = []
+
+    def generate(key):
+        calls.append(key)
+        return "prayer"
+
+    def settle():
+        # Background generation is done once the call count stops changing
+        count = -1
+        while count != len(calls):
+            count = len(calls)
+            time.sleep(0.1)
+
+    english = [("Islam", "English"), ("Hinduism", "English")]
+    store.precompute(english, generate, DAY)
+    settle()
+    assert sorted(calls) == sorted(english)
+
+    # The same batch is not started again, here or in another process sharing the state
+    other = DailyStore(str(tmp_path / "other" / "daily.sqlite3"))
+    for instance in (store, other):
+        instance.precompute(english, generate, DAY)
+    settle()
+    assert len(calls) == 2
+
+    # Another language is a new batch, and the next day starts afresh
+    store.precompute([("Islam", "French")], generate, DAY)
+    store.precompute([("Islam", "French")], generate, DAY + datetime.timedelta(days=1))
+    settle()
+    assert calls[2:] == [("Islam", "French")] * 2
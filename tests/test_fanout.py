@@ -0,0 +1,29 @@
+import time
+
+from guidance.fanout import fetch_concurrently
+
+
+def test_sources_run_concurrently_within_their_deadlines():
+    def slow(value):
+        return lambda: (time.sleep(0.3), value)[1]
+
+    started = time.monotonic()
+    results = fetch_concurrently({"news": (slow("news"), None, 2.0), "music": (slow("music"), None, 2.0)})
+
+    assert results == {"news": "news", "music": "music"}
+    assert time.monotonic() - started < 0.55
+
+
+def test_late_and_failing_sources_fall_back_and_are_reported():
+    def fail():
+        raise RuntimeError("upstream down")
+
+    fell_back = set()
+    results = fetch_concurrently({
+        "late": (lambda: time.sleep(0.5), "late fallback", 0.05),
+        "failing": (fail, "failing fallback", 1.0),
+        "ok": (lambda: "ok", "ok fallback", 1.0),
+    }, fell_back)
+
+    assert results == {"late": "late fallback", "failing": "failing fallback", "ok": "ok"}
+    assert fell_back == {"late", "failing"}
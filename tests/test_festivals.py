@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+
+from guidance.festivals import FestivalCalendar, easter, get_festival_calendar, hebrew_to_date
+
+
+@pytest.mark.parametrize("year, expected", [(2000, (4, 23)), (2024, (3, 31)), (2025, (4, 20)), (2027, (3, 28))])
+def test_western_easter(year, expected):
+    assert easter(year) == datetime.date(year, *expected)
+
+
+def test_hebrew_dates():
+    # 1 Tishrei 5787 and 15 Nisan 5786
+    assert hebrew_to_date(5787, 7, 1) == datetime.date(2026, 9, 12)
+    assert hebrew_to_date(5786, 1, 15) == datetime.date(2026, 4, 2)
+
+
+@pytest.mark.parametrize("religion, name, expected", [
+    ("Christianity", "Ash Wednesday", datetime.date(2026, 2, 18)),
+    ("Judaism", "Yom Kippur", datetime.date(2026, 9, 21)),
+    ("Islam", "Ramadan begins", datetime.date(2026, 2, 18)),
+    ("Islam", "Eid al-Fitr", datetime.date(2026, 3, 20)),
+    ("Islam", "Eid al-Adha", datetime.date(2026, 5, 27)),
+    ("Hinduism", "Holi", datetime.date(2026, 3, 4)),
+    ("Hinduism", "Diwali", datetime.date(2026, 11, 8)),
+    ("Taoism", "Chinese New Year", datetime.date(2026, 2, 17)),
+    ("Taoism", "Mid-Autumn Festival", datetime.date(2026, 9, 25)),
+    ("Baha'i", "Naw-Ruz", datetime.date(2026, 3, 21)),
+])
+def test_festival_rules_match_published_dates(religion, name, expected):
+    assert dict((event_name, day) for day, event_name in get_festival_calendar().year(2026)[religion])[name] == expected
+
+
+def test_upcoming_spans_the_new_year_in_order():
+    events = get_festival_calendar().upcoming("Christianity", today=datetime.date(2025, 12, 1), days=60)
+
+    assert events == [(datetime.date(2025, 12, 25), "Christmas"), (datetime.date(2026, 1, 6), "Epiphany")]
+
+
+def test_years_are_cached_up_to_a_bound():
+    calendar = FestivalCalendar({"Christianity": [{"name": "Christmas", "rule": "fixed", "month": 12, "day": 25}]}, max_years=2)
+
+    first = calendar.year(2026)
+    assert calendar.year(2026) is first
+    calendar.year(2027)
+    calendar.year(2028)
+    assert calendar.year(2026) is not first
+    assert calendar.year(2026) == first
+
+
+def test_unknown_rules_are_rejected():
+    with pytest.raises(ValueError):
+        FestivalCalendar({"Test": [{"name": "Unknown", "rule": "weekly"}]}).year(2026)
@@ -0,0 +1,45 @@
+from guidance.history import ChatHistory
+from guidance.storage import SQLiteBackend, WriteBehindStore
+
+
+def test_ring_buffer_spills_and_pages(tmp_path):
+    history = ChatHistory(maxlen=3, spill_path=str(tmp_path / "spill.jsonl"))
+    for index in range(7):
+        history.append("user", f"message {index}")
+
+    assert len(history) == 7
+    assert [message.content for message in history] == ["message 4", "message 5", "message 6"]
+    assert [message.content for message in history.between(1, 5)] == [f"message {index}" for index in range(1, 5)]
+    assert history.page_count(3) == 3
+    assert [message.content for message in history.page(2, 3)] == ["message 0"]
+
+
+def test_store_view_positions_are_shared_by_sessions(tmp_path):
+    store = WriteBehindStore(SQLiteBackend(str(tmp_path / "guidance.sqlite3")))
+    first = ChatHistory(maxlen=2, store=store, username="account:a")
+    first.append("user", "one")
+    # A second session (another tab) of the same account
+    second = ChatHistory(maxlen=2, store=store, username="account:a")
+    second.append("assistant", "two")
+    first.append("user", "three")
+    store.flush()
+    second.append("assistant", "four")
+
+    for history in (first, second):
+        assert len(history) == 4
+        assert [message.content for message in history.between(0, 4)] == ["one", "two", "three", "four"]
+        assert [message.content for message in history.recent(2)] == ["three", "four"]
+    assert len(ChatHistory(store=store, username="account:b")) == 0
+    store.close()
+
+
+def test_clear_hides_stored_history_from_this_view(tmp_path):
+    store = WriteBehindStore(SQLiteBackend(str(tmp_path / "guidance.sqlite3")))
+    history = ChatHistory(store=store, username="account:a")
+    history.append("user", "old")
+    history.clear()
+    history.append("user", "new")
+
+    assert [message.content for message in history.between(0, len(history))] == ["new"]
+    assert len(ChatHistory(store=store, username="account:a")) == 2
+    store.close()
@@ -0,0 +1,71 @@
+import pytest
+import requests
+
+from guidance import http_client
+from guidance.breaker import OPEN, get_breaker
+
+
+class RecordingSession:
+    """Answers every request with ``status`` and remembers the keyword arguments."""
+
+    def __init__(self, status):
+        self.status = status
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(kwargs)
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = b"{}"
+        return response
+
+
+def test_default_timeouts_apply_unless_given(monkeypatch):
+    session = RecordingSession(200)
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+
+    http_client.get("https://example.test/a")
+    http_client.get("https://example.test/b", timeout=1)
+
+    assert session.calls[0]["timeout"] == (http_client.CONNECT_TIMEOUT, http_client.READ_TIMEOUT)
+    assert session.calls[1]["timeout"] == 1
+
+
+def test_slow_responses_time_out_and_count_against_the_host(stub, monkeypatch):
+    monkeypatch.setattr(http_client, "READ_TIMEOUT", 0.2)
+    stub.latency["news"] = 1.0
+
+    with pytest.raises(requests.exceptions.Timeout):
+        http_client.get(f"{stub.base_url}/news")
+
+    assert get_breaker("127.0.0.1").failures == 1
+
+
+def test_server_errors_open_the_breaker_and_successes_reset_it(stub):
+    breaker = get_breaker("127.0.0.1")
+    stub.failure_rate["news"] = 1.0
+    for _ in range(breaker.failure_threshold - 1):
+        assert http_client.get(f"{stub.base_url}/news").status_code == 503
+    stub.failure_rate["news"] = 0.0
+    # Client errors are the caller's fault, not the host's
+    assert http_client.get(f"{stub.base_url}/missing").status_code == 404
+    assert breaker.failures == 0
+
+    stub.failure_rate["news"] = 1.0
+    for _ in range(breaker.failure_threshold):
+        http_client.get(f"{stub.base_url}/news")
+    assert breaker.state == OPEN
+    calls = stub.counts["news"]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.get(f"{stub.base_url}/news")
+    assert stub.counts["news"] == calls
+
+
+def test_rate_limiting_does_not_count_against_the_host(monkeypatch):
+    monkeypatch.setattr(http_client, "get_session", lambda: RecordingSession(429))
+    breaker = get_breaker("example.test")
+
+    for _ in range(breaker.failure_threshold + 1):
+        assert http_client.get("https://example.test/").status_code == 429
+
+    assert breaker.snapshot() == {"state": "closed", "failures": 0}
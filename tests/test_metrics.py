@@ -0,0 +1,43 @@
+from guidance.metrics import Registry
+
+
+def test_prometheus_text_with_mixed_label_types():
+    registry = Registry()
+    registry.inc("app_completion_retries_total", status=429)
+    registry.inc("app_completion_retries_total", status="connection")
+    registry.inc("app_completion_retries_total", status=503)
+    registry.set_gauge("app_queue", 1, shard=2)
+    registry.set_gauge("app_queue", 3, shard="b")
+    registry.observe("app_call_duration_seconds", 0.2, call=1)
+    registry.observe("app_call_duration_seconds", 0.3, call="news")
+
+    text = registry.prometheus_text()
+
+    assert 'app_completion_retries_total{status="429"} 1' in text
+    assert 'app_completion_retries_total{status="connection"} 1' in text
+    assert 'app_queue{shard="b"} 3' in text
+    assert 'app_call_duration_seconds_count{call="1"} 1' in text
+
+
+def test_int_and_str_label_values_share_a_series():
+    registry = Registry()
+    registry.inc("app_completion_retries_total", status=429)
+    registry.inc("app_completion_retries_total", status="429")
+
+    assert 'app_completion_retries_total{status="429"} 2' in registry.prometheus_text()
+
+
+def test_span_records_calls_and_cache_lookups():
+    registry = Registry()
+
+    class Finished:
+        name = "news"
+        duration = 0.05
+        attrs = {"status": 200, "cache": "hit", "bytes": 120}
+
+    registry.record_span(Finished())
+
+    text = registry.prometheus_text()
+    assert 'app_calls_total{call="news",status="200"} 1' in text
+    assert 'app_cache_lookups_total{call="news",result="hit"} 1' in text
+    assert 'app_call_bytes_total{call="news"} 120' in text
@@ -0,0 +1,65 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from guidance.locations import Location, get_locations
+from guidance.prayer_times import PRAYER_NAMES, PrayerTimesTable, format_time, grid_cell
+
+
+def minutes(hours):
+    return hours * 60
+
+
+def test_times_match_published_sunrise_and_sunset():
+    times = dict(PrayerTimesTable().day(get_locations()["Mecca"], datetime.date(2026, 6, 21)))
+
+    assert list(times) == list(PRAYER_NAMES)
+    assert minutes(times["Sunrise"]) == pytest.approx(5 * 60 + 39, abs=2)
+    assert minutes(times["Maghrib"]) == pytest.approx(19 * 60 + 6, abs=2)
+    assert times["Fajr"] < times["Sunrise"] < times["Dhuhr"] < times["Asr"] < times["Maghrib"] < times["Isha"]
+
+
+def test_methods_change_the_angles_and_asr():
+    day = datetime.date(2026, 3, 20)
+    mwl = dict(PrayerTimesTable().day(Location("Karachi", 24.86, 67.0, "Asia/Karachi", "MWL"), day))
+    hanafi = dict(PrayerTimesTable().day(Location("Karachi", 24.86, 67.0, "Asia/Karachi", "Hanafi"), day))
+
+    assert hanafi["Asr"] > mwl["Asr"] + 0.5
+    # Karachi angles put Isha later than the Muslim World League's 17 degrees
+    assert hanafi["Isha"] > mwl["Isha"]
+    assert hanafi["Dhuhr"] == mwl["Dhuhr"]
+
+
+def test_daylight_saving_shifts_local_times():
+    london = Location("London", 51.5, -0.13, "Europe/London", "MWL")
+    table = PrayerTimesTable()
+    winter = dict(table.day(london, datetime.date(2026, 1, 15)))
+    summer = dict(table.day(london, datetime.date(2026, 7, 15)))
+
+    assert winter["Dhuhr"] == pytest.approx(12.2, abs=0.1)
+    assert summer["Dhuhr"] == pytest.approx(13.1, abs=0.1)
+
+
+def test_polar_day_omits_times_without_a_sunset():
+    times = dict(PrayerTimesTable().day(Location("Tromso", 69.65, 18.96, "Europe/Oslo", "MWL"), datetime.date(2026, 6, 21)))
+
+    assert "Sunrise" not in times and "Maghrib" not in times
+    assert "Dhuhr" in times
+
+
+def test_nearby_positions_share_one_cached_table():
+    table = PrayerTimesTable(max_tables=2)
+    first = table.year(21.42, 39.83, "Asia/Riyadh", 2026)
+
+    assert grid_cell(21.42, 39.83) == grid_cell(21.45, 39.8)
+    assert table.year(21.45, 39.8, "Asia/Riyadh", 2026) is first
+    assert first.shape == (365, len(PRAYER_NAMES))
+    assert not first.flags.writeable
+    assert not np.isnan(first).any()
+
+
+def test_format_time():
+    assert format_time(5.0) == "5:00 AM"
+    assert format_time(12.5) == "12:30 PM"
+    assert format_time(23.999) == "12:00 AM"
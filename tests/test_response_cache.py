@@ -0,0 +1,58 @@
+import time
+
+from guidance.response_cache import ResponseCache
+from guidance.shared_state import MemoryBackend, SharedState
+
+QUESTION = "How should I begin a daily prayer practice?"
+
+
+def test_exact_hits_ignore_case_and_punctuation():
+    cache = ResponseCache(similarity_threshold=0)
+    cache.store("gpt-4o", "Be kind.", QUESTION, "Start small.")
+
+    assert cache.lookup("gpt-4o", "Be kind.", "how should i begin a daily prayer practice") == "Start small."
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_near_duplicates_hit_only_above_the_threshold():
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.store("gpt-4o", "Be kind.", QUESTION, "Start small.")
+
+    # One letter apart: cosine similarity of about 0.93
+    assert cache.lookup("gpt-4o", "Be kind.", "How should I begin a daily prayer practise?") == "Start small."
+    assert cache.lookup("gpt-4o", "Be kind.", "How should I end a daily prayer practice?") is None
+    assert cache.stats()["similar_hits"] == 1
+
+    strict = ResponseCache(similarity_threshold=0.95)
+    strict.store("gpt-4o", "Be kind.", QUESTION, "Start small.")
+    assert strict.lookup("gpt-4o", "Be kind.", "How should I begin a daily prayer practise?") is None
+
+
+def test_answers_are_not_shared_across_models_or_system_prompts():
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.store("gpt-4o", "Be kind.", QUESTION, "Start small.")
+
+    assert cache.lookup("gpt-4", "Be kind.", QUESTION) is None
+    assert cache.lookup("gpt-4o", "You are a Buddhist teacher.", QUESTION) is None
+
+
+def test_entries_expire_and_the_oldest_are_evicted():
+    cache = ResponseCache(maxsize=2, ttl=0.1, similarity_threshold=0)
+    for index in range(3):
+        cache.store("gpt-4o", "", f"question {index}", f"answer {index}")
+
+    assert cache.lookup("gpt-4o", "", "question 0") is None
+    assert cache.lookup("gpt-4o", "", "question 2") == "answer 2"
+    time.sleep(0.15)
+    assert cache.lookup("gpt-4o", "", "question 2") is None
+    assert len(cache) == 1 and cache.stats()["evictions"] == 1
+
+
+def test_exact_answers_are_shared_between_caches():
+    state = SharedState(MemoryBackend())
+    first = ResponseCache(shared_state=lambda: state)
+    second = ResponseCache(shared_state=lambda: state)
+    first.store("gpt-4o", "Be kind.", QUESTION, "Start small.")
+
+    assert second.lookup("gpt-4o", "Be kind.", QUESTION) == "Start small."
+    assert second.stats()["shared_hits"] == 1
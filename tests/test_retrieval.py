@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from guidance import retrieval
+from guidance.retrieval import Retriever, RetrievalIndex, build_index, tokenize
+
+
+def write(corpus, name, text):
+    path = corpus / name
+    path.write_text(text, encoding="utf-8")
+    # Distinct signatures even within one filesystem timestamp tick
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def references(index, query, k=3):
+    return [passage.reference for passage in index.search(query, k)]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    directory = tmp_path / "corpus"
+    directory.mkdir()
+    return directory
+
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("The Blessings of the meek, and thy kindness") == ["blessing", "meek", "kindness"]
+
+
+def test_bm25_prefers_rarer_and_more_frequent_terms(corpus, tmp_path):
+    write(corpus, "sayings.txt", "## One\nmercy mercy mercy and peace\n\n## Two\nmercy and peace\n\n"
+                                 "## Three\npeace and peace and patience\n\n## Four\nwalk humbly")
+    build_index(str(corpus), str(tmp_path / "index"))
+    index = RetrievalIndex(str(tmp_path / "index"))
+
+    assert references(index, "mercy") == ["One", "Two"]
+    # "patience" is in one passage and "peace" in three, so the rarer term wins
+    assert references(index, "peace patience")[0] == "Three"
+    assert index.search("nothing matches") == []
+
+
+def test_builds_are_incremental(corpus, tmp_path):
+    index_dir = str(tmp_path / "index")
+    write(corpus, "a.txt", "## A\ngrace abounds")
+    assert build_index(str(corpus), index_dir)
+    assert not build_index(str(corpus), index_dir)
+
+    write(corpus, "b.txt", "## B\nhope endures")
+    assert build_index(str(corpus), index_dir)
+    index = RetrievalIndex(index_dir)
+
+    assert len(index.segments) == 2
+    assert references(index, "grace") == ["A"] and references(index, "hope") == ["B"]
+
+
+def test_changed_and_removed_files_are_tombstoned(corpus, tmp_path):
+    index_dir = str(tmp_path / "index")
+    write(corpus, "a.txt", "## Old\ngrace abounds")
+    write(corpus, "b.txt", "## Gone\nhope endures")
+    build_index(str(corpus), index_dir)
+
+    write(corpus, "a.txt", "## New\ngrace renewed")
+    os.remove(corpus / "b.txt")
+    build_index(str(corpus), index_dir)
+    index = RetrievalIndex(index_dir)
+
+    assert references(index, "grace") == ["New"]
+    assert index.search("hope") == []
+    assert index.documents == 1
+
+
+def test_merge_keeps_old_segments_for_readers_until_a_later_build(corpus, tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "MAX_SEGMENTS", 2)
+    monkeypatch.setattr(retrieval, "REFRESH_INTERVAL", 0.0)
+    index_dir = str(tmp_path / "index")
+    for name in ("a", "b"):
+        write(corpus, f"{name}.txt", f"## {name}\ncommon {name}word")
+        build_index(str(corpus), index_dir)
+    before = retrieval._read_manifest(index_dir)
+
+    write(corpus, "c.txt", "## c\ncommon cword")
+    build_index(str(corpus), index_dir)
+    merged = RetrievalIndex(index_dir)
+
+    assert len(merged.segments) == 1
+    assert sorted(references(merged, "common")) == ["a", "b", "c"]
+    # A process that read the manifest just before the merge can still open it
+    assert len(RetrievalIndex(index_dir, before).segments) == 2
+
+    build_index(str(corpus), index_dir)
+    assert not os.path.exists(os.path.join(index_dir, f"{before['segments'][0]}.vocab.json"))
+    assert len(RetrievalIndex(index_dir).segments) == 1
+
+
+def test_retriever_keeps_serving_when_a_load_fails(tmp_path, monkeypatch):
+    corpus = tmp_path / "corpus"
+    (corpus / "Christianity").mkdir(parents=True)
+    write(corpus / "Christianity", "a.txt", "## A\ngrace abounds")
+    retriever = Retriever(str(corpus), str(tmp_path / "index"))
+    assert [passage.reference for passage in retriever.search("Christianity", "grace")] == ["A"]
+
+    def broken(*args):
+        raise FileNotFoundError("segment removed")
+
+    monkeypatch.setattr(retrieval, "REFRESH_INTERVAL", 0.0)
+    monkeypatch.setattr(retrieval, "build_index", broken)
+    assert [passage.reference for passage in retriever.search("Christianity", "grace")] == ["A"]
+    assert retriever.search("Buddhism", "grace") == []
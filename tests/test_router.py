@@ -0,0 +1,48 @@
+import pytest
+
+from guidance.router import (
+    FAST_MODEL, LONG_ANSWER_TOKENS, MEDIUM_ANSWER_TOKENS, SHORT_ANSWER_TOKENS, STRONG_MODEL, route_question,
+)
+
+EVENTS = ["Diwali - November 1, 2024", "Holi - March 14, 2025"]
+PRAYER_TIMES = ["Fajr: 5:00 AM", "Maghrib: 6:30 PM"]
+
+
+@pytest.mark.parametrize("question, tier, model, max_tokens, reason", [
+    ("What is grace?", "fast", FAST_MODEL, SHORT_ANSWER_TOKENS, "short_factual"),
+    ("How should I begin a daily prayer practice?", "fast", FAST_MODEL, MEDIUM_ANSWER_TOKENS, "list"),
+    ("Tell me about forgiveness", "fast", FAST_MODEL, MEDIUM_ANSWER_TOKENS, "simple"),
+    ("Why does suffering exist?", "strong", STRONG_MODEL, LONG_ANSWER_TOKENS, "hard_cue"),
+    ("Compare grace in Christianity and Islam", "strong", STRONG_MODEL, LONG_ANSWER_TOKENS, "hard_cue"),
+    ("What is fasting? Who must fast?", "strong", STRONG_MODEL, LONG_ANSWER_TOKENS, "multi_part"),
+    ("Tell me " + "more and " * 25 + "more", "strong", STRONG_MODEL, LONG_ANSWER_TOKENS, "long"),
+])
+def test_model_tiers(question, tier, model, max_tokens, reason):
+    route = route_question(question, EVENTS, PRAYER_TIMES)
+
+    assert (route.tier, route.model, route.max_tokens, route.reason) == (tier, model, max_tokens, reason)
+    assert route.answer is None
+
+
+def test_event_dates_are_answered_from_content():
+    route = route_question("When is Diwali this year?", EVENTS, PRAYER_TIMES)
+
+    assert (route.tier, route.reason, route.model) == ("static", "event_date", None)
+    assert route.answer == "- Diwali - November 1, 2024"
+
+
+def test_upcoming_events_and_prayer_times_are_answered_from_content():
+    events = route_question("What are the upcoming festivals?", EVENTS, PRAYER_TIMES)
+    fajr = route_question("What time is Fajr?", EVENTS, PRAYER_TIMES)
+    times = route_question("Show me today's prayer times", EVENTS, PRAYER_TIMES)
+
+    assert events.reason == "event_list" and "Holi - March 14, 2025" in events.answer
+    assert (fajr.reason, fajr.answer) == ("prayer_time", "- Fajr: 5:00 AM")
+    assert times.reason == "prayer_times" and times.answer.count("\n- ") == 2
+
+
+def test_static_answers_need_content_and_permission():
+    assert route_question("When is Diwali?", [], PRAYER_TIMES).tier == "fast"
+    assert route_question("When is Diwali?", EVENTS, PRAYER_TIMES, allow_static=False).tier == "fast"
+    # Mentioning an event without asking when it is goes to a model
+    assert route_question("What is the meaning of Diwali?", EVENTS, PRAYER_TIMES).tier == "strong"
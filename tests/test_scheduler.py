@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from guidance.scheduler import CompletionScheduler, SchedulerBusy
+
+
+def scheduler(**overrides):
+    settings = {"max_in_flight": 1, "requests_per_minute": 0, "tokens_per_minute": 0, "max_queue_wait": 5.0}
+    return CompletionScheduler(**{**settings, **overrides})
+
+
+def queue(sched, order, label, **kwargs):
+    def run():
+        with sched.slot(label, **kwargs):
+            order.append(label)
+    worker = threading.Thread(target=run)
+    worker.start()
+    # Let the ticket join the queue before the next one
+    time.sleep(0.05)
+    return worker
+
+
+def test_sessions_are_served_round_robin():
+    sched = scheduler()
+    order = []
+    sched.acquire("holder")
+    workers = [queue(sched, order, label) for label in ("a", "a", "b")]
+    sched.release()
+    for worker in workers:
+        worker.join()
+
+    assert order == ["a", "b", "a"]
+
+
+def test_background_waits_for_every_foreground_request():
+    sched = scheduler()
+    order = []
+    sched.acquire("holder")
+    workers = [queue(sched, order, "precompute", background=True), queue(sched, order, "user")]
+    sched.release()
+    for worker in workers:
+        worker.join()
+
+    assert order == ["user", "precompute"]
+
+
+def test_background_concurrency_is_bounded():
+    sched = scheduler(max_in_flight=4, max_background_in_flight=1)
+    sched.acquire(background=True)
+    worker = queue(sched, [], "precompute", background=True)
+
+    assert sched.stats()["background_waiting"] == 1
+    # Foreground requests still get the free slots
+    sched.acquire("user")
+    sched.release()
+    sched.release(background=True)
+    worker.join()
+    assert sched.stats()["background_in_flight"] == 0
+
+
+def test_background_gives_up_its_slot_without_spare_quota():
+    sched = scheduler(requests_per_minute=60, max_queue_wait=0.3)
+    # Foreground requests drain the bucket and leave it in debt
+    for _ in range(12):
+        sched.request_bucket.reserve()
+
+    started = time.monotonic()
+    with pytest.raises(SchedulerBusy):
+        with sched.slot(background=True):
+            sched.call(lambda: None, background=True)
+
+    assert time.monotonic() - started < 1.0
+    assert sched.stats()["in_flight"] == 0
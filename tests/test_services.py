@@ -0,0 +1,113 @@
+import json
+
+from guidance import config, metrics, services
+from guidance.cache import shared_cache
+from guidance.context import ContextBuilder
+from guidance.history import ChatHistory
+
+
+def test_daily_verse_comes_from_the_upstream(stub):
+    assert services.get_daily_verse("Christianity", "English") == "The Lord is my shepherd; I shall not want."
+    assert services.get_daily_verse("Christianity", "English") == "The Lord is my shepherd; I shall not want."
+    assert stub.counts["verse"] == 1
+
+
+def test_daily_verse_error_is_not_cached_as_a_verse(stub):
+    stub.failure_rate["verse"] = 1.0
+    fallback = services.content_store().get(None, "daily_verse")
+
+    assert services.get_daily_verse("Christianity", "English") == fallback
+    # Failures are negatively cached, so the upstream is not asked again at once
+    assert services.get_daily_verse("Christianity", "English") == fallback
+    assert stub.counts["verse"] == 1
+
+    # Once the negative entry is gone, the recovered upstream is asked again
+    stub.failure_rate["verse"] = 0.0
+    shared_cache.clear()
+    assert services.get_daily_verse("Christianity", "English") == "The Lord is my shepherd; I shall not want."
+    assert stub.counts["verse"] == 2
+
+
+def test_daily_verse_without_verse_text_falls_back(stub):
+    # A 200 response with some other body, e.g. an error page in JSON
+    config.configure(bible_api_url=f"{stub.base_url}/news")
+    fallback = services.content_store().get(None, "daily_verse")
+
+    assert services.get_daily_verse("Christianity", "English") == fallback
+    # Nothing was cached or shared as a verse
+    config.configure(bible_api_url=f"{stub.base_url}/verse")
+    shared_cache.clear()
+    assert services.get_daily_verse("Christianity", "English") == "The Lord is my shepherd; I shall not want."
+
+
+def test_news_falls_back_when_the_upstream_fails(stub):
+    stub.failure_rate["news"] = 1.0
+    assert services.get_religious_news("Islam") == ["Unable to fetch news at this time."]
+
+
+def ask(question, history, builder):
+    route, messages = services.prepare_answer(question, "Christianity", "English", history, builder)
+    answer = "".join(services.stream_answer(route, messages))
+    history.append("user", question)
+    history.append("assistant", answer)
+    return answer
+
+
+def test_self_contained_questions_hit_the_cache_in_later_turns(stub):
+    first_session = (ChatHistory(), ContextBuilder())
+    ask("How should I begin a daily prayer practice?", *first_session)
+    calls = stub.counts["chat"]
+
+    second_session = (ChatHistory(), ContextBuilder())
+    ask("What is grace in Christianity?", *second_session)
+    ask("How should I begin a daily prayer practice?", *second_session)
+    assert stub.counts["chat"] == calls + 1
+
+    # A follow-up depends on the turns before it, so it is never served from the cache
+    ask("Can you tell me more about that?", *second_session)
+    ask("Can you tell me more about that?", *first_session)
+    assert stub.counts["chat"] == calls + 3
+
+
+class FakeStream:
+    """Stands in for a streamed ``requests`` response."""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self, chunk_size=None, decode_unicode=False):
+        return iter(self.lines)
+
+
+def delta(content):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": content}}]})
+
+
+def test_deltas_are_yielded_until_done():
+    stream = FakeStream([": keep-alive", "", delta("Peace "), "event: ping", delta("be with you"), "data: [DONE]", delta("ignored")])
+
+    assert list(services.iter_stream_chunks(stream)) == ["Peace ", "be with you"]
+
+
+def test_malformed_data_lines_are_skipped():
+    stream = FakeStream([
+        "data: {not json",
+        "data: 42",
+        'data: ["a list"]',
+        'data: {"choices": []}',
+        'data: {"choices": [{"delta": {}}]}',
+        'data: {"choices": [{"delta": {"role": "assistant", "content": ""}}]}',
+        'data:{"choices": [{"delta": {"content": "no space"}}]}',
+    ])
+
+    assert list(services.iter_stream_chunks(stream)) == ["no space"]
+
+
+def test_usage_chunks_are_recorded_on_the_span():
+    usage = {"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 3}}
+    stream = FakeStream([delta("Amen"), "data: " + json.dumps(usage), "data: [DONE]"])
+
+    with metrics.span("test.stream") as span:
+        assert list(services.iter_stream_chunks(stream)) == ["Amen"]
+
+    assert span.attrs["prompt_tokens"] == 12 and span.attrs["completion_tokens"] == 3
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from guidance.shared_state import MemoryBackend, SharedState, SharedStateBackend, SharedTokenBucket, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    backend = MemoryBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "shared_state.sqlite3"))
+    yield SharedState(backend)
+    backend.close()
+
+
+def test_values_expire(state):
+    assert state.set("verse", {"text": "Be still"}, ttl=0.1)
+    assert state.get("verse") == {"text": "Be still"}
+    time.sleep(0.15)
+    assert state.get("verse") is None
+
+
+def test_claim_is_taken_once_per_ttl(state):
+    assert state.claim("precompute", ttl=0.1)
+    assert not state.claim("precompute", ttl=0.1)
+    time.sleep(0.15)
+    assert state.claim("precompute", ttl=0.1)
+
+
+def test_get_or_compute_runs_once_for_concurrent_callers(state):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(state.get_or_compute("q", compute, ttl=60))) for _ in range(5)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+
+
+def test_rejected_values_are_recomputed(state):
+    state.set("news", {"fallback": True}, ttl=60)
+
+    value = state.get_or_compute("news", lambda: {"fallback": False}, ttl=60, accept=lambda value: not value["fallback"])
+
+    assert value == {"fallback": False}
+    assert state.get("news") == {"fallback": False}
+
+
+def test_token_bucket_only_grants_spare_tokens(state):
+    bucket = SharedTokenBucket("quota", rate=1, capacity=2, state=state)
+
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    # A reservation goes into debt and reports the wait instead
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.1)
+
+
+def test_backends_must_implement_the_whole_interface():
+    class Partial(SharedStateBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from guidance.singleflight import SingleFlight
+
+
+def run_together(count, func):
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(func())) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def test_overlapping_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.2)
+        return "verse"
+
+    assert run_together(5, lambda: flights.do("key", call)) == ["verse"] * 5
+    assert len(calls) == 1
+    assert flights.in_flight() == 0
+
+
+def test_keys_are_forgotten_once_the_call_finishes():
+    flights = SingleFlight()
+    calls = []
+
+    flights.do("key", lambda: calls.append(1))
+    flights.do("key", lambda: calls.append(1))
+
+    assert len(calls) == 2
+
+
+def test_followers_get_the_leaders_exception():
+    flights = SingleFlight()
+    errors = []
+
+    def fail():
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    def call():
+        try:
+            flights.do("key", fail)
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    run_together(3, call)
+
+    assert len(errors) == 3 and len({id(error) for error in errors}) == 1
+    # The failure is not remembered: the next call runs again
+    with pytest.raises(RuntimeError):
+        flights.do("key", fail)
+
+
+def test_stream_subscribers_replay_every_chunk():
+    flights = SingleFlight()
+    opened = []
+
+    def open_stream(on_wait):
+        opened.append(1)
+        on_wait(2)
+        for chunk in ("Peace ", "be ", "with ", "you"):
+            time.sleep(0.05)
+            yield chunk
+
+    positions = []
+    results = run_together(3, lambda: "".join(flights.stream("key", open_stream, positions.append)))
+
+    assert results == ["Peace be with you"] * 3
+    assert len(opened) == 1
+    assert set(positions) <= {2}
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from guidance import storage
+from guidance.accounts import account_key, create_account, load_account
+from guidance.storage import SQLiteBackend, StorageBackend, WriteBehindStore
+
+
+def test_reads_include_queued_writes(tmp_path):
+    store = WriteBehindStore(SQLiteBackend(str(tmp_path / "guidance.sqlite3")), flush_interval=60)
+    store.append_message("account:a", "user", "stored", 1.0)
+    store.flush()
+    store.append_message("account:a", "assistant", "queued", 2.0)
+    store.save_profile("account:a", {"username": "Ali"})
+
+    assert store.count_messages("account:a") == 2
+    assert [row[1] for row in store.load_messages("account:a", 0, 2)] == ["stored", "queued"]
+    assert store.load_profile("account:a") == {"username": "Ali"}
+    store.close()
+
+
+class SlowCommitBackend(SQLiteBackend):
+    """Holds each message commit open, before or after its rows become visible, until released."""
+
+    def __init__(self, path, visible):
+        super().__init__(path)
+        self.visible = visible
+        self.committing = threading.Event()
+        self.release = threading.Event()
+
+    def append_messages(self, rows):
+        if self.visible:
+            super().append_messages(rows)
+        self.committing.set()
+        assert self.release.wait(10)
+        if not self.visible:
+            super().append_messages(rows)
+
+
+@pytest.mark.parametrize("visible", [False, True])
+def test_reads_do_not_wait_for_a_commit(tmp_path, visible):
+    backend = SlowCommitBackend(str(tmp_path / "guidance.sqlite3"), visible)
+    store = WriteBehindStore(backend, flush_interval=60)
+    store.save_profile("account:a", {"username": "Ali"})
+    store.append_message("account:a", "user", "in flight", 1.0)
+    flusher = threading.Thread(target=store.flush)
+    flusher.start()
+    assert backend.committing.wait(5)
+    store.append_message("account:a", "assistant", "queued", 2.0)
+
+    started = time.monotonic()
+    assert store.count_messages("account:a") == 2
+    assert [row[1] for row in store.load_messages("account:a", 0, 2)] == ["in flight", "queued"]
+    assert store.load_profile("account:a") == {"username": "Ali"}
+    assert time.monotonic() - started < 1
+
+    backend.release.set()
+    flusher.join(5)
+    assert [row[1] for row in store.load_messages("account:a", 0, 2)] == ["in flight", "queued"]
+    store.close()
+
+
+def test_idle_guest_histories_expire(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "guidance.sqlite3"))
+    now = time.time()
+    backend.append_messages([
+        ("guest:idle", "user", "old", now - 3600),
+        ("guest:active", "user", "old", now - 3600),
+        ("guest:active", "user", "new", now),
+        ("account:a", "user", "old", now - 3600),
+    ])
+    store = WriteBehindStore(backend, flush_interval=60)
+    monkeypatch.setattr(storage, "EXPIRE_INTERVAL", 0)
+    store.expire_idle("guest:", 600)
+    store._expire()
+
+    assert store.count_messages("guest:idle") == 0
+    assert store.count_messages("guest:active") == 2
+    assert store.count_messages("account:a") == 1
+    store.close()
+
+
+def test_accounts_are_found_by_token_not_name(tmp_path):
+    store = WriteBehindStore(SQLiteBackend(str(tmp_path / "guidance.sqlite3")))
+    token, key = create_account(store, {"username": "Ali"})
+
+    assert load_account(store, token) == (key, {"username": "Ali"})
+    assert load_account(store, "Ali") == (None, None)
+    assert load_account(store, "x" * 32) == (None, None)
+    assert token not in key and key == account_key(token)
+    store.close()
+
+
+def test_backends_must_implement_the_whole_interface():
+    class Partial(StorageBackend):
+        def load_profile(self, username):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from guidance.cache import shared_cache
+from guidance.services import NEWS_FALLBACK
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+
+@pytest.fixture
+def app(stub, tmp_path, monkeypatch):
+    monkeypatch.setenv("ASSETS_STATIC_DIR", str(tmp_path / "static"))
+    app = AppTest.from_file(APP, default_timeout=30)
+    app.run()
+    return app
+
+
+def open_news(app):
+    # Widget state set from outside the script has to be set again for each run
+    app.session_state["feature_tab"] = "📰 News"
+    app.run()
+
+
+def headlines(app):
+    return [block.value for block in app.markdown if block.value.startswith("- ")]
+
+
+def test_news_panel_recovers_once_the_upstream_does(app, stub):
+    stub.failure_rate["news"] = 1.0
+    open_news(app)
+    assert headlines(app) == [f"- {NEWS_FALLBACK}"]
+
+    # The fallback was not memoized for the session: the next rerun asks again
+    stub.failure_rate["news"] = 0.0
+    shared_cache.clear()
+    open_news(app)
+    assert headlines(app)[0].startswith("- [Stub headline")
+    assert not app.exception
+
+
+def test_open_panels_are_translated_in_one_request(app, stub):
+    app.sidebar.selectbox[1].select("French")
+    app.run()
+    app.session_state["enable_translation"] = True
+    app.session_state["feature_tab"] = "🧘 Meditation"
+    app.session_state["events_panel"] = True
+    app.run()
+
+    assert stub.counts["translate"] == 1
+    rendered = [block.value for block in app.markdown] + [str(block.value) for block in app.get("markdown")]
+    assert any(value.startswith("- [fr] ") for value in rendered)
+    assert not app.exception
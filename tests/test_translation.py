@@ -0,0 +1,48 @@
+import pytest
+
+from guidance.translation import LANGUAGE_CODES, language_code, translate_batch, translation_cache
+
+
+@pytest.fixture
+def url(stub):
+    translation_cache.clear()
+    yield f"{stub.base_url}/translate"
+    translation_cache.clear()
+
+
+def test_sidebar_languages_map_to_iso_codes():
+    assert language_code("Spanish") == "es"
+    assert language_code("Chinese") == "zh"
+    assert language_code("Klingon") is None
+    assert all(len(code) == 2 and code.islower() for code in LANGUAGE_CODES.values())
+
+
+def test_a_batch_is_one_request_and_repeats_are_cached(url, stub):
+    texts = ["Peace be with you", "Blessed are the meek", "Peace be with you", ""]
+
+    assert translate_batch(texts, "French", url) == [
+        "[fr] Peace be with you", "[fr] Blessed are the meek", "[fr] Peace be with you", ""
+    ]
+    assert stub.counts["translate"] == 1
+
+    # Only the string not seen before goes over the wire
+    assert translate_batch(["Blessed are the meek", "Love your neighbour"], "French", url) == [
+        "[fr] Blessed are the meek", "[fr] Love your neighbour"
+    ]
+    assert translate_batch(["Love your neighbour"], "French", url) == ["[fr] Love your neighbour"]
+    assert stub.counts["translate"] == 2
+
+
+def test_english_and_unsupported_languages_make_no_request(url, stub):
+    assert translate_batch(["Peace"], "English", url) == ["Peace"]
+    assert translate_batch(["Peace"], "Klingon", url) == ["Peace"]
+    assert stub.counts["translate"] == 0
+
+
+def test_failures_pass_the_source_through_and_are_not_cached(url, stub):
+    stub.failure_rate["translate"] = 1.0
+    assert translate_batch(["Peace"], "German", url) == ["Peace"]
+
+    stub.failure_rate["translate"] = 0.0
+    assert translate_batch(["Peace"], "German", url) == ["[de] Peace"]
+    assert stub.counts["translate"] == 2